@@ -0,0 +1,206 @@
+"""Journaled, atomically compacted storage for command aliases (renaming.json)."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Number of journal records after which the snapshot is rewritten.
+DEFAULT_COMPACT_EVERY = 32
+
+
+def _default_data() -> Dict[str, Any]:
+    return {"commands": {}, "aliases": {}, "generation": 0}
+
+
+def _apply(data: Dict[str, Dict[str, str]], command: str, alias: str) -> str:
+    """Points `command` at `alias`, dropping its previous alias. Returns the old alias."""
+    old_alias = data["commands"].get(command, "")
+    data["commands"][command] = alias
+    if old_alias != alias:
+        data["aliases"][alias] = command
+        if old_alias in data["aliases"]:
+            del data["aliases"][old_alias]
+    return old_alias
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class AliasStore:
+    """In-memory view of renaming.json backed by a snapshot and an append-only journal.
+
+    Renames append one fsynced JSON line to `renaming.journal` next to the
+    snapshot, so their I/O cost doesn't grow with the number of aliases. Every
+    `compact_every` records the folded state is written to a temporary file,
+    fsynced and renamed over the snapshot, so readers never see a torn
+    renaming.json. Readers fold the journal over the snapshot, and unparsable
+    journal lines (e.g. from an interrupted append) are ignored.
+
+    The store is the only writer: the extension reads the files but sends its
+    edits (remapping window, undo) to the server, which applies them here.
+    Each snapshot carries a generation that every journal record repeats, so
+    records already folded into a newer snapshot are never applied twice, and
+    a reader that sees the generation change while it reads starts over.
+    """
+
+    def __init__(self, path: str, compact_every: int = DEFAULT_COMPACT_EVERY):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._data = _default_data()
+        self._records = 0
+        self._loaded = False
+        self._signatures: Tuple[Any, Any] = (None, None)
+        # Bumped whenever the aliases may have changed
+        self.version = 0
+
+    def _current_signatures(self) -> Tuple[Any, Any]:
+        return (_signature(self.path), _signature(self.journal_path))
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            self._data = _default_data()
+            self._write_snapshot()
+        with open(self.path, "r", encoding="utf-8") as snapshot:
+            data = json.load(snapshot)
+        data.setdefault("commands", {})
+        data.setdefault("aliases", {})
+        data.setdefault("generation", 0)
+        self._records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                        command, alias = record["command"], record["alias"]
+                    except (ValueError, TypeError, KeyError):
+                        continue
+                    if record.get("generation", 0) != data["generation"]:
+                        # Already folded into this snapshot
+                        continue
+                    _apply(data, command, alias)
+                    self._records += 1
+        self._data = data
+        self._loaded = True
+        self.version += 1
+        self._signatures = self._current_signatures()
+
+    def _refresh(self) -> None:
+        if not self._loaded or self._current_signatures() != self._signatures:
+            self._load()
+
+    def _write_snapshot(self) -> None:
+        self._data["generation"] = self._data.get("generation", 0) + 1
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as snapshot:
+            json.dump(self._data, snapshot, indent=2)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self.path)
+
+    def compact(self) -> None:
+        """Folds the journal into a new snapshot and truncates the journal."""
+        with self._lock:
+            self._refresh()
+            self._compact()
+
+    def _compact(self) -> None:
+        self._write_snapshot()
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._records = 0
+        self._signatures = self._current_signatures()
+
+    def snapshot(self) -> Dict[str, Dict[str, str]]:
+        """Returns a copy of the current commands and aliases."""
+        with self._lock:
+            self._refresh()
+            return {
+                "commands": dict(self._data["commands"]),
+                "aliases": dict(self._data["aliases"]),
+            }
+
+    def current_version(self) -> int:
+        """Returns `version` after picking up changes made to the files by others."""
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    def get_command(self, alias: str) -> str:
+        """Returns the command an alias points to, or an empty string."""
+        with self._lock:
+            self._refresh()
+            return self._data["aliases"].get(alias, "")
+
+    def set_alias(self, command: str, alias: str) -> str:
+        """Renames `command` to `alias` and returns its previous alias (or "")."""
+        with self._lock:
+            self._refresh()
+            record = json.dumps(
+                {
+                    "command": command,
+                    "alias": alias,
+                    "generation": self._data["generation"],
+                }
+            )
+            with open(self.journal_path, "a", encoding="utf-8") as journal:
+                journal.write(record + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            old_alias = _apply(self._data, command, alias)
+            self._records += 1
+            self.version += 1
+            self._signatures = self._current_signatures()
+            if self._records >= self.compact_every:
+                self._compact()
+            return old_alias
+
+    def _rewrite(self, change: Callable[[Dict[str, Any]], None]) -> None:
+        """Applies an edit the journal can't record and writes a new snapshot."""
+        with self._lock:
+            self._refresh()
+            change(self._data)
+            self.version += 1
+            self._compact()
+
+    def remove(self, command: str) -> None:
+        """Drops the alias of `command`."""
+
+        def change(data):
+            alias = data["commands"].pop(command, None)
+            data["aliases"].pop(alias, None)
+
+        self._rewrite(change)
+
+    def restore(self, alias: str, old_alias: str) -> None:
+        """Undoes a rename to `alias`: the command gets `old_alias` back, or no alias if ""."""
+
+        def change(data):
+            command = data["aliases"].pop(alias, None)
+            if command is None:
+                return
+            if old_alias:
+                data["aliases"][old_alias] = command
+                data["commands"][command] = old_alias
+            else:
+                data["commands"].pop(command, None)
+
+        self._rewrite(change)
+
+    def clear(self) -> None:
+        """Drops every alias."""
+
+        def change(data):
+            data["commands"].clear()
+            data["aliases"].clear()
+
+        self._rewrite(change)
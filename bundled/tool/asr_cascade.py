@@ -0,0 +1,236 @@
+"""Cascaded Whisper decoding: a small model first, a larger one only when it's needed.
+
+Most commands are short, common phrases that `whisper-tiny` gets right. The
+cascade decodes an utterance with the first tier and hands the result to an
+`accept` check (match confidence and average token log-probability); only a
+rejected decoding is decoded again, from the same audio, by the next tier. The
+last tier's result is always kept. Each tier reports how often it was tried,
+how often its result was kept, and how long it took.
+
+`WhisperDecoder` is also used on its own wherever a transcription's confidence
+is needed, e.g. to reject background speech before it is matched to commands.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+class Decoding(NamedTuple):
+    text: str
+    # Mean log-probability of the generated tokens, -inf when none were generated and
+    # None when the decoder didn't report it
+    avg_logprob: Optional[float] = None
+    # Whisper's probability that the audio holds no speech, None when not measured
+    no_speech_prob: Optional[float] = None
+    tier: str = ""
+
+
+class WhisperDecoder:
+    """Decodes audio with an ASR pipeline's model and reports its confidence.
+
+    Besides the text, a decoding carries the average log-probability the model
+    alone gives the generated tokens, before any logits processor constrains
+    them, and the no-speech probability: the probability Whisper gives its
+    no-speech token right after `<|startoftranscript|>`, which takes one extra
+    decoder step on the encoder output generation reuses.
+    """
+
+    def __init__(self, transcriber, on_use: Optional[Callable[[], None]] = None):
+        self.transcriber = transcriber
+        # Called before each decode, e.g. to load a model that was released while idle
+        self.on_use = on_use
+        self.feature_extractor = transcriber.feature_extractor
+        self.tokenizer = transcriber.tokenizer
+        self.no_speech_id = None
+        for token in ("<|nospeech|>", "<|nocaptions|>"):
+            token_id = self.tokenizer.convert_tokens_to_ids(token)
+            if token_id is not None and token_id != self.tokenizer.unk_token_id:
+                self.no_speech_id = token_id
+                break
+
+    def decode(
+        self, audio: np.ndarray, generate_kwargs: Optional[Dict] = None
+    ) -> Decoding:
+        input_features = self.feature_extractor(
+            audio,
+            sampling_rate=self.feature_extractor.sampling_rate,
+            return_tensors="pt",
+        ).input_features
+        return self.decode_features(input_features, generate_kwargs)
+
+    def decode_features(
+        self, input_features: torch.Tensor, generate_kwargs: Optional[Dict] = None
+    ) -> Decoding:
+        """Decodes log-mel features shaped `(1, mel_bins, frames)`."""
+        if self.on_use is not None:
+            self.on_use()
+        # Read from the pipeline each time, the model may have been unloaded and reloaded
+        model = self.transcriber.model
+        input_features = input_features.to(model.device, model.dtype)
+        with torch.inference_mode():
+            encoder_outputs = model.get_encoder()(input_features)
+            no_speech_prob = None
+            if self.no_speech_id is not None:
+                start = torch.tensor(
+                    [[model.generation_config.decoder_start_token_id]],
+                    device=model.device,
+                )
+                logits = model(
+                    encoder_outputs=encoder_outputs, decoder_input_ids=start
+                ).logits
+                no_speech_prob = float(
+                    logits[0, -1].float().softmax(-1)[self.no_speech_id]
+                )
+            output = model.generate(
+                input_features=input_features,
+                encoder_outputs=encoder_outputs,
+                return_dict_in_generate=True,
+                # Scores are taken after the logits processors, which give a token
+                # they force (e.g. the command trie's only continuation) probability 1
+                output_logits=True,
+                **(generate_kwargs or {}),
+            )
+            logprobs = torch.zeros(0)
+            if output.logits:
+                logits = torch.stack(output.logits, dim=1)[0].float()
+                tokens = output.sequences[0, -len(logits) :]
+                logprobs = logits.log_softmax(-1).gather(-1, tokens[:, None])[:, 0]
+        logprobs = logprobs[torch.isfinite(logprobs)]
+        avg_logprob = float(logprobs.mean()) if len(logprobs) else float("-inf")
+        text = self.tokenizer.batch_decode(output.sequences, skip_special_tokens=True)[
+            0
+        ]
+        return Decoding(text, avg_logprob, no_speech_prob)
+
+    def stream(
+        self, items: Iterable[Dict], generate_kwargs: Optional[Dict] = None
+    ) -> Iterator[Dict]:
+        """Transcribes the live microphone's items like the streaming ASR pipeline does,
+        adding each update's confidence."""
+        for item in items:
+            decoding = self.decode(item["raw"], generate_kwargs)
+            yield {
+                "text": decoding.text,
+                "partial": [item.get("partial", False)],
+                "avg_logprob": decoding.avg_logprob,
+                "no_speech_prob": decoding.no_speech_prob,
+            }
+
+
+class UtteranceRecorder:
+    """Passes microphone chunks through, keeping the audio of the utterance."""
+
+    def __init__(self, chunks: Iterable):
+        self._chunks = chunks
+        self._parts: List[np.ndarray] = []
+        self._window: Optional[np.ndarray] = None
+
+    def __iter__(self) -> Iterator:
+        for chunk in self._chunks:
+            if isinstance(chunk, dict):
+                # The live microphone's items carry the whole window heard so far
+                self._window = chunk["raw"]
+            else:
+                # Raw chunks may be views of a ring that is overwritten later
+                self._parts.append(np.array(np.frombuffer(chunk, dtype=np.float32)))
+            yield chunk
+
+    def close(self) -> None:
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+
+    def audio(self) -> np.ndarray:
+        if self._window is not None:
+            return self._window
+        if not self._parts:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._parts)
+
+
+class _Tier:
+    def __init__(self, name: str, decoder: WhisperDecoder):
+        self.name = name
+        self.decoder = decoder
+        self.attempts = 0
+        # Attempts that took a decoding the caller already had, without decoding
+        self.reused = 0
+        self.accepted = 0
+        self.total_s = 0.0
+        self.last_s = 0.0
+
+
+class ASRCascade:
+    """Decodes with each tier in turn until `accept` takes a decoding."""
+
+    def __init__(
+        self,
+        tiers: Sequence[Tuple[str, WhisperDecoder]],
+        accept: Callable[[Decoding], bool],
+    ):
+        if not tiers:
+            raise ValueError("The cascade needs at least one tier")
+        self.tiers = [_Tier(name, decoder) for name, decoder in tiers]
+        self.accept = accept
+        self.escalations = 0
+
+    def _decode(
+        self, tier: _Tier, audio: np.ndarray, generate_kwargs: Optional[Dict]
+    ) -> Decoding:
+        start = time.perf_counter()
+        decoding = tier.decoder.decode(audio, generate_kwargs)._replace(tier=tier.name)
+        tier.last_s = time.perf_counter() - start
+        tier.total_s += tier.last_s
+        tier.attempts += 1
+        return decoding
+
+    def decode(
+        self,
+        audio: np.ndarray,
+        generate_kwargs: Optional[Dict] = None,
+        first: Optional[Decoding] = None,
+    ) -> Decoding:
+        """Decodes the audio, starting from `first` when given.
+
+        `first` is the first tier's decoding of the same audio when the caller
+        already has it (e.g. the last update of a stream), with its confidence;
+        the first tier then isn't run again.
+        """
+        for index, tier in enumerate(self.tiers[:-1]):
+            if index == 0 and first is not None and first.avg_logprob is not None:
+                decoding = first._replace(tier=tier.name)
+                tier.attempts += 1
+                tier.reused += 1
+            else:
+                decoding = self._decode(tier, audio, generate_kwargs)
+            if self.accept(decoding):
+                tier.accepted += 1
+                return decoding
+            self.escalations += 1
+        last = self.tiers[-1]
+        decoding = self._decode(last, audio, generate_kwargs)
+        last.accepted += 1
+        return decoding
+
+    def stats(self) -> Dict[str, float]:
+        """Per tier: attempts, reused decodings, kept results, hit rate and mean and last
+        latency of its own decodes."""
+        values: Dict[str, float] = {"escalations": self.escalations}
+        for tier in self.tiers:
+            decodes = tier.attempts - tier.reused
+            values[f"{tier.name}.attempts"] = tier.attempts
+            values[f"{tier.name}.reused"] = tier.reused
+            values[f"{tier.name}.accepted"] = tier.accepted
+            values[f"{tier.name}.hit_rate"] = (
+                tier.accepted / tier.attempts if tier.attempts else 0.0
+            )
+            values[f"{tier.name}.mean_latency_s"] = (
+                tier.total_s / decodes if decodes else 0.0
+            )
+            values[f"{tier.name}.last_latency_s"] = tier.last_s
+        return values
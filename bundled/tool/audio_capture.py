@@ -0,0 +1,274 @@
+"""Microphone capture from ffmpeg, straight into an AudioRing or as a stream of chunks.
+
+`ffmpeg_microphone_live` allocates new bytes, arrays and dicts for every chunk
+and the pipelines copy them again to build overlapping windows. Here ffmpeg's
+output is read with `readinto` directly into the ring's preallocated storage
+and consumers get views of it, so the always-on listener doesn't allocate per
+chunk.
+
+With `threaded`, a `CaptureThread` reads ffmpeg as soon as audio arrives and
+the ring is filled from its queue when consumers need more, so the pipe never
+backs up while the models are busy.
+
+`microphone` and `microphone_live` stream chunks like transformers'
+`ffmpeg_microphone` and `ffmpeg_microphone_live`. Every ffmpeg child started
+here is registered with `resources.registry`, which allows one capture at a
+time and stops them all when the server goes away.
+"""
+
+from __future__ import annotations
+
+import platform
+import subprocess
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from audio_ring import AudioRing
+from capture_thread import CaptureThread
+from resources import registry
+from transformers.pipelines.audio_utils import chunk_bytes_iter
+
+# Seconds of audio the ring holds; consumers may fall this far behind before overrunning.
+DEFAULT_CAPACITY_S = 10.0
+
+
+def _microphone_name() -> str:
+    """The first DirectShow audio device, like transformers' ffmpeg helpers pick on Windows."""
+    command = ["ffmpeg", "-list_devices", "true", "-f", "dshow", "-i", ""]
+    try:
+        devices = subprocess.run(
+            command, text=True, stderr=subprocess.PIPE, encoding="utf-8"
+        )
+    except FileNotFoundError:
+        return "default"
+    for line in devices.stderr.splitlines():
+        if "(audio)" in line:
+            name = line.split('"')[1]
+            return f"audio={name}"
+    return "default"
+
+
+def ffmpeg_command(sampling_rate: int, input_device: Optional[str] = None) -> List[str]:
+    """ffmpeg arguments that write the default microphone as mono f32le to stdout."""
+    system = platform.system()
+    if system == "Darwin":
+        format_, input_ = "avfoundation", input_device or ":default"
+    elif system == "Windows":
+        format_, input_ = "dshow", input_device or _microphone_name()
+    else:
+        format_, input_ = "alsa", input_device or "default"
+    return [
+        "ffmpeg",
+        "-f",
+        format_,
+        "-i",
+        input_,
+        "-ac",
+        "1",
+        "-ar",
+        str(sampling_rate),
+        "-f",
+        "f32le",
+        "-fflags",
+        "nobuffer",
+        "-hide_banner",
+        "-loglevel",
+        "quiet",
+        "pipe:1",
+    ]
+
+
+def start_ffmpeg(command: List[str], bufsize: int = 0) -> subprocess.Popen:
+    """Starts ffmpeg writing to a pipe."""
+    try:
+        return subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=bufsize)
+    except FileNotFoundError as error:
+        raise ValueError(
+            "ffmpeg was not found but is required to capture audio"
+        ) from error
+
+
+def stop_ffmpeg(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+    process.wait()
+    process.stdout.close()
+
+
+def microphone(
+    sampling_rate: int,
+    chunk_length_s: float,
+    input_device: Optional[str] = None,
+    on_start: Optional[Callable[[], None]] = None,
+) -> Iterator[bytes]:
+    """Yields f32le microphone audio in `chunk_length_s` chunks of bytes.
+
+    `on_start` is called once ffmpeg has been started, e.g. to tell the user to speak.
+    """
+    chunk_bytes = int(round(sampling_rate * chunk_length_s)) * 4
+    process = start_ffmpeg(ffmpeg_command(sampling_rate, input_device), bufsize=2**24)
+    resource_id = registry.add_process(
+        "capture", "ffmpeg microphone", process, capture=True
+    )
+    try:
+        if on_start is not None:
+            on_start()
+        while True:
+            raw = process.stdout.read(chunk_bytes)
+            if not raw:
+                return
+            yield raw
+    finally:
+        registry.remove(resource_id)
+        stop_ffmpeg(process)
+
+
+def microphone_live(
+    sampling_rate: int,
+    chunk_length_s: float,
+    stream_chunk_s: Optional[float] = None,
+    input_device: Optional[str] = None,
+    on_start: Optional[Callable[[], None]] = None,
+) -> Iterator[Dict]:
+    """Yields growing `partial` windows every `stream_chunk_s` up to `chunk_length_s`.
+
+    Items have the shape, striding and late-audio skipping of transformers'
+    `ffmpeg_microphone_live`, so the streaming ASR pipeline takes them as is.
+    """
+    chunk_s = stream_chunk_s or chunk_length_s
+    chunks = microphone(sampling_rate, chunk_s, input_device, on_start)
+    chunk_bytes = int(round(sampling_rate * chunk_length_s)) * 4
+    stride_bytes = int(round(sampling_rate * chunk_length_s / 6)) * 4
+    audio_time = time.monotonic()
+    try:
+        for item in chunk_bytes_iter(
+            chunks, chunk_bytes, stride=(stride_bytes, stride_bytes), stream=True
+        ):
+            item["raw"] = np.frombuffer(item["raw"], dtype=np.float32)
+            item["stride"] = (item["stride"][0] // 4, item["stride"][1] // 4)
+            item["sampling_rate"] = sampling_rate
+            audio_time += chunk_s
+            if time.monotonic() > audio_time + 10 * chunk_s:
+                # Far behind the microphone, skip ahead
+                continue
+            yield item
+    finally:
+        chunks.close()
+
+
+class MicrophoneCapture:
+    """Reads the microphone into a ring on demand and serves consumers from it."""
+
+    def __init__(
+        self,
+        sampling_rate: int,
+        capacity_s: float = DEFAULT_CAPACITY_S,
+        input_device: Optional[str] = None,
+        threaded: bool = False,
+    ):
+        self.sampling_rate = sampling_rate
+        self.ring = AudioRing(int(capacity_s * sampling_rate), dtype=np.float32)
+        self.input_device = input_device
+        self.threaded = threaded
+        self._process: Optional[subprocess.Popen] = None
+        self._capture_thread: Optional[CaptureThread] = None
+        self._resource_id: Optional[int] = None
+        self._partial_bytes = 0
+
+    def _fill_from_thread(self, count: int) -> bool:
+        if self._capture_thread is None:
+            self._capture_thread = CaptureThread(
+                ffmpeg_command(self.sampling_rate, self.input_device),
+                self.sampling_rate,
+            )
+        while count > 0:
+            chunk = self._capture_thread.take()
+            if chunk is None:
+                return False
+            self.ring.write(chunk)
+            count -= len(chunk)
+        return True
+
+    def _fill(self, count: int) -> bool:
+        """Reads at least `count` samples from ffmpeg into the ring. False once ffmpeg stops."""
+        if self.threaded:
+            return self._fill_from_thread(count)
+        if self._process is None:
+            self._process = start_ffmpeg(
+                ffmpeg_command(self.sampling_rate, self.input_device)
+            )
+            self._resource_id = registry.add_process(
+                "capture", "ffmpeg ring capture", self._process, capture=True
+            )
+        itemsize = self.ring.data.itemsize
+        while count > 0:
+            # The pipe may split a sample across reads. Only whole samples are published;
+            # the leading bytes of a split one stay at the new write position.
+            region = memoryview(self.ring.writable()[:count]).cast("B")
+            received = self._process.stdout.readinto(region[self._partial_bytes :])
+            if not received:
+                return False
+            received += self._partial_bytes
+            samples = received // itemsize
+            self._partial_bytes = received - samples * itemsize
+            self.ring.commit(samples)
+            count -= samples
+        return True
+
+    def _read(self, consumer: str, count: int, history: int) -> Iterator[np.ndarray]:
+        self.ring.add_consumer(consumer)
+        try:
+            while True:
+                view = self.ring.read(consumer, count, history)
+                if view is None:
+                    if self._capture_thread is not None and not len(
+                        self._capture_thread.queue
+                    ):
+                        # Caught up with the capture thread, so this read waits for audio.
+                        # Pulling from ffmpeg on demand always reads on an empty ring.
+                        self.ring.underrun(consumer)
+                    if not self._fill(count - self.ring.available(consumer)):
+                        return
+                    continue
+                yield view
+        finally:
+            self.ring.remove_consumer(consumer)
+
+    def chunks(self, consumer: str, chunk_length_s: float) -> Iterator[np.ndarray]:
+        """Yields consecutive chunks of new audio, starting from now."""
+        return self._read(consumer, int(round(chunk_length_s * self.sampling_rate)), 0)
+
+    def windows(
+        self, consumer: str, chunk_length_s: float, stream_chunk_s: float
+    ) -> Iterator[np.ndarray]:
+        """Yields `chunk_length_s` windows every `stream_chunk_s`, starting from now."""
+        stride = int(round(stream_chunk_s * self.sampling_rate))
+        window = int(round(chunk_length_s * self.sampling_rate))
+        for view in self._read(consumer, stride, window - stride):
+            # Until a whole window has been captured the views are shorter
+            if len(view) == window:
+                yield view
+
+    def skip(self, consumer: str) -> None:
+        """Drops a consumer's unread audio, e.g. after it was paused for a while."""
+        self.ring.add_consumer(consumer)
+
+    def stats(self) -> Dict[str, float]:
+        """The ring's counts, and the capture thread's jitter and queue numbers under `thread.`."""
+        stats = dict(self.ring.stats())
+        if self._capture_thread is not None:
+            for name, value in self._capture_thread.stats().items():
+                stats[f"thread.{name}"] = value
+        return stats
+
+    def close(self) -> None:
+        """Stops ffmpeg."""
+        if self._capture_thread is not None:
+            self._capture_thread.close()
+            self._capture_thread = None
+        if self._process is not None:
+            registry.remove(self._resource_id)
+            stop_ffmpeg(self._process)
+            self._process = None
+            self._partial_bytes = 0
@@ -0,0 +1,131 @@
+"""Preallocated audio ring buffer with independent read cursors.
+
+The ring keeps a mirrored copy of its contents (`2 * capacity` samples, where
+sample `i` is also stored at `i + capacity`), so any run of up to `capacity`
+consecutive samples is one contiguous slice. Reads hand out NumPy views into
+that storage instead of new arrays: a view stays valid until the writer has
+written another `capacity - len(view)` samples, which callers must consume
+within.
+
+Every consumer has its own cursor. A consumer that falls more than
+`capacity` samples behind the writer loses the oldest audio (an overrun, the
+cursor jumps to the oldest sample still held); a read that asks for more audio
+than has been written yet returns nothing. Whether that is an underrun depends
+on the writer: a consumer that fills the ring itself on demand expects it, one
+that has to wait for a capture thread records it with `underrun`.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class _Consumer:
+    """Read position of one consumer and its overrun/underrun counts."""
+
+    def __init__(self, position: int):
+        self.start = position
+        self.cursor = position
+        self.overruns = 0
+        self.dropped = 0
+        self.underruns = 0
+
+
+class AudioRing:
+    """Fixed-capacity ring of samples, written once and read by many consumers."""
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.written = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.underruns = 0
+        self._consumers: Dict[str, _Consumer] = {}
+
+    def add_consumer(self, name: str) -> None:
+        """(Re)starts a consumer at the current write position, so it only sees audio from now on."""
+        self._consumers[name] = _Consumer(self.written)
+
+    def remove_consumer(self, name: str) -> None:
+        self._consumers.pop(name, None)
+
+    def writable(self) -> np.ndarray:
+        """The contiguous free region starting at the write position, to be filled in place.
+
+        Fill a prefix of it (e.g. with `readinto`) and call `commit` with the
+        number of samples written. The region ends at the wrap-around point, so
+        it may be shorter than the capacity.
+        """
+        start = self.written % self.capacity
+        return self.data[start : self.capacity]
+
+    def commit(self, count: int) -> None:
+        """Publishes `count` samples filled into `writable()`, mirroring them."""
+        start = self.written % self.capacity
+        self.data[self.capacity + start : self.capacity + start + count] = self.data[
+            start : start + count
+        ]
+        self.written += count
+
+    def write(self, samples: np.ndarray) -> None:
+        """Copies samples into the ring. Only the last `capacity` samples are kept."""
+        samples = samples[-self.capacity :]
+        skipped = 0
+        while skipped < len(samples):
+            region = self.writable()
+            count = min(len(region), len(samples) - skipped)
+            region[:count] = samples[skipped : skipped + count]
+            self.commit(count)
+            skipped += count
+
+    def available(self, name: str) -> int:
+        """Samples written that the consumer hasn't read yet."""
+        consumer = self._consumers[name]
+        return self.written - consumer.cursor
+
+    def read(self, name: str, count: int, history: int = 0) -> Optional[np.ndarray]:
+        """Returns a view of the consumer's next `count` samples and advances past them.
+
+        The view also covers up to `history` samples before them (already read
+        ones), which gives overlapping windows without copying. Returns None if
+        fewer than `count` new samples are available.
+        """
+        consumer = self._consumers[name]
+        history = min(history, self.capacity - count)
+        oldest = self.written - self.capacity + history
+        if consumer.cursor < oldest:
+            consumer.overruns += 1
+            consumer.dropped += oldest - consumer.cursor
+            self.overruns += 1
+            self.dropped += oldest - consumer.cursor
+            consumer.cursor = oldest
+        if self.written - consumer.cursor < count:
+            return None
+        start = max(
+            consumer.cursor - history, consumer.start, self.written - self.capacity
+        )
+        consumer.cursor += count
+        offset = start % self.capacity
+        return self.data[offset : offset + consumer.cursor - start]
+
+    def underrun(self, name: str) -> None:
+        """Counts a read that had to wait for the writer."""
+        self._consumers[name].underruns += 1
+        self.underruns += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Overrun, dropped-sample, underrun and backlog counts, in total and per current consumer."""
+        stats = {
+            "written": self.written,
+            "overruns": self.overruns,
+            "dropped": self.dropped,
+            "underruns": self.underruns,
+        }
+        for name, consumer in self._consumers.items():
+            for key in ("overruns", "dropped", "underruns"):
+                stats[f"{name}.{key}"] = getattr(consumer, key)
+            stats[f"{name}.backlog"] = self.written - consumer.cursor
+        return stats
@@ -0,0 +1,124 @@
+"""Picks wake-word and transcription timing from this machine's measured inference speed.
+
+The listening loop's window, stride and pause lengths used to be fixed,
+whatever the hardware. Calibration times the classifier and Whisper on
+synthetic audio, turns that into real-time factors, and picks the shortest
+strides that still leave `HEADROOM` times the time inference needs. Results
+are stored in calibration.json keyed by a machine fingerprint, so later starts
+on the same machine and software skip the measurement.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# Inference may use at most 1 / HEADROOM of each stride.
+HEADROOM = 2.0
+WAKE_STRIDES_S = (0.1, 0.125, 0.25, 0.5, 1.0)
+WAKE_WINDOW_S = 0.5
+ASR_STRIDES_S = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+# Length of the synthetic utterance Whisper is timed on.
+ASR_AUDIO_S = 2.0
+
+# Timing used when calibration is off, the loop's long-standing defaults.
+DEFAULTS = {
+    "wake_chunk_length_s": 0.5,
+    "wake_stream_chunk_s": 0.25,
+    "wake_idle_s": 0.25,
+    "asr_stream_chunk_s": 0.75,
+}
+
+
+def machine_fingerprint(*details: str) -> str:
+    """Identifies the hardware and software a calibration is valid for."""
+    parts = [
+        platform.node(),
+        platform.machine(),
+        platform.processor(),
+        str(os.cpu_count()),
+        platform.python_version(),
+        *details,
+    ]
+    return "|".join(parts)
+
+
+def _time(run: Callable[[np.ndarray], None], audio: np.ndarray, repeats: int) -> float:
+    run(audio)  # Warm-up: lazy initialization and caches
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(audio)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def _shortest(strides, seconds_per_update: float) -> float:
+    for stride in strides:
+        if seconds_per_update * HEADROOM <= stride:
+            return stride
+    return strides[-1]
+
+
+def calibrate(
+    classify: Callable[[np.ndarray], None],
+    transcribe: Callable[[np.ndarray], None],
+    sampling_rate: int,
+    repeats: int = 3,
+) -> Dict[str, float]:
+    """Measures both models and returns the timing the listening loop should use."""
+    rng = np.random.default_rng(0)
+    # Low-level noise, like an idle microphone
+    window = rng.normal(0.0, 0.005, int(WAKE_WINDOW_S * sampling_rate)).astype(
+        np.float32
+    )
+    utterance = rng.normal(0.0, 0.005, int(ASR_AUDIO_S * sampling_rate)).astype(
+        np.float32
+    )
+
+    classify_s = _time(classify, window, repeats)
+    transcribe_s = _time(transcribe, utterance, repeats)
+
+    wake_stride = _shortest(WAKE_STRIDES_S, classify_s)
+    return {
+        "wake_chunk_length_s": max(WAKE_WINDOW_S, wake_stride),
+        "wake_stream_chunk_s": wake_stride,
+        # Pausing longer than the stride minus inference time would build a backlog
+        "wake_idle_s": round(max(0.0, wake_stride - classify_s * HEADROOM), 3),
+        "asr_stream_chunk_s": _shortest(ASR_STRIDES_S, transcribe_s),
+        "classifier_rtf": classify_s / WAKE_WINDOW_S,
+        "asr_rtf": transcribe_s / ASR_AUDIO_S,
+    }
+
+
+class CalibrationStore:
+    """calibration.json: one calibration per machine fingerprint."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as calibration_file:
+                return json.load(calibration_file)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, fingerprint: str) -> Optional[Dict[str, float]]:
+        return self._read().get(fingerprint)
+
+    def save(self, fingerprint: str, calibration: Dict[str, float]) -> None:
+        data = self._read()
+        data[fingerprint] = calibration
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as calibration_file:
+            json.dump(data, calibration_file, indent=2)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,194 @@
+"""Reads ffmpeg's microphone output on a dedicated thread.
+
+When the consumer reads the pipe itself, audio is only pulled while the models
+aren't busy, so the pipe backs up during inference and samples arrive late and
+in bursts. Here a capture thread reads fixed-size chunks with `readinto` into
+the preallocated slots of a single-producer/single-consumer queue as soon as
+ffmpeg writes them, and the consumer takes them at its own pace. The thread
+measures how regularly chunks arrive (jitter) and how long they wait for the
+consumer.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from resources import registry
+
+
+class SPSCQueue:
+    """Fixed ring of preallocated buffers handed from one producer thread to one consumer thread.
+
+    The producer only advances `_tail` and the consumer only advances `_head`,
+    each after it's done with the slot, so the slots themselves need no lock.
+    The event only wakes up a consumer waiting on an empty queue.
+    """
+
+    def __init__(self, slots: int, slot_size: int, dtype=np.float32):
+        self.slots = slots
+        self.buffers = np.zeros((slots, slot_size), dtype=dtype)
+        self.timestamps: List[float] = [0.0] * slots
+        self._head = 0
+        self._tail = 0
+        self._ready = threading.Event()
+        self.closed = False
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def acquire(self) -> Optional[np.ndarray]:
+        """Producer: the next free slot to fill, or None when the consumer is a whole queue behind."""
+        if self._tail - self._head >= self.slots:
+            return None
+        return self.buffers[self._tail % self.slots]
+
+    def publish(self, timestamp: float) -> None:
+        """Producer: hands the slot from `acquire` to the consumer."""
+        self.timestamps[self._tail % self.slots] = timestamp
+        self._tail += 1
+        self._ready.set()
+
+    def peek(self) -> Optional[Tuple[np.ndarray, float]]:
+        """Consumer: waits for the oldest filled slot and its timestamp. None once closed and drained.
+
+        The slot stays valid until `release` is called.
+        """
+        while True:
+            self._ready.clear()
+            if self._head != self._tail:
+                slot = self._head % self.slots
+                return self.buffers[slot], self.timestamps[slot]
+            if self.closed:
+                return None
+            self._ready.wait()
+
+    def release(self) -> None:
+        """Consumer: gives the slot from `peek` back to the producer."""
+        self._head += 1
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+
+class CaptureThread:
+    """Runs an audio command and publishes its f32le output in chunks through an SPSCQueue."""
+
+    def __init__(
+        self,
+        command: List[str],
+        sampling_rate: int,
+        chunk_s: float = 0.02,
+        queue_s: float = 2.0,
+    ):
+        self.chunk_samples = int(chunk_s * sampling_rate)
+        self.chunk_s = self.chunk_samples / sampling_rate
+        self.queue = SPSCQueue(max(int(queue_s / self.chunk_s), 2), self.chunk_samples)
+        # Audio that arrives while the queue is full is read into this and dropped,
+        # so ffmpeg's pipe never backs up
+        self._scratch = np.zeros(self.chunk_samples, dtype=np.float32)
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+        except FileNotFoundError as error:
+            raise ValueError(
+                "ffmpeg was not found but is required to capture audio"
+            ) from error
+        self.chunks = 0
+        self.overflows = 0
+        self._last_arrival: Optional[float] = None
+        self._jitter_total = 0.0
+        self.jitter_max = 0.0
+        self._wait_total = 0.0
+        self._waits = 0
+        self.wait_max = 0.0
+        self._taken = False
+        self._thread = threading.Thread(
+            target=self._run, name="VoiceControlCaptureThread", daemon=True
+        )
+        self._resource_ids = [
+            registry.add_process(
+                "capture", "ffmpeg capture thread", self.process, capture=True
+            ),
+            registry.add_thread(self._thread.name, self._thread),
+        ]
+        self._thread.start()
+
+    def _read_chunk(self, buffer: np.ndarray) -> bool:
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view):
+            received = self.process.stdout.readinto(view[filled:])
+            if not received:
+                return False
+            filled += received
+        return True
+
+    def _run(self) -> None:
+        try:
+            while True:
+                buffer = self.queue.acquire()
+                dropped = buffer is None
+                if dropped:
+                    buffer = self._scratch
+                if not self._read_chunk(buffer):
+                    return
+                arrival = time.monotonic()
+                if self._last_arrival is not None:
+                    # How far the chunk's arrival strays from the audio clock
+                    jitter = abs(arrival - self._last_arrival - self.chunk_s)
+                    self._jitter_total += jitter
+                    self.jitter_max = max(self.jitter_max, jitter)
+                self._last_arrival = arrival
+                self.chunks += 1
+                if dropped:
+                    self.overflows += 1
+                else:
+                    self.queue.publish(arrival)
+        except (OSError, ValueError):
+            # The pipe was closed by `close`
+            return
+        finally:
+            self.queue.close()
+
+    def take(self) -> Optional[np.ndarray]:
+        """Consumer: the oldest chunk, valid until the next call. None once capture stopped."""
+        if self._taken:
+            self.queue.release()
+        item = self.queue.peek()
+        self._taken = item is not None
+        if item is None:
+            return None
+        chunk, arrival = item
+        wait = time.monotonic() - arrival
+        self._wait_total += wait
+        self._waits += 1
+        self.wait_max = max(self.wait_max, wait)
+        return chunk
+
+    def stats(self) -> Dict[str, float]:
+        """Chunk arrival jitter, time chunks wait for the consumer, and dropped chunks."""
+        intervals = max(self.chunks - 1, 1)
+        return {
+            "chunks": self.chunks,
+            "overflows": self.overflows,
+            "queued": len(self.queue),
+            "jitter_mean_s": self._jitter_total / intervals,
+            "jitter_max_s": self.jitter_max,
+            "wait_mean_s": self._wait_total / self._waits if self._waits else 0.0,
+            "wait_max_s": self.wait_max,
+        }
+
+    def close(self) -> None:
+        """Stops the command and waits for the capture thread to finish."""
+        for resource_id in self._resource_ids:
+            registry.remove(resource_id)
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+        self._thread.join()
+        self.process.stdout.close()
+        self.queue.close()
@@ -0,0 +1,129 @@
+"""Latency-bounded hand-off of audio windows from capture to classification.
+
+Capture runs on its own thread and puts every window into a bounded queue
+stamped with the time it arrived. The classifier takes the oldest window that
+is still younger than `max_age_s`; anything older is dropped and counted. When
+inference falls behind, detection therefore works on recent audio instead of
+an ever-growing backlog, and the consumer simply blocks while it is ahead.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from resources import registry
+
+
+class ChunkQueue:
+    """Bounded FIFO of timestamped chunks that drops stale ones on the way out."""
+
+    def __init__(self, max_size: int, max_age_s: float):
+        self.max_size = max_size
+        self.max_age_s = max_age_s
+        self._items: Deque[Tuple[float, Any]] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.delivered = 0
+        self.dropped_stale = 0
+        self.dropped_full = 0
+
+    def put(self, chunk: Any) -> None:
+        """Adds a chunk, evicting the oldest one if the queue is full."""
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._items) >= self.max_size:
+                self._items.popleft()
+                self.dropped_full += 1
+            self._items.append((time.monotonic(), chunk))
+            self._condition.notify()
+
+    def get(self) -> Optional[Any]:
+        """Waits for the oldest chunk that isn't stale. Returns None once closed."""
+        with self._condition:
+            while True:
+                while not self._items and not self._closed:
+                    self._condition.wait()
+                if not self._items:
+                    return None
+                arrived, chunk = self._items.popleft()
+                if time.monotonic() - arrived > self.max_age_s:
+                    self.dropped_stale += 1
+                    continue
+                self.delivered += 1
+                return chunk
+
+    def close(self) -> None:
+        """Wakes up the consumer; chunks still queued are discarded."""
+        with self._condition:
+            self._closed = True
+            self._items.clear()
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            depth = len(self._items)
+        return {
+            "delivered": self.delivered,
+            "dropped_stale": self.dropped_stale,
+            "dropped_full": self.dropped_full,
+            "depth": depth,
+        }
+
+
+class QueuedCapture:
+    """Pulls chunks from a capture iterator on a dedicated thread into a ChunkQueue."""
+
+    def __init__(self, chunks: Iterator, max_size: int, max_age_s: float):
+        self.queue = ChunkQueue(max_size, max_age_s)
+        self._chunks = chunks
+        self._stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name="VoiceControlCapture", daemon=True
+        )
+        self._resource_id = registry.add_thread(
+            self._thread.name, self._thread, self._signal_stop
+        )
+        self._thread.start()
+
+    def _signal_stop(self) -> None:
+        self._stop.set()
+        self.queue.close()
+
+    def _run(self) -> None:
+        try:
+            for chunk in self._chunks:
+                if self._stop.is_set():
+                    break
+                if isinstance(chunk, np.ndarray) and chunk.base is not None:
+                    # A view into a capture ring is overwritten while it waits in the queue
+                    chunk = chunk.copy()
+                self.queue.put(chunk)
+        except Exception as error:  # pylint: disable=broad-except
+            # Raised again to the consumer
+            self.error = error
+        finally:
+            # The iterator is only touched from this thread, so it's closed here too
+            if hasattr(self._chunks, "close"):
+                self._chunks.close()
+            self.queue.close()
+
+    def __iter__(self) -> Iterator:
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield chunk
+
+    def close(self) -> None:
+        """Stops capture; returns once the capture thread has released the microphone."""
+        registry.remove(self._resource_id)
+        self._signal_stop()
+        self._thread.join()
@@ -0,0 +1,106 @@
+"""Loads command_groups.json and compiles it against the command catalog."""
+
+from __future__ import annotations
+
+import json
+import os
+import string
+from typing import Callable, Dict, List, Optional
+
+from command_index import CommandIndex
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_group_name(text: str) -> str:
+    """Normalizes a group name or transcription the same way for lookups."""
+    return text.translate(_PUNCTUATION).strip().lower()
+
+
+class CompiledCommandGroups:
+    """Command groups keyed by normalized name, with only valid catalog commands."""
+
+    def __init__(self):
+        self.groups: Dict[str, List[str]] = {}
+        # The locale of the catalog each group command came from, in the same order
+        self.locales: Dict[str, List[str]] = {}
+        self.names: List[str] = []
+        self.problems: List[str] = []
+
+    def lookup(self, text: str) -> List[str]:
+        """Returns the commands of the group named `text`, or an empty list."""
+        return self.groups.get(normalize_group_name(text), [])
+
+    def locales_of(self, text: str) -> List[str]:
+        """Returns the locale of each command of the group named `text`."""
+        return self.locales.get(normalize_group_name(text), [])
+
+
+def compile_command_groups(data: list, index: CommandIndex) -> CompiledCommandGroups:
+    """Resolves every group against the catalog, flagging unknown or misplaced commands."""
+    compiled = CompiledCommandGroups()
+    for group in data:
+        name = group.get("name", "")
+        key = normalize_group_name(name)
+        if not key:
+            compiled.problems.append(f"Command group {name!r} has no usable name")
+            continue
+        if key in compiled.groups:
+            compiled.problems.append(f"Duplicate command group {name!r} ignored")
+            continue
+        commands = []
+        locales = []
+        group_commands = group.get("commands", [])
+        for position, command in enumerate(group_commands):
+            locale = index.locale_of(command)
+            if locale is None:
+                compiled.problems.append(
+                    f"Command group {name!r}: unknown command {command!r} skipped"
+                )
+                continue
+            if "..." in command and position != len(group_commands) - 1:
+                compiled.problems.append(
+                    f"Command group {name!r}: multi-step command {command!r} must be last, skipped"
+                )
+                continue
+            commands.append(command)
+            locales.append(locale)
+        if not commands:
+            compiled.problems.append(f"Command group {name!r} has no valid commands")
+            continue
+        compiled.groups[key] = commands
+        compiled.locales[key] = locales
+        compiled.names.append(name)
+    return compiled
+
+
+class CommandGroupStore:
+    """Caches the compiled groups until command_groups.json or the catalog changes."""
+
+    def __init__(self, path: str, warn: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.warn = warn
+        self._signature = None
+        self._index: Optional[CommandIndex] = None
+        self._compiled = CompiledCommandGroups()
+        # Bumped every time the groups are compiled again
+        self.version = 0
+
+    def compiled(self, index: CommandIndex) -> CompiledCommandGroups:
+        """Returns the groups compiled against `index`, recompiling only when needed."""
+        if not os.path.exists(self.path):
+            with open(self.path, "w", encoding="utf-8") as groups_file:
+                json.dump([], groups_file, indent=2)
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature or index is not self._index:
+            with open(self.path, "r", encoding="utf-8") as groups_file:
+                data = json.load(groups_file)
+            self._compiled = compile_command_groups(data, index)
+            self._signature = signature
+            self._index = index
+            self.version += 1
+            if self.warn:
+                for problem in self._compiled.problems:
+                    self.warn(problem)
+        return self._compiled
@@ -0,0 +1,96 @@
+"""Precomputed matching index over one or more command catalogs."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Sequence
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+
+class CommandIndex:
+    """Preprocesses every catalog phrase once so lookups don't re-tokenize the catalog.
+
+    Catalogs from several locales can share one index. A phrase that appears in
+    more than one catalog is stored once, under the first locale that added it.
+    An inverted index from words (and, for one-word phrases, characters) to
+    phrases means a lookup only scores phrases that can have a non-zero
+    similarity, so adding locales doesn't multiply the matching cost.
+    """
+
+    def __init__(
+        self,
+        catalogs: Iterable[Tuple[str, Iterable[str]]],
+        preprocess: Callable[[str], List[str]],
+    ):
+        self.phrases: List[str] = []
+        self.locales: List[str] = []
+        self.word_sets: List[FrozenSet[str]] = []
+        self.word_sequences: List[Tuple[str, ...]] = []
+        self._positions: Dict[str, int] = {}
+        self._exact: Dict[FrozenSet[str], List[int]] = {}
+        self._by_word: Dict[str, List[int]] = {}
+        self._by_char: Dict[str, List[int]] = {}
+        for locale, phrases in catalogs:
+            for phrase in phrases:
+                phrase = phrase.split("\n")[0]
+                if phrase not in self._positions:
+                    self.add(phrase, preprocess(phrase), locale)
+
+    def add(self, phrase: str, words: Iterable[str], locale: str) -> None:
+        """Adds one phrase with its preprocessed words."""
+        position = len(self.phrases)
+        words = tuple(words)
+        word_set = frozenset(words)
+        self.phrases.append(phrase)
+        self.locales.append(locale)
+        self.word_sets.append(word_set)
+        self.word_sequences.append(words)
+        self._positions[phrase] = position
+        self._exact.setdefault(word_set, []).append(position)
+        for word in word_set:
+            self._by_word.setdefault(word, []).append(position)
+        if len(word_set) == 1:
+            for char in set(next(iter(word_set))):
+                self._by_char.setdefault(char, []).append(position)
+
+    def exact_matches(self, words: Iterable[str]) -> List[str]:
+        """Returns every phrase whose word set equals `words`, in catalog order."""
+        return [self.phrases[p] for p in self._exact.get(frozenset(words), [])]
+
+    def candidates(self, words: Iterable[str]) -> List[int]:
+        """Returns, in catalog order, the positions of phrases sharing a word with `words`.
+
+        When `words` is a single word, one-word phrases sharing a character are
+        included too, since those are compared character by character.
+        """
+        word_set = frozenset(words)
+        positions: Set[int] = set()
+        for word in word_set:
+            positions.update(self._by_word.get(word, ()))
+        if len(word_set) == 1:
+            for char in set(next(iter(word_set))):
+                positions.update(self._by_char.get(char, ()))
+        return sorted(positions)
+
+    def locale_of(self, phrase: str) -> Optional[str]:
+        """Returns the locale whose catalog the phrase came from, if it is indexed."""
+        position = self._positions.get(phrase)
+        return None if position is None else self.locales[position]
+
+
+class PhraseCompletions:
+    """Tells whether preprocessed words are a whole phrase that no longer phrase starts with."""
+
+    def __init__(self, sequences: Iterable[Sequence[str]]):
+        self._phrases: Set[Tuple[str, ...]] = set()
+        self._prefixes: Set[Tuple[str, ...]] = set()
+        for words in sequences:
+            words = tuple(words)
+            if not words:
+                continue
+            self._phrases.add(words)
+            for end in range(1, len(words)):
+                self._prefixes.add(words[:end])
+
+    def is_complete(self, words: Sequence[str]) -> bool:
+        words = tuple(words)
+        return words in self._phrases and words not in self._prefixes
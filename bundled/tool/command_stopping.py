@@ -0,0 +1,42 @@
+"""Stops Whisper generation as soon as the transcription is a whole command."""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import torch
+from transformers import StoppingCriteria
+
+
+class CommandStoppingCriteria(StoppingCriteria):
+    """Ends a sequence once the text after the decoder prompt is a complete command.
+
+    `is_complete` decides on the decoded text; it should only accept a phrase
+    that no longer catalog phrase, alias or group starts with, so stopping never
+    cuts a command short. Without it generation would continue to end-of-text,
+    spending decoder steps on trailing punctuation and filler.
+    """
+
+    def __init__(
+        self, tokenizer, is_complete: Callable[[str], bool], prompt_end_id: int
+    ):
+        self.tokenizer = tokenizer
+        self.is_complete = is_complete
+        self.prompt_end_id = prompt_end_id
+        self.stops = 0
+
+    def _complete(self, sequence) -> bool:
+        try:
+            start = len(sequence) - 1 - sequence[::-1].index(self.prompt_end_id)
+        except ValueError:
+            return False
+        text = self.tokenizer.decode(sequence[start + 1 :], skip_special_tokens=True)
+        return self.is_complete(text)
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
+    ) -> torch.BoolTensor:
+        done = [self._complete(sequence) for sequence in input_ids.tolist()]
+        if all(done):
+            self.stops += 1
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,104 @@
+"""Token-level trie over the command catalog for constrained Whisper decoding."""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import torch
+from transformers import LogitsProcessor
+
+
+class TrieNode:
+    """A single node of the command trie."""
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: Dict[int, TrieNode] = {}
+        self.terminal: bool = False
+
+
+class CommandTrie:
+    """Trie of Whisper token ids for every phrase the user can say."""
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.size = 0
+
+    def insert(self, token_ids: Sequence[int]) -> None:
+        """Adds one tokenized phrase to the trie."""
+        if not token_ids:
+            return
+        node = self.root
+        for token_id in token_ids:
+            node = node.children.setdefault(token_id, TrieNode())
+        if not node.terminal:
+            node.terminal = True
+            self.size += 1
+
+    def walk(self, token_ids: Sequence[int]) -> Optional[TrieNode]:
+        """Returns the node reached by following token_ids, or None if off the trie."""
+        node = self.root
+        for token_id in token_ids:
+            node = node.children.get(token_id)
+            if node is None:
+                return None
+        return node
+
+
+def build_command_trie(tokenizer, phrases: Iterable[str]) -> CommandTrie:
+    """Tokenizes phrases the way Whisper emits them (leading space) and builds the trie."""
+    trie = CommandTrie()
+    for phrase in phrases:
+        phrase = phrase.split("\n")[0].strip()
+        if phrase:
+            trie.insert(tokenizer.encode(" " + phrase, add_special_tokens=False))
+    return trie
+
+
+class CommandTrieLogitsProcessor(LogitsProcessor):
+    """Masks every token that does not continue a catalog phrase.
+
+    Decoding is left alone until the decoder prompt has been emitted (the prompt
+    ends with `prompt_end_id`, normally `<|notimestamps|>`). After that only
+    children of the current trie node are allowed, plus end-of-text once a full
+    phrase has been produced. A leaf only allows end-of-text, so generation stops
+    as soon as a command is complete. If Whisper's own processors already
+    suppressed every token the trie allows, end-of-text is allowed instead, so
+    generation ends rather than picking from a row that is all -inf.
+    """
+
+    def __init__(self, trie: CommandTrie, prompt_end_id: int, eos_token_id: int):
+        self.trie = trie
+        self.prompt_end_id = prompt_end_id
+        self.eos_token_id = eos_token_id
+
+    def allowed_tokens(self, sequence: List[int]) -> Optional[List[int]]:
+        """Returns the allowed next tokens for one decoder sequence, None if unconstrained."""
+        try:
+            start = len(sequence) - 1 - sequence[::-1].index(self.prompt_end_id)
+        except ValueError:
+            return None
+        node = self.trie.walk(sequence[start + 1 :])
+        if node is None:
+            return [self.eos_token_id]
+        allowed = list(node.children)
+        if node.terminal or not allowed:
+            allowed.append(self.eos_token_id)
+        return allowed
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        mask = torch.full_like(scores, float("-inf"))
+        for row, sequence in enumerate(input_ids.tolist()):
+            allowed = self.allowed_tokens(sequence)
+            if allowed is None:
+                mask[row] = 0
+            else:
+                mask[row, allowed] = 0
+        scores = scores + mask
+        blocked = torch.isneginf(scores).all(dim=-1)
+        if blocked.any():
+            scores[blocked, self.eos_token_id] = 0.0
+        return scores
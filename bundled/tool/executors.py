@@ -0,0 +1,85 @@
+"""Thread pools that report how much work is waiting for them.
+
+The server keeps blocking work off the event loop on two pools: a single
+thread for audio capture and inference (the models aren't thread-safe and
+run one at a time), and a small pool for LSP handlers that block. Keeping
+them apart means a handler never waits behind a Whisper decode. Each pool
+counts the tasks queued for a thread and how long they waited, so a backlog
+on either shows up in the metrics.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class MonitoredExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that tracks its queue depth and queueing time."""
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self._wait_total = 0.0
+        self.wait_max = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        submitted = time.monotonic()
+        started = False
+
+        def run():
+            nonlocal started
+            wait = time.monotonic() - submitted
+            with self._stats_lock:
+                started = True
+                self.queued -= 1
+                self.running += 1
+                self._wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        def done(future: Future):
+            # A task cancelled before it started never leaves the queue through `run`
+            if future.cancelled():
+                with self._stats_lock:
+                    if not started:
+                        self.queued -= 1
+
+        with self._stats_lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            future = super().submit(run)
+        except RuntimeError:
+            # Shut down
+            with self._stats_lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(done)
+        return future
+
+    def stats(self) -> Dict[str, float]:
+        """Tasks waiting for and holding a thread, and how long tasks waited."""
+        with self._stats_lock:
+            started = self.completed + self.running
+            return {
+                "threads": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "wait_mean_s": self._wait_total / started if started else 0.0,
+                "wait_max_s": self.wait_max,
+            }
@@ -0,0 +1,281 @@
+"""Shared, incremental log-mel feature extraction for the wake-word classifier and Whisper.
+
+Both models want 25 ms frames every 10 ms at 16 kHz, but they differ in framing
+(Whisper centers its frames, AST does not), window, FFT size, pre-processing and
+mel scale, so their spectra can't be derived from one another. What is shared is
+the audio stream and the work per configuration: each distinct mel configuration
+is computed once per frame, as samples arrive, into a preallocated ring. The
+overlapping windows the classifier looks at and the growing window Whisper
+re-reads on every update are then served from frames that were already computed.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+from transformers.audio_utils import mel_filter_bank, window_function
+
+# Log10 mel energy of digital silence, what Whisper sees for its zero padding.
+WHISPER_SILENCE = -10.0
+
+
+class MelConfig:
+    """Everything needed to turn frames of samples into log-mel features."""
+
+    def __init__(
+        self,
+        mel_filters: np.ndarray,
+        window: np.ndarray,
+        hop_length: int,
+        fft_length: int,
+        log: str,
+        mel_floor: float,
+        center: bool = False,
+        preemphasis: Optional[float] = None,
+        remove_dc_offset: bool = False,
+    ):
+        self.mel_filters = np.asarray(mel_filters, dtype=np.float32)
+        self.window = np.asarray(window, dtype=np.float32)
+        self.frame_length = len(window)
+        self.hop_length = hop_length
+        self.fft_length = fft_length
+        self.log = log
+        self.mel_floor = mel_floor
+        self.center = center
+        self.preemphasis = preemphasis
+        self.remove_dc_offset = remove_dc_offset
+
+    @property
+    def n_mels(self) -> int:
+        return self.mel_filters.shape[1]
+
+    def key(self) -> tuple:
+        """Identifies configurations that produce identical frames."""
+        return (
+            self.mel_filters.tobytes(),
+            self.window.tobytes(),
+            self.hop_length,
+            self.fft_length,
+            self.log,
+            self.mel_floor,
+            self.center,
+            self.preemphasis,
+            self.remove_dc_offset,
+        )
+
+    def log_mel(self, frames: np.ndarray) -> np.ndarray:
+        """Vectorized `(frames, frame_length)` samples to `(n_mels, frames)` log-mel."""
+        frames = frames.astype(np.float32)
+        if self.remove_dc_offset:
+            frames = frames - frames.mean(axis=1, keepdims=True)
+        if self.preemphasis is not None:
+            frames[:, 1:] -= self.preemphasis * frames[:, :-1]
+            frames[:, 0] *= 1 - self.preemphasis
+        spectrum = (
+            np.abs(np.fft.rfft(frames * self.window, n=self.fft_length, axis=-1)) ** 2
+        )
+        mel = np.maximum(spectrum @ self.mel_filters, self.mel_floor)
+        return (np.log10(mel) if self.log == "log10" else np.log(mel)).T
+
+
+def whisper_mel_config(feature_extractor) -> MelConfig:
+    """Matches WhisperFeatureExtractor (periodic Hann, centered frames, log10)."""
+    return MelConfig(
+        mel_filters=feature_extractor.mel_filters,
+        window=window_function(feature_extractor.n_fft, "hann"),
+        hop_length=feature_extractor.hop_length,
+        fft_length=feature_extractor.n_fft,
+        log="log10",
+        mel_floor=1e-10,
+        center=True,
+    )
+
+
+def ast_mel_config(feature_extractor) -> MelConfig:
+    """Matches ASTFeatureExtractor's Kaldi-style filter banks."""
+    mel_filters = getattr(feature_extractor, "mel_filters", None)
+    if mel_filters is None:
+        mel_filters = mel_filter_bank(
+            num_frequency_bins=257,
+            num_mel_filters=feature_extractor.num_mel_bins,
+            min_frequency=20,
+            max_frequency=feature_extractor.sampling_rate // 2,
+            sampling_rate=feature_extractor.sampling_rate,
+            norm=None,
+            mel_scale="kaldi",
+            triangularize_in_mel_space=True,
+        )
+    return MelConfig(
+        mel_filters=mel_filters,
+        window=window_function(400, "hann", periodic=False),
+        hop_length=160,
+        fft_length=512,
+        log="log",
+        mel_floor=1.192092955078125e-07,
+        preemphasis=0.97,
+        remove_dc_offset=True,
+    )
+
+
+class IncrementalMel:
+    """Log-mel frames of a sample stream, each computed once, kept in a fixed-size ring."""
+
+    def __init__(self, config: MelConfig, capacity: int, fill_value: float):
+        self.config = config
+        self.capacity = capacity
+        self.fill_value = fill_value
+        self.ring = np.full((config.n_mels, capacity), fill_value, dtype=np.float32)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets all audio."""
+        self.ring.fill(self.fill_value)
+        self.written = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._started = not self.config.center
+
+    def push(self, samples: np.ndarray) -> int:
+        """Adds samples and computes the frames they complete. Returns the number of new frames."""
+        config = self.config
+        samples = np.asarray(samples, dtype=np.float32)
+        if not self._started:
+            samples = np.concatenate([self._pending, samples])
+            if len(samples) <= config.frame_length // 2:
+                self._pending = samples
+                return 0
+            # Same reflect padding the feature extractor applies to the start of the audio
+            samples = np.pad(samples, (config.frame_length // 2, 0), mode="reflect")
+            self._pending = np.zeros(0, dtype=np.float32)
+            self._started = True
+        buffer = np.concatenate([self._pending, samples])
+        if len(buffer) < config.frame_length:
+            self._pending = buffer
+            return 0
+        count = 1 + (len(buffer) - config.frame_length) // config.hop_length
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, config.frame_length)[
+            :: config.hop_length
+        ][:count]
+        log_mel = config.log_mel(frames)
+        first = self.written
+        if count > self.capacity:
+            log_mel = log_mel[:, -self.capacity :]
+            first += count - self.capacity
+        positions = (first + np.arange(log_mel.shape[1])) % self.capacity
+        self.ring[:, positions] = log_mel
+        self.written += count
+        self._pending = buffer[count * config.hop_length :]
+        return count
+
+    def latest(self, n_frames: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the last `n_frames` frames in time order, `(n_mels, n_frames)`.
+
+        Without `out` the ring itself may be returned; with it the frames are
+        copied into `out`.
+        """
+        n_frames = min(n_frames, self.capacity)
+        if self.written <= self.capacity and n_frames == self.capacity:
+            if out is None:
+                return self.ring
+            out[...] = self.ring
+            return out
+        end = self.written % self.capacity
+        positions = (end - n_frames + np.arange(n_frames)) % self.capacity
+        if out is None:
+            return self.ring[:, positions]
+        return np.take(self.ring, positions, axis=1, out=out)
+
+
+class FeatureFrontEnd:
+    """Feeds one audio stream to every registered mel configuration.
+
+    Consumers asking for the same configuration share one IncrementalMel.
+    Only active consumers are computed, so features for a model that isn't
+    running (Whisper while waiting for the wake word) cost nothing.
+    """
+
+    def __init__(self):
+        self._streams: Dict[tuple, IncrementalMel] = {}
+        self._consumers: Dict[str, tuple] = {}
+        self._active: Dict[str, bool] = {}
+
+    def register(
+        self, name: str, config: MelConfig, capacity: int, fill_value: float
+    ) -> IncrementalMel:
+        """Returns the (possibly shared) incremental mel for a consumer.
+
+        A shared configuration keeps the capacity it was first registered with.
+        """
+        key = config.key()
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = IncrementalMel(config, capacity, fill_value)
+            self._streams[key] = stream
+        self._consumers[name] = key
+        self._active[name] = False
+        return stream
+
+    def activate(self, name: str) -> None:
+        """Starts computing a consumer's frames from the next samples on."""
+        self._active[name] = True
+        self._streams[self._consumers[name]].reset()
+
+    def is_active(self, name: str) -> bool:
+        """Returns whether a consumer's frames are being computed."""
+        return self._active.get(name, False)
+
+    def deactivate(self, name: str) -> None:
+        """Stops computing a consumer's frames (unless another active consumer shares them)."""
+        self._active[name] = False
+
+    def push(self, samples: np.ndarray) -> None:
+        """Computes new frames for every configuration that has an active consumer."""
+        keys = {
+            self._consumers[name] for name, active in self._active.items() if active
+        }
+        for key in keys:
+            self._streams[key].push(samples)
+
+
+def whisper_input_features(
+    mel: IncrementalMel, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Normalizes a Whisper ring the way WhisperFeatureExtractor does, into `out` if given."""
+    log_spec = mel.latest(
+        mel.capacity, out=np.empty_like(mel.ring) if out is None else out
+    )
+    np.maximum(log_spec, log_spec.max() - 8.0, out=log_spec)
+    log_spec += 4.0
+    log_spec /= 4.0
+    return log_spec
+
+
+def normalize_ast(fbank: np.ndarray, feature_extractor) -> np.ndarray:
+    """Normalizes filter banks in place like ASTFeatureExtractor."""
+    if feature_extractor.do_normalize:
+        fbank -= feature_extractor.mean
+        fbank /= feature_extractor.std * 2
+    return fbank
+
+
+def ast_input_values(
+    mel: IncrementalMel,
+    n_frames: int,
+    feature_extractor,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Pads the latest frames to the model's length and normalizes them like ASTFeatureExtractor.
+
+    `out`, shaped `(max_length, n_mels)`, is filled instead of a new array.
+    """
+    max_length = feature_extractor.max_length
+    fbank = (
+        np.zeros((max_length, mel.config.n_mels), dtype=np.float32)
+        if out is None
+        else out
+    )
+    frames = min(n_frames, mel.written, max_length)
+    if frames:
+        mel.latest(frames, out=fbank[:frames].T)
+    fbank[frames:] = 0.0
+    return normalize_ast(fbank, feature_extractor)
@@ -0,0 +1,347 @@
+"""Supervised worker process for the wake-word classifier and Whisper.
+
+Running the models inside the language server means a slow decode holds up
+LSP messages and a crash in native code takes the server down. Here the
+pipelines live in a child process instead. Audio goes to it through a
+`multiprocessing.shared_memory` block (only lengths and options are pickled)
+and results come back over a queue. If the worker dies or stops answering it
+is killed and started again on the next request.
+
+`RemoteClassifier` and `RemoteTranscriber` are called like the pipelines
+they replace, so the listening loop doesn't care where inference runs.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from resources import registry
+
+# Seconds a request may take before the worker is considered hung.
+DEFAULT_TIMEOUT_S = 60.0
+# Seconds of audio the shared block holds, enough for a whole Whisper window.
+DEFAULT_CAPACITY_S = 30.0
+# Seconds to wait before starting again a worker that failed to start.
+RESTART_BACKOFF_S = 5.0
+_POLL_S = 0.1
+
+
+class WorkerError(RuntimeError):
+    """The worker failed a request. If it died or hung it is restarted for the next one."""
+
+
+def _worker_main(config: Dict[str, Any], shm_name: str, requests, results) -> None:
+    # stdout is the language server's JSON-RPC channel, keep anything printed off it
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    import torch
+    from transformers import WhisperTokenizer, pipeline
+
+    if config.get("num_threads"):
+        torch.set_num_threads(config["num_threads"])
+    classifier = pipeline(
+        "audio-classification",
+        model=config["classifier_model"],
+        device=config["device"],
+    )
+    tokenizer = WhisperTokenizer.from_pretrained(
+        config["transcriber_model"], language=config["language"], task="transcribe"
+    )
+    transcriber = pipeline(
+        "automatic-speech-recognition",
+        model=config["transcriber_model"],
+        device=config["device"],
+        tokenizer=tokenizer,
+    )
+    shm = shared_memory.SharedMemory(name=shm_name)
+    audio = np.ndarray((shm.size // 4,), dtype=np.float32, buffer=shm.buf)
+    logits_processor = None
+    results.put(("ready", None))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        operation, lengths, options = request
+        try:
+            offsets = np.cumsum([0, *lengths])
+            windows = [audio[offsets[i] : offsets[i + 1]] for i in range(len(lengths))]
+            if operation == "classify":
+                payload = classifier(
+                    [w.copy() for w in windows],
+                    batch_size=len(windows),
+                    top_k=options["top_k"],
+                )
+            elif operation == "transcribe":
+                generate_kwargs = dict(options["generate_kwargs"])
+                if "logits_processor" in options:
+                    logits_processor = options["logits_processor"]
+                if options["use_logits_processor"]:
+                    generate_kwargs["logits_processor"] = logits_processor
+                sampling_rate = transcriber.feature_extractor.sampling_rate
+                payload = transcriber(
+                    {"raw": windows[0].copy(), "sampling_rate": sampling_rate},
+                    generate_kwargs=generate_kwargs,
+                )["text"]
+            else:
+                raise ValueError(f"Unknown operation {operation!r}")
+            results.put(("ok", payload))
+        except Exception:  # pylint: disable=broad-except
+            results.put(("error", traceback.format_exc()))
+    del audio
+    shm.close()
+
+
+@contextlib.contextmanager
+def _worker_main_module():
+    """Makes this module the main module a spawned worker runs before `_worker_main`.
+
+    A spawned child first re-runs the parent's main module. For the server that
+    is all of lsp_server.py, which would create another language server, load
+    the command catalogs and aliases, and could print onto the JSON-RPC stdout
+    before the worker gets to redirect it. This module only imports NumPy.
+    """
+    main_module = sys.modules["__main__"]
+    sys.modules["__main__"] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main_module
+
+
+class InferenceWorker:
+    """Starts, feeds and supervises the worker process. One request at a time."""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        capacity: int,
+        timeout_s: float = DEFAULT_TIMEOUT_S,
+    ):
+        self.config = config
+        self.timeout_s = timeout_s
+        self._context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=capacity * 4)
+        self._audio = np.ndarray((capacity,), dtype=np.float32, buffer=self._shm.buf)
+        self._lock = threading.Lock()
+        self._process = None
+        self._resource_id = None
+        self._requests = None
+        self._results = None
+        self._sent_processor = None
+        self._retry_at = 0.0
+        self.starts = 0
+        self.failures = 0
+        self.requests = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """Starts the worker and waits until its models are loaded."""
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self.config, self._shm.name, self._requests, self._results),
+            name="voice-control-inference",
+            daemon=True,
+        )
+        with _worker_main_module():
+            self._process.start()
+        self._resource_id = registry.add_process(
+            "worker", self._process.name, self._process
+        )
+        self._sent_processor = None
+        self.starts += 1
+        try:
+            self._receive(None)
+        except WorkerError:
+            self._kill()
+            raise
+
+    def _receive(self, timeout_s: Optional[float]):
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        while True:
+            try:
+                return self._results.get(timeout=_POLL_S)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise WorkerError(
+                        f"Inference worker exited with code {self._process.exitcode}"
+                    ) from None
+                if deadline is not None and time.monotonic() > deadline:
+                    raise WorkerError(
+                        f"Inference worker didn't answer within {timeout_s}s"
+                    ) from None
+
+    def _kill(self) -> None:
+        if self._process is not None:
+            registry.remove(self._resource_id)
+            if self._process.is_alive():
+                self._process.kill()
+            self._process.join()
+            self._process = None
+        for channel in (self._requests, self._results):
+            if channel is not None:
+                channel.close()
+                channel.cancel_join_thread()
+        self._requests = self._results = None
+
+    def _call(
+        self, operation: str, windows: Sequence[np.ndarray], options: Dict[str, Any]
+    ):
+        with self._lock:
+            if not self.alive:
+                if time.monotonic() < self._retry_at:
+                    raise WorkerError("Inference worker is waiting to be restarted")
+                self._kill()
+                try:
+                    self.start()
+                except WorkerError:
+                    self._retry_at = time.monotonic() + RESTART_BACKOFF_S
+                    raise
+            lengths = [len(window) for window in windows]
+            if sum(lengths) > len(self._audio):
+                raise ValueError(
+                    f"{sum(lengths)} samples don't fit the shared audio block"
+                )
+            offset = 0
+            for window in windows:
+                self._audio[offset : offset + len(window)] = window
+                offset += len(window)
+            self.requests += 1
+            self._requests.put((operation, lengths, options))
+            try:
+                status, payload = self._receive(self.timeout_s)
+            except WorkerError:
+                self.failures += 1
+                self._kill()
+                raise
+            if status == "error":
+                self.failures += 1
+                raise WorkerError(payload)
+            return payload
+
+    def classify(
+        self, windows: Sequence[np.ndarray], top_k: int = 5
+    ) -> List[List[Dict]]:
+        """Returns the pipeline's predictions for each window."""
+        return self._call("classify", windows, {"top_k": top_k})
+
+    def transcribe(
+        self, samples: np.ndarray, generate_kwargs: Optional[Dict] = None
+    ) -> str:
+        """Returns Whisper's transcription of the samples."""
+        generate_kwargs = dict(generate_kwargs or {})
+        processor = generate_kwargs.pop("logits_processor", None)
+        options = {
+            "generate_kwargs": generate_kwargs,
+            "use_logits_processor": processor is not None,
+        }
+        # The (possibly large) command trie is only sent when it changes
+        if processor is not None and processor is not self._sent_processor:
+            options["logits_processor"] = processor
+        text = self._call("transcribe", [samples], options)
+        if processor is not None:
+            self._sent_processor = processor
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        """Restart, failure and request counts."""
+        return {
+            "alive": int(self.alive),
+            "restarts": max(self.starts - 1, 0),
+            "failures": self.failures,
+            "requests": self.requests,
+        }
+
+    def close(self) -> None:
+        """Stops the worker and frees the shared audio block."""
+        with self._lock:
+            if self._shm is None:
+                return
+            if self.alive:
+                self._requests.put(None)
+                self._process.join(timeout=5)
+            self._kill()
+            self._audio = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def _samples(window) -> np.ndarray:
+    return window["raw"] if isinstance(window, dict) else window
+
+
+class RemoteClassifier:
+    """Stands in for the audio-classification pipeline, classifying in the worker."""
+
+    def __init__(
+        self,
+        worker: InferenceWorker,
+        feature_extractor,
+        on_error: Optional[Callable[[str], None]] = None,
+    ):
+        self.worker = worker
+        self.feature_extractor = feature_extractor
+        self.on_error = on_error
+
+    def __call__(self, inputs, batch_size: Optional[int] = None):
+        if isinstance(inputs, list):
+            return self._classify(inputs)
+        return self._stream(inputs)
+
+    def _classify(self, windows: List) -> List[List[Dict]]:
+        try:
+            return self.worker.classify([_samples(window) for window in windows])
+        except WorkerError as error:
+            # Skip the windows; the worker is restarted for the next ones
+            if self.on_error:
+                self.on_error(str(error))
+            return []
+
+    def _stream(self, windows: Iterable) -> Iterator[List[Dict]]:
+        for window in windows:
+            yield from self._classify([window])
+
+
+class RemoteTranscriber:
+    """Stands in for the streaming ASR pipeline, transcribing in the worker."""
+
+    def __init__(
+        self,
+        worker: InferenceWorker,
+        feature_extractor,
+        on_error: Optional[Callable[[str], None]] = None,
+    ):
+        self.worker = worker
+        self.feature_extractor = feature_extractor
+        self.on_error = on_error
+
+    def __call__(
+        self, inputs: Iterable, generate_kwargs: Optional[Dict] = None
+    ) -> Iterator[Dict]:
+        text = ""
+        for item in inputs:
+            try:
+                text = self.worker.transcribe(_samples(item), generate_kwargs)
+            except WorkerError as error:
+                if self.on_error:
+                    self.on_error(str(error))
+                # End the utterance with what was heard so far
+                yield {"text": text, "partial": [False]}
+                return
+            partial = item.get("partial", False) if isinstance(item, dict) else False
+            yield {"text": text, "partial": [partial]}
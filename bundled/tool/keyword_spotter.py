@@ -0,0 +1,138 @@
+"""Tiny first-stage keyword spotter for the wake-word cascade.
+
+Runs on every captured window and only lets through windows that might contain
+the wake word; those are then confirmed by the full AST classifier. The model
+is an MFCC front-end followed by a small CNN/GRU, loaded from a local file
+saved with `torch.save`. The file holds either a bare `TinyKeywordSpotter`
+state_dict or `{"config": {...}, "state_dict": {...}}` where `config` holds
+the constructor arguments.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, Tuple, Union
+
+import numpy as np
+import torch
+from torch import nn
+
+
+def _hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + np.asarray(hz) / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (np.asarray(mel) / 2595.0) - 1.0)
+
+
+def mel_filterbank(sampling_rate: int, n_fft: int, n_mels: int) -> np.ndarray:
+    """HTK-style triangular mel filters, shape `(n_fft // 2 + 1, n_mels)`."""
+    fft_freqs = np.linspace(0, sampling_rate / 2, n_fft // 2 + 1)
+    mel_points = np.linspace(
+        _hz_to_mel(20.0), _hz_to_mel(sampling_rate / 2), n_mels + 2
+    )
+    hz_points = _mel_to_hz(mel_points)
+    filters = np.zeros((n_fft // 2 + 1, n_mels), dtype=np.float32)
+    for m in range(n_mels):
+        left, center, right = hz_points[m : m + 3]
+        rising = (fft_freqs - left) / (center - left)
+        falling = (right - fft_freqs) / (right - center)
+        filters[:, m] = np.maximum(0.0, np.minimum(rising, falling))
+    return filters
+
+
+def dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, shape `(n_mels, n_mfcc)`."""
+    n = np.arange(n_mels)[:, None]
+    k = np.arange(n_mfcc)[None, :]
+    basis = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+class MFCC:
+    """Vectorized NumPy MFCCs with precomputed window, filterbank and DCT."""
+
+    def __init__(
+        self,
+        sampling_rate: int = 16000,
+        n_fft: int = 512,
+        win_length: int = 400,
+        hop_length: int = 160,
+        n_mels: int = 40,
+        n_mfcc: int = 13,
+    ):
+        self.n_fft = n_fft
+        self.win_length = win_length
+        self.hop_length = hop_length
+        self.window = np.hamming(win_length).astype(np.float32)
+        self.filters = mel_filterbank(sampling_rate, n_fft, n_mels)
+        self.dct = dct_matrix(n_mels, n_mfcc)
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        """Returns `(n_mfcc, frames)` coefficients for the samples."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) < self.win_length:
+            samples = np.pad(samples, (0, self.win_length - len(samples)))
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.win_length)[
+            :: self.hop_length
+        ]
+        spectrum = np.abs(np.fft.rfft(frames * self.window, n=self.n_fft, axis=-1)) ** 2
+        log_mel = np.log(spectrum @ self.filters + 1e-6)
+        return (log_mel @ self.dct).T
+
+
+class TinyKeywordSpotter(nn.Module):
+    """Two 1-D convolutions over MFCC frames, a GRU, and a sigmoid wake-word score."""
+
+    def __init__(self, n_mfcc: int = 13, channels: int = 32, hidden_size: int = 32):
+        super().__init__()
+        self.conv = nn.Sequential(
+            nn.Conv1d(n_mfcc, channels, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv1d(channels, channels, kernel_size=3, padding=1, stride=2),
+            nn.ReLU(),
+        )
+        self.gru = nn.GRU(channels, hidden_size, batch_first=True)
+        self.out = nn.Linear(hidden_size, 1)
+
+    def forward(self, mfcc: torch.Tensor) -> torch.Tensor:
+        """Maps `(batch, n_mfcc, frames)` to a `(batch,)` wake-word probability."""
+        features = self.conv(mfcc).transpose(1, 2)
+        _, hidden = self.gru(features)
+        return torch.sigmoid(self.out(hidden[-1])).squeeze(-1)
+
+
+class KeywordSpotter:
+    """Scores audio windows with a TinyKeywordSpotter loaded from disk."""
+
+    def __init__(self, path: str, sampling_rate: int = 16000, threshold: float = 0.5):
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+        config: Dict = {}
+        if "state_dict" in checkpoint:
+            config = checkpoint.get("config", {})
+            checkpoint = checkpoint["state_dict"]
+        self.model = TinyKeywordSpotter(**config)
+        self.model.load_state_dict(checkpoint)
+        self.model.eval()
+        self.mfcc = MFCC(
+            sampling_rate=sampling_rate, n_mfcc=self.model.conv[0].in_channels
+        )
+        self.threshold = threshold
+
+    def score(self, samples: np.ndarray) -> float:
+        """Returns the wake-word probability for one window of samples."""
+        features = torch.from_numpy(self.mfcc(samples)[None])
+        with torch.inference_mode():
+            return float(self.model(features)[0])
+
+    def filter(
+        self, windows: Iterable[Union[Dict, np.ndarray]]
+    ) -> Iterator[Tuple[int, Union[Dict, np.ndarray]]]:
+        """Yields `(position, window)` for the microphone windows (dicts or sample arrays)
+        whose score reaches the threshold, `position` being the window's index in `windows`.
+        """
+        for position, window in enumerate(windows):
+            samples = window["raw"] if isinstance(window, dict) else window
+            if self.score(samples) >= self.threshold:
+                yield position, window
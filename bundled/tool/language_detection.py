@@ -0,0 +1,65 @@
+"""Language detection restricted to the user's locales for multi-locale matching.
+
+When commands are matched in several locales, Whisper isn't told the
+language, and its `generate` detects one among every language it knows, so
+a short command can come out in a language the user never speaks.
+`LocaleLanguage` holds a copy of the generation config whose language table
+only has the locales' languages, so detection picks one of them. As a logits
+processor it also sees the language token the first decode chose and writes
+it into that config, so later decodes of the same utterance (every
+streaming update, a cascade escalation) are forced to it instead of
+detecting again.
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Iterable, Optional
+
+import torch
+from transformers import LogitsProcessor
+from transformers.models.whisper.tokenization_whisper import TO_LANGUAGE_CODE
+
+
+class LocaleLanguage(LogitsProcessor):
+    """Detects the language once per utterance among `languages` (Whisper language names)."""
+
+    def __init__(self, generation_config, languages: Iterable[str]):
+        tokens = {f"<|{TO_LANGUAGE_CODE.get(name, name)}|>" for name in languages}
+        self.generation_config = copy.deepcopy(generation_config)
+        self.generation_config.lang_to_id = {
+            token: token_id
+            for token, token_id in generation_config.lang_to_id.items()
+            if token in tokens
+        }
+        if not self.generation_config.lang_to_id:
+            raise ValueError(f"Whisper knows none of the languages {sorted(tokens)}")
+        self.generation_config.task = "transcribe"
+        self.generation_config.language = None
+        self.generation_config.forced_decoder_ids = None
+        self._languages = {
+            token_id: token[2:-2]
+            for token, token_id in self.generation_config.lang_to_id.items()
+        }
+        self._start_id = generation_config.decoder_start_token_id
+
+    @property
+    def language(self) -> Optional[str]:
+        """The language code detected for this utterance, None before the first decode."""
+        return self.generation_config.language
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        if self.generation_config.language is None:
+            sequence = input_ids[0].tolist()
+            for position, token_id in enumerate(sequence[:-1]):
+                if (
+                    token_id == self._start_id
+                    and sequence[position + 1] in self._languages
+                ):
+                    self.generation_config.language = self._languages[
+                        sequence[position + 1]
+                    ]
+                    break
+        return scores
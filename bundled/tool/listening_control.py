@@ -0,0 +1,69 @@
+"""Pause, resume and cancel state shared by the listening loop and the LSP requests."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Dict, Optional
+
+
+class ListeningControl:
+    """Whether the listening loop may capture audio, and whether to abort a transcription.
+
+    `pause` and `resume` are called on the event loop; `cancelled` is polled by
+    the transcription running on the inference thread. A lock keeps a pause
+    from landing between a transcription's check of `paused` and its reset of
+    `cancelled`, where it would be lost.
+    """
+
+    def __init__(self):
+        self.paused = False
+        self.transcribing = False
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._resumed: Optional[asyncio.Event] = None
+
+    def _resumed_event(self) -> asyncio.Event:
+        # Created on first use so it belongs to the server's running loop
+        if self._resumed is None:
+            self._resumed = asyncio.Event()
+            if not self.paused:
+                self._resumed.set()
+        return self._resumed
+
+    async def wait_until_resumed(self) -> None:
+        await self._resumed_event().wait()
+
+    def pause(self) -> None:
+        """Stops capture and inference, abandoning a transcription in progress."""
+        with self._lock:
+            self.paused = True
+            self._resumed_event().clear()
+            self.cancelled.set()
+
+    def resume(self) -> None:
+        with self._lock:
+            self.paused = False
+            self._resumed_event().set()
+
+    def cancel(self) -> bool:
+        """Abandons the transcription in progress. Returns False if there is none."""
+        with self._lock:
+            if not self.transcribing:
+                return False
+            self.cancelled.set()
+            return True
+
+    def start_transcription(self) -> None:
+        # A pause that came in before the transcription started still applies to it
+        with self._lock:
+            if not self.paused:
+                self.cancelled.clear()
+            self.transcribing = True
+
+    def end_transcription(self) -> None:
+        with self._lock:
+            self.transcribing = False
+
+    def state(self) -> Dict[str, bool]:
+        return {"paused": self.paused, "transcribing": self.transcribing}
@@ -10,7 +10,7 @@ import copy
 import json
 import os
 import pathlib
-from time import sleep
+import time
 import re
 import sys
 import sysconfig
@@ -49,7 +49,9 @@ WORKSPACE_SETTINGS = {}
 GLOBAL_SETTINGS = {}
 RUNNER = pathlib.Path(__file__).parent / "lsp_runner.py"
 
-MAX_WORKERS = 5
+# pygls's own pool; no handler uses it, blocking handlers run on `handler_executor` and
+# the listening loop on `inference_executor`
+MAX_WORKERS = 1
 LSP_SERVER = server.LanguageServer(
     name="VoiceControl", version="0.1.0", max_workers=MAX_WORKERS
 )
@@ -57,68 +59,271 @@ LSP_SERVER = server.LanguageServer(
 # **********************************************************
 # Speech to text and text to command
 # **********************************************************
-from transformers import pipeline, WhisperTokenizer, WhisperFeatureExtractor
-from transformers.pipelines.audio_utils import ffmpeg_microphone_live
+from transformers import (
+    pipeline,
+    AutoFeatureExtractor,
+    GenerationConfig,
+    LogitsProcessorList,
+    StoppingCriteriaList,
+    WhisperTokenizer,
+    WhisperFeatureExtractor,
+    WhisperForConditionalGeneration,
+)
 import torch
+import numpy as np
 import io
-import threading
+import functools
 from contextlib import redirect_stdout
 
 import text2command
 import commands
-import platform
+import executors
+import resources
+import asr_cascade
+import audio_capture
+import calibration
+import chunk_queue
+import command_stopping
+import command_trie
+import features
+import inference_worker as worker
+import keyword_spotter as kws
+import language_detection
+from listening_control import ListeningControl
+import metrics
+import model_residency
+import streaming_asr
+import vad
+import wake_word_detector
+import wake_word_scorer
 
 # Uncomment this line to see all of the possible wake words
 # print(classifier.model.config.id2label)
 
 
-# Once "Using microphone:" is printed that's when mic starts listening #TEST
-def monitor_microphone_output(output_buffer, stop_event):
-    system = platform.system()
-    if system != "Windows":
-        LSP_SERVER.send_notification("custom/notification", {"content": "listen"})
-        stop_event.set()
+# Tells the extension the microphone is open and a command can be said
+def notify_listening():
+    LSP_SERVER.send_notification("custom/notification", {"content": "listen"})
 
-    while not stop_event.is_set():
-        if "Using microphone:" in output_buffer.getvalue():
-            LSP_SERVER.send_notification("custom/notification", {"content": "listen"})
-            stop_event.set()  # Stop monitoring once the message is detected
 
+# Supervised process running the models when the inference worker is enabled
+inference_worker = None
+
+# Unloads Whisper after the configured idle time, None when it always stays loaded
+whisper_model = None
+
+# Decodes each utterance with whisper-tiny first and Whisper base only when needed,
+# None when the cascade is off
+cascade = None
+
+# Streams transcriptions with their confidence when low-confidence ones are rejected
+confidence_decoder = None
+
+# Scores wake-word windows on the model directly when direct inference is on, None to
+# use the pipeline
+wake_scorer = None
+
+# Capture and inference run on their own thread, the listening loop on the event loop
+inference_executor = executors.MonitoredExecutor(1, "VoiceControlInference")
+resources.registry.add(
+    "executor",
+    "VoiceControlInference",
+    stop=lambda: inference_executor.shutdown(wait=False),
+    alive=lambda: True,
+)
+# LSP handlers that block run on these threads, so they never wait behind inference.
+# Created in initialize with the configured number of threads.
+handler_executor = None
+listening = ListeningControl()
+listening_task = None
+# Set once the server starts going away; the executors may already be shut down
+shutting_down = False
+# Seconds the shutdown request waits for the listening loop to close its stream
+LISTENING_STOP_TIMEOUT_S = 5.0
+
+# Command-only decoding tries per set of matching locales, each rebuilt when its catalog,
+# aliases or groups change
+_command_trie_cache = {}
+
+
+# Builds (or reuses) the logits processor that restricts Whisper to catalog commands
+def get_command_trie_processor():
+    # Only file metadata is checked per transcription; the names are read on a rebuild
+    key = text2command.getVocabularyVersion(matchingLocales)
+    cached = _command_trie_cache.get(tuple(matchingLocales))
+    if cached is None or cached[0] != key:
+        phrases = list(text2command.getCommandIndex(matchingLocales).phrases)
+        phrases += text2command.getAliasNames()
+        phrases += text2command.getCommandGroupNames(matchingLocales)
+        trie = command_trie.build_command_trie(tokenizer, phrases)
+        processor = command_trie.CommandTrieLogitsProcessor(
+            trie,
+            prompt_end_id=tokenizer.convert_tokens_to_ids("<|notimestamps|>"),
+            eos_token_id=tokenizer.eos_token_id,
+        )
+        cached = (key, processor)
+        _command_trie_cache[tuple(matchingLocales)] = cached
+        log_to_output(f"Built command trie with {trie.size} phrases")
+    return cached[1]
 
-# Transcribes speech and converts it to text
-def transcribe(chunk_length_s=5.0, stream_chunk_s=0.75):
-    sampling_rate = transcriber.feature_extractor.sampling_rate
-    # Set up a buffer to capture stdout
-    output_buffer = io.StringIO()
-    stop_event = threading.Event()
 
-    # Start monitoring output in a separate thread
-    monitor_thread = threading.Thread(
-        target=monitor_microphone_output, args=(output_buffer, stop_event)
+# Stops Whisper once its text is a whole command, alias or group name that no longer
+# phrase starts with
+def get_command_stopping_criteria():
+    completions = text2command.getPhraseCompletions(matchingLocales)
+    return command_stopping.CommandStoppingCriteria(
+        tokenizer,
+        functools.partial(text2command.isCompleteCommand, completions=completions),
+        prompt_end_id=tokenizer.convert_tokens_to_ids("<|notimestamps|>"),
     )
-    monitor_thread.start()
-    with redirect_stdout(output_buffer):
-        mic = ffmpeg_microphone_live(
-            sampling_rate=sampling_rate,
-            chunk_length_s=chunk_length_s,
-            stream_chunk_s=stream_chunk_s,
+
+
+# Decoder prompt ids (language and task tokens) per locale
+_decoder_prompt_ids = {}
+
+
+def get_forced_decoder_ids(locale):
+    if locale not in _decoder_prompt_ids:
+        _decoder_prompt_ids[locale] = tokenizer.get_decoder_prompt_ids(
+            language=commands.convert_locale_language[locale], task="transcribe"
+        )
+    return _decoder_prompt_ids[locale]
+
+
+# Makes `new_locale` the language commands are spoken in, reusing the loaded models and
+# every cached index, trie and prompt. Returns how long the switch took in seconds.
+def switch_locale(new_locale):
+    start = time.perf_counter()
+    if new_locale not in text2command.locale_to_commands:
+        raise ValueError(f"No command catalog for locale {new_locale}")
+    global locale
+    global matchingLocales
+    global forced_decoder_ids
+    locale = new_locale
+    matchingLocales = [locale] + [
+        extra_locale for extra_locale in extraMatchingLocales if extra_locale != locale
+    ]
+    tokenizer.set_prefix_tokens(
+        language=commands.convert_locale_language[locale], task="transcribe"
+    )
+    forced_decoder_ids = get_forced_decoder_ids(locale)
+    # Build (or fetch) what the next command needs now rather than after the wake word
+    text2command.getCommandIndex(matchingLocales)
+    if commandOnlyDecoding:
+        get_command_trie_processor()
+    return time.perf_counter() - start
+
+
+# Generation options for decoding a command: the language, and the command-only and
+# early-stopping constraints when they apply
+def command_generate_kwargs():
+    generate_kwargs = {"max_new_tokens": 128}
+    processors = []
+    if len(matchingLocales) > 1:
+        # Whisper detects which of the user's languages is being spoken, once per
+        # utterance, and keeps it for the rest of the utterance
+        language = language_detection.LocaleLanguage(
+            whisper_generation_config,
+            [commands.convert_locale_language[each] for each in matchingLocales],
+        )
+        generate_kwargs["generation_config"] = language.generation_config
+        processors.append(language)
+    else:
+        generate_kwargs["forced_decoder_ids"] = forced_decoder_ids
+    # Command-only mode: every decode is a catalog command, alias or group name
+    if commandOnlyDecoding and not text2command.isMultiStep:
+        processors.append(get_command_trie_processor())
+    if processors:
+        generate_kwargs["logits_processor"] = LogitsProcessorList(processors)
+    if commandEarlyStopping and not text2command.isMultiStep:
+        generate_kwargs["stopping_criteria"] = StoppingCriteriaList(
+            [get_command_stopping_criteria()]
         )
+    return generate_kwargs
 
+
+# Transcribes speech and converts it to text. `mic` is the wake-word capture when it
+# is shared with transcription, otherwise a new microphone stream is opened. Returns an
+# asr_cascade.Decoding, with Whisper's confidence when it was measured, or None when the
+# transcription is cancelled.
+def transcribe(chunk_length_s=5.0, stream_chunk_s=0.75, mic=None):
+    sampling_rate = transcriber.feature_extractor.sampling_rate
+    # In the cascade Whisper base is only loaded if the utterance is escalated to it
+    if whisper_model is not None and cascade is None:
+        whisper_model.ensure_loaded()
+    listening.start_transcription()
+    if mic is not None:
+        # The microphone is already open, so we are listening right away
+        notify_listening()
+    # Keep the pipelines' prints off stdout, which carries the LSP messages
+    with redirect_stdout(io.StringIO()):
         num_inferences = 1
         phrase = ""
+        speculative_match = ""
+        stable_updates = 0
 
-        for item in transcriber(
-            mic,
-            generate_kwargs={
-                "max_new_tokens": 128,
-                "forced_decoder_ids": forced_decoder_ids,
-            },
-        ):
+        generate_kwargs = command_generate_kwargs()
+
+        recorder = None
+        if mic is not None:
+            feature_front_end.deactivate("ast")
+            if isinstance(mic, audio_capture.MicrophoneCapture):
+                chunks = mic.chunks("whisper", stream_chunk_s)
+            else:
+                chunk_bytes = int(stream_chunk_s * sampling_rate) * 4
+                chunks = streaming_asr.rechunk(mic, chunk_bytes)
+            if cascade is not None:
+                chunks = recorder = asr_cascade.UtteranceRecorder(chunks)
+            items = streaming_transcriber.stream(chunks, chunk_length_s, generate_kwargs)
+        elif incrementalTranscription:
+            # Raw stride chunks; features are computed incrementally in a mel ring
+            chunks = mic = audio_capture.microphone(
+                sampling_rate=sampling_rate,
+                chunk_length_s=stream_chunk_s,
+                on_start=notify_listening,
+            )
+            if cascade is not None:
+                chunks = recorder = asr_cascade.UtteranceRecorder(mic)
+            items = streaming_transcriber.stream(chunks, chunk_length_s, generate_kwargs)
+        else:
+            chunks = mic = audio_capture.microphone_live(
+                sampling_rate=sampling_rate,
+                chunk_length_s=chunk_length_s,
+                stream_chunk_s=stream_chunk_s,
+                on_start=notify_listening,
+            )
+            if cascade is not None:
+                chunks = recorder = asr_cascade.UtteranceRecorder(mic)
+            if confidence_decoder is not None:
+                items = confidence_decoder.stream(chunks, generate_kwargs)
+            else:
+                items = first_pass_transcriber(chunks, generate_kwargs=generate_kwargs)
+
+        for item in items:
+            if listening.cancelled.is_set():
+                break
             # Uncomment to see the prediction as it happens
             # sys.stdout.write("\033[K")
             log_to_output(str(item))
             # print(item["text"], end="\r")
-            if num_inferences > 2 and item["text"][-1] == ".":
+            # Stop early once a partial hypothesis is a unique exact command, and no longer
+            # phrase starts with it, for enough updates
+            if speculativeMatchUpdates > 0 and not text2command.isMultiStep:
+                match = text2command.findExactMatch(item["text"], matchingLocales)
+                if match and not text2command.isCompleteCommand(
+                    item["text"], text2command.getPhraseCompletions(matchingLocales)
+                ):
+                    # e.g. "Close Editor" while "Close Editor Group" may still be said
+                    match = ""
+                if match and match == speculative_match:
+                    stable_updates += 1
+                else:
+                    stable_updates = 1 if match else 0
+                speculative_match = match
+                if stable_updates >= speculativeMatchUpdates:
+                    log_to_output(f"Speculative match: {match}")
+                    break
+            if num_inferences > 2 and item["text"].endswith("."):
                 break
             num_inferences += 1
             if phrase == item["text"]:
@@ -127,77 +332,469 @@ def transcribe(chunk_length_s=5.0, stream_chunk_s=0.75):
             # This if statement should never be hit for commands longer than a word
             if not item["partial"][0]:
                 break
-    # Ensure the monitoring thread stops
-    stop_event.set()
-    monitor_thread.join()
-
+    listening.end_transcription()
+    if whisper_model is not None:
+        whisper_model.touch()
+    if "stopping_criteria" in generate_kwargs:
+        metrics.increment(
+            "asr.command_early_stops", generate_kwargs["stopping_criteria"][0].stops
+        )
+    if listening.cancelled.is_set():
+        log_to_output("Transcription cancelled")
+        return None
     log_to_output("Finished transcribing")
-    return item["text"]
+    streamed = asr_cascade.Decoding(
+        item["text"], item.get("avg_logprob"), item.get("no_speech_prob")
+    )
+    if recorder is not None:
+        # Streaming found where the utterance ends, the cascade decides what was said.
+        # The last update was the first tier's decoding of the whole utterance.
+        audio = recorder.audio()
+        if len(audio):
+            decoding = cascade.decode(audio, generate_kwargs, first=streamed)
+            log_to_output(f"Decoded by {decoding.tier}")
+            return decoding
+    return streamed
+
+
+# Rejects a transcription Whisper isn't confident in (background speech, a cough turned
+# into words) before it is matched to commands. Decodings without confidence pass.
+def is_confident(decoding, min_logprob):
+    if decoding.avg_logprob is not None:
+        log_to_output(f"Average log-probability {decoding.avg_logprob:.2f}")
+    if decoding.no_speech_prob is not None:
+        log_to_output(f"No-speech probability {decoding.no_speech_prob:.2f}")
+    if decoding.no_speech_prob is not None and decoding.no_speech_prob > asrMaxNoSpeechProb:
+        metrics.increment("asr.rejected_no_speech")
+        return False
+    if decoding.avg_logprob is not None and decoding.avg_logprob < min_logprob:
+        metrics.increment("asr.rejected_low_logprob")
+        return False
+    return True
+
+
+# Keeps a cascade tier's decoding unless it is unlikely or wouldn't run a command
+def accept_decoding(decoding):
+    if decoding.avg_logprob < asrCascadeMinLogprob:
+        return False
+    if text2command.isMultiStep:
+        # Free text (e.g. a new alias), there's no command to match it against
+        return True
+    return text2command.isConfidentMatch(
+        decoding.text, matchingLocales, enableCommandSuggestions
+    )
+
+
+# Classifies wake-word windows, several at a time when batching is enabled. Predictions
+# come back one per window, in the order the windows were captured.
+def classify_windows(mic, stream_chunk_s):
+    classify = wake_scorer or classifier
+    if keyword_spotter is not None:
+        # Two-stage cascade: the AST classifier only confirms first-stage hits. Windows
+        # the spotter rejects count as windows without the wake word, so the detector
+        # only smooths over consecutive windows.
+        positions = []
+
+        def spotted():
+            for position, window in keyword_spotter.filter(mic):
+                positions.append(position)
+                yield window
+
+        next_position = 0
+        for n, prediction in enumerate(classify(spotted())):
+            for _ in range(next_position, positions[n]):
+                yield []
+            yield prediction
+            next_position = positions[n] + 1
+        return
+    if wakeWordBatchSize <= 1:
+        yield from classify(mic)
+        return
+    # A batch waits for its last window, so cap its size by the allowed added latency
+    batch_size = min(wakeWordBatchSize, 1 + int(wakeWordMaxBatchLatency / stream_chunk_s))
+    batch = []
+    for window in mic:
+        batch.append(window)
+        if len(batch) >= batch_size:
+            yield from classify(batch, batch_size=len(batch))
+            batch = []
+
+
+# Classifies the latest wake-word window from frames computed once by the shared
+# feature front-end, instead of re-extracting features for every overlapping window.
+def classify_shared_features(mic, chunk_length_s):
+    feature_extractor = classifier.feature_extractor
+    window_frames = 1 + (int(chunk_length_s * feature_extractor.sampling_rate) - 400) // 160
+    for raw in mic:
+        # Transcription borrows the stream, so start over once it hands it back
+        if not feature_front_end.is_active("ast"):
+            feature_front_end.activate("ast")
+        feature_front_end.push(np.frombuffer(raw, dtype=np.float32))
+        if ast_mel.written < window_frames:
+            continue
+        if wake_scorer is not None:
+            yield wake_scorer.score_mel(ast_mel, window_frames)
+            continue
+        input_values = features.ast_input_values(ast_mel, window_frames, feature_extractor)
+        input_values = torch.from_numpy(input_values[None]).to(
+            classifier.device, classifier.model.dtype
+        )
+        with torch.inference_mode():
+            scores = classifier.model(input_values=input_values).logits[0].softmax(-1)
+        top_scores, top_ids = scores.topk(5)
+        yield [
+            {"label": classifier.model.config.id2label[label_id], "score": score}
+            for score, label_id in zip(top_scores.tolist(), top_ids.tolist())
+        ]
 
 
-# Listens for wake word (go) and calls transcribe
-def listen_for_wake_word(
-    wake_word="go",
-    prob_threshold=0.5,
+# The checkpoint and dtype of the Whisper model that was unloaded, to load the same again
+whisper_source = ("openai/whisper-base", None)
+
+
+# Reloads Whisper's weights into the pipeline. The cached safetensors file is memory
+# mapped and no hub lookup is made, so this is much faster than the first load. A
+# checkpoint without a cached safetensors file is loaded the usual way.
+def load_whisper_model():
+    name_or_path, dtype = whisper_source
+    try:
+        model = WhisperForConditionalGeneration.from_pretrained(
+            name_or_path, torch_dtype=dtype, use_safetensors=True, local_files_only=True
+        )
+    except Exception:  # pylint: disable=broad-except
+        log_to_output(f"No cached safetensors for {name_or_path}, loading it normally")
+        model = WhisperForConditionalGeneration.from_pretrained(
+            name_or_path, torch_dtype=dtype
+        )
+    transcriber.model = model.to(transcriber.device)
+
+
+# Releases Whisper's weights, keeping the pipeline, tokenizer and feature extractor
+def unload_whisper_model():
+    global whisper_source
+    whisper_source = (transcriber.model.name_or_path, transcriber.model.dtype)
+    transcriber.model = None
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+# Loads this machine's calibrated listening timing, measuring it first if there is none
+def calibrate_timing(device):
+    os.makedirs(storagePath, exist_ok=True)
+    store = calibration.CalibrationStore(os.path.join(storagePath, "calibration.json"))
+    fingerprint = calibration.machine_fingerprint(
+        torch.__version__, device, "worker" if inferenceWorker else "in-process"
+    )
+    result = store.load(fingerprint)
+    if result is not None:
+        return result
+    log_to_output("Calibrating listening timing for this machine...")
+    sampling_rate = classifier.feature_extractor.sampling_rate
+    generate_kwargs = {"max_new_tokens": 128, "forced_decoder_ids": forced_decoder_ids}
+    result = calibration.calibrate(
+        lambda audio: list(classifier([audio])),
+        lambda audio: list(
+            transcriber(
+                [{"raw": audio, "sampling_rate": sampling_rate}],
+                generate_kwargs=generate_kwargs,
+            )
+        ),
+        sampling_rate,
+    )
+    store.save(fingerprint, result)
+    return result
+
+
+# Runs a blocking step of the listening loop (audio capture, inference, matching) on
+# the inference thread, so the event loop stays free for LSP messages
+async def run_blocking(function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        inference_executor, functools.partial(function, *args, **kwargs)
+    )
+
+
+# Runs a blocking LSP handler on the handler threads, so it is answered while a command
+# is being transcribed
+async def run_handler(function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        handler_executor, functools.partial(function, *args, **kwargs)
+    )
+
+
+# Stops a wake-word or utterance stream and the microphone behind it. Safe to call again
+# on a stream that is already closed.
+def close_listening_stream(predictions, mic, capture):
+    predictions.close()
+    if hasattr(mic, "close"):
+        mic.close()
+    if capture is not None:
+        capture.close()
+
+
+# Closes the stream on the inference thread, or right here when the server is going away
+# and the executor no longer takes work
+async def stop_listening_stream(predictions, mic, capture):
+    try:
+        await run_blocking(close_listening_stream, predictions, mic, capture)
+    except RuntimeError:
+        if not shutting_down:
+            raise
+        close_listening_stream(predictions, mic, capture)
+
+
+# Matches a transcription to a command and sends it to the extension. Returns what it
+# was matched to, e.g. a command or "Command not found".
+def send_command(result):
+    log_to_output("You said: " + result)
+    command = text2command.findSimilarPhrases(
+        result,
+        matchingLocales,
+        enableCommandSuggestions,
+        numberCommandSuggestions,
+    )
+    log_to_output(command[0])
+    if command[0] == "Command not found" or command[0] == "Command not renamed":
+        LSP_SERVER.send_notification(
+            "custom/notification",
+            {"content": command[0], "parameters": command[1]},
+        )
+    elif command[0] == "Command Group":
+        LSP_SERVER.send_notification(
+            "custom/notification",
+            {"content": command[0], "parameters": command[1:2], "locales": command[2]},
+        )
+    elif (
+        command[0] == "Renaming Command: Final"
+        or command[0] == "Display command suggestions"
+    ):
+        LSP_SERVER.send_notification(
+            "custom/notification",
+            {"content": command[0], "parameters": command[1:]},
+        )
+    else:
+        LSP_SERVER.send_notification(
+            "custom/notification",
+            {
+                "content": command[0],
+                "locale": text2command.getCommandLocale(command[0], matchingLocales),
+            },
+        )
+    return command[0]
+
+
+# Listens for the wake word and calls transcribe once `detector` hears it. Capture and
+# inference only run while listening isn't paused.
+async def listen_for_wake_word(
+    detector,
     chunk_length_s=0.5,
     stream_chunk_s=0.25,
+    idle_s=0.25,
     debug=False,
 ):
 
     sampling_rate = classifier.feature_extractor.sampling_rate
 
-    mic = ffmpeg_microphone_live(
-        sampling_rate=sampling_rate,
-        chunk_length_s=chunk_length_s,
-        stream_chunk_s=stream_chunk_s,
-    )
-
-    LSP_SERVER.send_notification("custom/notification", {"content": "wake"})
-    log_to_output("Listening for wake word...")
     while True:
-        for prediction in classifier(mic):
-            # Uncomment these lines to see the wake word prediction with score
-            # log_to_output(prediction[0]["label"])
-            # log_to_output(str(prediction[0]["score"]))
-            prediction = prediction[0]
-            if prediction["label"] == wake_word or prediction["label"] == "no":
-                if prediction["score"] > prob_threshold:
+        await listening.wait_until_resumed()
+
+        capture = None
+        if ringBufferCapture or captureThread:
+            # ffmpeg writes straight into a preallocated ring and windows are views of it
+            capture = audio_capture.MicrophoneCapture(sampling_rate, threaded=captureThread)
+            metrics.register_source("capture", capture.stats)
+
+        if sharedFeatureExtraction:
+            # One raw capture stream feeds the classifier and, after a wake word, Whisper
+            if capture is not None:
+                mic = capture.chunks("wake", stream_chunk_s)
+            else:
+                mic = audio_capture.microphone(
+                    sampling_rate=sampling_rate, chunk_length_s=stream_chunk_s
+                )
+            predictions = classify_shared_features(mic, chunk_length_s)
+        else:
+            if capture is not None:
+                mic = capture.windows("wake", chunk_length_s, stream_chunk_s)
+            else:
+                mic = audio_capture.microphone_live(
+                    sampling_rate=sampling_rate,
+                    chunk_length_s=chunk_length_s,
+                    stream_chunk_s=stream_chunk_s,
+                )
+            if wakeWordMaxChunkAge > 0:
+                # Capture runs on its own thread; windows the classifier can't get to
+                # in time are dropped, which bounds the detection latency
+                mic = chunk_queue.QueuedCapture(
+                    mic,
+                    max_size=int(wakeWordMaxChunkAge / stream_chunk_s) + 1,
+                    max_age_s=wakeWordMaxChunkAge,
+                )
+                metrics.register_source("wake_word.queue", mic.queue.stats)
+            predictions = classify_windows(mic, stream_chunk_s)
+
+        LSP_SERVER.send_notification("custom/notification", {"content": "wake"})
+        log_to_output("Listening for wake word...")
+        try:
+            while not listening.paused:
+                prediction = await run_blocking(next, predictions, None)
+                if prediction is None:
+                    log_error("The microphone stream ended, restarting it")
+                    await asyncio.sleep(1.0)
+                    break
+                # Uncomment these lines to see the wake word prediction with score
+                # log_to_output(prediction[0]["label"])
+                # log_to_output(str(prediction[0]["score"]))
+                if detector.update(prediction):
                     LSP_SERVER.send_notification(
                         "custom/notification", {"content": "loading"}
                     )
                     log_to_output("Please say a command")
-                    result = transcribe(chunk_length_s=20.0)
-                    log_to_output("You said: " + result)
-                    command = text2command.findSimilarPhrases(
-                        result,
-                        locale,
-                        enableCommandSuggestions,
-                        numberCommandSuggestions,
-                    )
-                    log_to_output(command[0])
-                    if (
-                        command[0] == "Command not found"
-                        or command[0] == "Command not renamed"
-                    ):
-                        LSP_SERVER.send_notification(
-                            "custom/notification",
-                            {"content": command[0], "parameters": command[1]},
+                    if not sharedFeatureExtraction:
+                        # Only one capture may run: the wake-word stream is closed while
+                        # the command is transcribed and opened again afterwards
+                        await run_blocking(close_listening_stream, predictions, mic, capture)
+                    transcription_start = time.perf_counter()
+                    try:
+                        result = await run_blocking(
+                            transcribe,
+                            chunk_length_s=20.0,
+                            stream_chunk_s=timing["asr_stream_chunk_s"],
+                            mic=(capture or mic) if sharedFeatureExtraction else None,
                         )
-                    elif (
-                        command[0] == "Renaming Command: Final"
-                        or command[0] == "Display command suggestions"
-                        or command[0] == "Command Group"
-                    ):
+                    except model_residency.ModelLoadError as error:
+                        # Keep listening; loading is tried again after the next wake word
+                        log_error(f"Could not load Whisper: {error}")
+                        listening.end_transcription()
+                        result = None
+                    transcription_s = time.perf_counter() - transcription_start
+                    # Windows from before the transcription don't count towards the next
+                    # detection, and the refractory period starts now
+                    detector.reset()
+                    if sharedFeatureExtraction and capture is not None:
+                        # Don't look for the wake word in the command that was just said
+                        capture.skip("wake")
+                    if result is None:
                         LSP_SERVER.send_notification(
-                            "custom/notification",
-                            {"content": command[0], "parameters": command[1:]},
+                            "custom/notification", {"content": "wake"}
                         )
-                    else:
+                        if not sharedFeatureExtraction:
+                            break
+                        continue
+                    if asrConfidenceRejection and not is_confident(result, asrMinLogprob):
+                        log_to_output(f"Ignored: {result.text}")
+                        command = "Command not found"
                         LSP_SERVER.send_notification(
-                            "custom/notification", {"content": command[0]}
+                            "custom/notification", {"content": "wake"}
                         )
-                    prediction["label"] = ""
-            sleep(0.250)  # Decreases load on cpu
+                    else:
+                        command = await run_blocking(send_command, result.text)
+                    if not result.text.strip() or command == "Command not found":
+                        # Nothing or no command was said after the detection
+                        detector.false_trigger()
+                        metrics.increment("wake_word.wasted_asr_s", transcription_s)
+                    if not sharedFeatureExtraction:
+                        break
+                # A queued capture blocks until audio arrives, so it needs no throttling.
+                # Neither do windows the spotter already rejected.
+                if (
+                    prediction
+                    and wakeWordBatchSize <= 1
+                    and idle_s > 0
+                    and not isinstance(mic, chunk_queue.QueuedCapture)
+                ):
+                    await asyncio.sleep(idle_s)  # Decreases load on cpu
+        finally:
+            await stop_listening_stream(predictions, mic, capture)
+        if listening.paused:
+            log_to_output("Listening paused")
+
+
+# Transcribes one utterance found by voice activity detection. Returns None when it
+# doesn't sound like a command: Whisper isn't confident enough or the text wouldn't run
+# a command (unless it is the free-text input of a multi-step command).
+def transcribe_segment(audio):
+    generate_kwargs = command_generate_kwargs()
+    try:
+        if cascade is not None:
+            decoding = cascade.decode(audio, generate_kwargs)
+        else:
+            decoding = segment_decoder.decode(audio, generate_kwargs)
+    except model_residency.ModelLoadError as error:
+        log_error(f"Could not load Whisper: {error}")
+        return None
+    if whisper_model is not None:
+        whisper_model.touch()
+    log_to_output(f"Heard: {decoding.text}")
+    if not is_confident(decoding, continuousMinLogprob):
+        metrics.increment("continuous.rejected_low_confidence")
+        return None
+    if not text2command.isMultiStep and not text2command.isConfidentMatch(
+        decoding.text, matchingLocales, enableCommandSuggestions
+    ):
+        metrics.increment("continuous.rejected_no_command")
+        return None
+    return decoding.text
+
+
+# Continuous mode: runs every utterance that sounds like a command, without waiting for
+# the wake word. Capture and inference only run while listening isn't paused.
+async def listen_continuously():
+    sampling_rate = transcriber.feature_extractor.sampling_rate
+    segmenter = vad.UtteranceSegmenter(sampling_rate)
+    metrics.register_source("continuous.vad", segmenter.stats)
+
+    while True:
+        await listening.wait_until_resumed()
+
+        capture = None
+        if ringBufferCapture or captureThread:
+            capture = audio_capture.MicrophoneCapture(sampling_rate, threaded=captureThread)
+            metrics.register_source("capture", capture.stats)
+            mic = capture.chunks("vad", vad.FRAME_S)
+        else:
+            mic = audio_capture.microphone(
+                sampling_rate=sampling_rate, chunk_length_s=vad.FRAME_S
+            )
+        segments = segmenter.segments(mic)
+
+        LSP_SERVER.send_notification("custom/notification", {"content": "listen"})
+        log_to_output("Listening for commands...")
+        try:
+            while not listening.paused:
+                segment = await run_blocking(next, segments, None)
+                if segment is None:
+                    log_error("The microphone stream ended, restarting it")
+                    await asyncio.sleep(1.0)
+                    break
+                heard_at = time.perf_counter()
+                result = await run_blocking(transcribe_segment, segment)
+                metrics.increment("continuous.segments")
+                if result is None:
+                    continue
+                await run_blocking(send_command, result)
+                metrics.increment("continuous.commands")
+                # From the end of the utterance to the command being sent
+                metrics.set_value("continuous.last_latency_s", time.perf_counter() - heard_at)
+                LSP_SERVER.send_notification("custom/notification", {"content": "listen"})
+        finally:
+            await stop_listening_stream(segments, mic, capture)
+        if listening.paused:
+            log_to_output("Listening paused")
+
+
+# Reports the listening loop stopping, which only happens on an error. Errors while the
+# server is going away (e.g. from executors that were already shut down) are expected.
+def _listening_stopped(task):
+    if shutting_down:
+        return
+    if not task.cancelled() and task.exception() is not None:
+        error = task.exception()
+        log_error(
+            "Listening stopped:\r\n"
+            + "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        )
 
 
 # **********************************************************
@@ -223,10 +820,47 @@ def initialize(params: lsp.InitializeParams) -> None:
         f"Global settings:\r\n{json.dumps(GLOBAL_SETTINGS, indent=4, ensure_ascii=False)}\r\n"
     )
 
+    # ffmpeg would keep recording if the server outlived the editor
+    resources.registry.on_event = log_to_output
+    resources.registry.watch_parent(params.process_id, _editor_exited)
+    metrics.register_source("resources", resources.registry.stats)
+
+    global handler_executor
+    handler_threads = max(params.initialization_options.get("handlerThreads", 2), 1)
+    handler_executor = executors.MonitoredExecutor(handler_threads, "VoiceControlHandler")
+    resources.registry.add(
+        "executor",
+        "VoiceControlHandler",
+        stop=lambda: handler_executor.shutdown(wait=False),
+        alive=lambda: True,
+    )
+    metrics.register_source("executors.handlers", handler_executor.stats)
+    metrics.register_source("executors.inference", inference_executor.stats)
+    log_to_output(f"LSP handlers run on {handler_threads} threads")
+
     global locale
-    locale = params.locale
+    locale = params.initialization_options.get("language") or params.locale
     log_to_output(f"Using the language {commands.convert_locale_language[locale]}")
 
+    # Extra locales whose commands are matched alongside the VS Code locale
+    global extraMatchingLocales
+    extraMatchingLocales = []
+    for extra_locale in params.initialization_options.get("matchingLocales", []):
+        if extra_locale == locale or extra_locale in extraMatchingLocales:
+            continue
+        if extra_locale not in text2command.locale_to_commands:
+            log_warning(f"No command catalog for locale {extra_locale}, ignoring it")
+            continue
+        extraMatchingLocales.append(extra_locale)
+    global matchingLocales
+    matchingLocales = [locale] + extraMatchingLocales
+    log_to_output(f"Matching commands in the locales {matchingLocales}")
+
+    # Report invalid command groups as soon as they are loaded, not when they are run
+    text2command.commandGroupStore.warn = log_warning
+    groups = text2command.getCommandGroupNames(matchingLocales)
+    log_to_output(f"Loaded {len(groups)} command groups")
+
     global enableCommandSuggestions
     enableCommandSuggestions = params.initialization_options["enableCommandSuggestions"]
     log_to_output(f"Enable command suggestions is {enableCommandSuggestions}")
@@ -235,51 +869,477 @@ def initialize(params: lsp.InitializeParams) -> None:
     numberCommandSuggestions = params.initialization_options["numberCommandSuggestions"]
     log_to_output(f"Number of command suggestions is {numberCommandSuggestions}")
 
-    device = "cuda:0" if torch.cuda.is_available() else "cpu"
-    global classifier
-    classifier = pipeline(
-        "audio-classification",
-        model="MIT/ast-finetuned-speech-commands-v2",
-        device=device,
+    global commandOnlyDecoding
+    commandOnlyDecoding = params.initialization_options.get(
+        "commandOnlyDecoding", False
     )
+    log_to_output(f"Command-only decoding is {commandOnlyDecoding}")
+
+    global commandEarlyStopping
+    commandEarlyStopping = params.initialization_options.get(
+        "commandEarlyStopping", False
+    )
+    log_to_output(f"Command early stopping is {commandEarlyStopping}")
+
+    global speculativeMatchUpdates
+    speculativeMatchUpdates = params.initialization_options.get(
+        "speculativeMatchUpdates", 0
+    )
+    log_to_output(f"Speculative match updates is {speculativeMatchUpdates}")
+
+    global inferenceWorker
+    inferenceWorker = params.initialization_options.get("inferenceWorker", False)
+    log_to_output(f"Inference worker is {inferenceWorker}")
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
     global tokenizer
     tokenizer = WhisperTokenizer.from_pretrained(
         "openai/whisper-base",
         language=commands.convert_locale_language[locale],
         task="transcribe",
     )
+    # Language detection among the matching locales starts from Whisper's generation config
+    global whisper_generation_config
+    if len(matchingLocales) > 1:
+        whisper_generation_config = GenerationConfig.from_pretrained("openai/whisper-base")
+    global classifier
     global transcriber
-    transcriber = pipeline(
-        "automatic-speech-recognition",
-        model="openai/whisper-base",
-        device=device,
-        tokenizer=tokenizer,
-    )
+    if inferenceWorker:
+        # The models are loaded in a supervised worker process, only their feature
+        # extractors are needed here
+        global inference_worker
+        inference_worker = worker.InferenceWorker(
+            {
+                "classifier_model": "MIT/ast-finetuned-speech-commands-v2",
+                "transcriber_model": "openai/whisper-base",
+                "language": commands.convert_locale_language[locale],
+                "device": device,
+            },
+            capacity=int(worker.DEFAULT_CAPACITY_S * 16000),
+        )
+        inference_worker.start()
+        metrics.register_source("worker", inference_worker.stats)
+        classifier = worker.RemoteClassifier(
+            inference_worker,
+            AutoFeatureExtractor.from_pretrained("MIT/ast-finetuned-speech-commands-v2"),
+            on_error=log_error,
+        )
+        transcriber = worker.RemoteTranscriber(
+            inference_worker,
+            WhisperFeatureExtractor.from_pretrained("openai/whisper-base"),
+            on_error=log_error,
+        )
+    else:
+        classifier = pipeline(
+            "audio-classification",
+            model="MIT/ast-finetuned-speech-commands-v2",
+            device=device,
+        )
+        transcriber = pipeline(
+            "automatic-speech-recognition",
+            model="openai/whisper-base",
+            device=device,
+            tokenizer=tokenizer,
+        )
     global forced_decoder_ids
-    forced_decoder_ids = tokenizer.get_decoder_prompt_ids(
-        language=commands.convert_locale_language[locale], task="transcribe"
+    forced_decoder_ids = get_forced_decoder_ids(locale)
+
+    global wakeWordBatchSize
+    wakeWordBatchSize = params.initialization_options.get("wakeWordBatchSize", 1)
+    global wakeWordMaxBatchLatency
+    wakeWordMaxBatchLatency = params.initialization_options.get(
+        "wakeWordMaxBatchLatency", 0.5
+    )
+    log_to_output(
+        f"Wake word batch size is {wakeWordBatchSize} (max added latency {wakeWordMaxBatchLatency}s)"
+    )
+
+    global wakeWordMaxChunkAge
+    wakeWordMaxChunkAge = params.initialization_options.get("wakeWordMaxChunkAge", 0)
+    log_to_output(f"Wake word max chunk age is {wakeWordMaxChunkAge}s")
+
+    global wakeWordThreshold
+    wakeWordThreshold = params.initialization_options.get("wakeWordThreshold", 0.5)
+    # Labels that count as the wake word, and how their posteriors are smoothed
+    global wakeWordLabels
+    wakeWordLabels = params.initialization_options.get("wakeWordLabels") or ["go", "no"]
+    global wakeWordSmoothingWindows
+    wakeWordSmoothingWindows = params.initialization_options.get(
+        "wakeWordSmoothingWindows", 1
+    )
+    global wakeWordSmoothing
+    wakeWordSmoothing = params.initialization_options.get("wakeWordSmoothing", "mean")
+    if wakeWordSmoothing not in wake_word_detector.SMOOTHING_METHODS:
+        log_warning(f"Unknown wake word smoothing {wakeWordSmoothing}, using the mean")
+        wakeWordSmoothing = "mean"
+    global wakeWordRefractorySeconds
+    wakeWordRefractorySeconds = params.initialization_options.get(
+        "wakeWordRefractorySeconds", 0
+    )
+    log_to_output(
+        f"Wake word labels {wakeWordLabels}, threshold {wakeWordThreshold}, "
+        f"{wakeWordSmoothing} over {wakeWordSmoothingWindows} windows, "
+        f"refractory period {wakeWordRefractorySeconds}s"
+    )
+    global keyword_spotter
+    keyword_spotter = None
+    spotter_path = params.initialization_options.get("wakeWordSpotterPath", "")
+    if spotter_path:
+        try:
+            keyword_spotter = kws.KeywordSpotter(
+                spotter_path,
+                sampling_rate=classifier.feature_extractor.sampling_rate,
+                threshold=params.initialization_options.get(
+                    "wakeWordSpotterThreshold", 0.5
+                ),
+            )
+            log_to_output(f"Using first-stage keyword spotter {spotter_path}")
+            if wakeWordBatchSize > 1:
+                # Windows the spotter passes are rare, a batch of them could wait for
+                # seconds, so they are confirmed one at a time
+                log_warning("The wake word batch size is ignored with a keyword spotter")
+        except Exception:  # pylint: disable=broad-except
+            log_error(
+                f"Could not load keyword spotter {spotter_path}:\r\n{traceback.format_exc()}"
+            )
+
+    global incrementalTranscription
+    incrementalTranscription = params.initialization_options.get(
+        "incrementalTranscription", False
+    )
+    log_to_output(f"Incremental transcription is {incrementalTranscription}")
+    global ringBufferCapture
+    ringBufferCapture = params.initialization_options.get("ringBufferCapture", False)
+    log_to_output(f"Ring buffer capture is {ringBufferCapture}")
+    global captureThread
+    captureThread = params.initialization_options.get("captureThread", False)
+    log_to_output(f"Capture thread is {captureThread}")
+    global sharedFeatureExtraction
+    sharedFeatureExtraction = params.initialization_options.get(
+        "sharedFeatureExtraction", False
+    )
+    log_to_output(f"Shared feature extraction is {sharedFeatureExtraction}")
+    if inferenceWorker and (incrementalTranscription or sharedFeatureExtraction):
+        log_warning(
+            "Incremental transcription and shared feature extraction run the models "
+            "in the server process, they are turned off while the inference worker is used"
+        )
+        incrementalTranscription = False
+        sharedFeatureExtraction = False
+    if inferenceWorker and commandEarlyStopping:
+        log_warning(
+            "Command early stopping needs the tokenizer and command index in the process "
+            "running Whisper, it is turned off while the inference worker is used"
+        )
+        commandEarlyStopping = False
+    global feature_front_end
+    feature_front_end = features.FeatureFrontEnd()
+    global ast_mel
+    ast_mel = feature_front_end.register(
+        "ast",
+        features.ast_mel_config(classifier.feature_extractor),
+        classifier.feature_extractor.max_length,
+        0.0,
+    )
+    global directInference
+    directInference = params.initialization_options.get("directInference", False)
+    if directInference and inferenceWorker:
+        log_warning(
+            "Direct inference runs the models in the server process, "
+            "it is turned off while the inference worker is used"
+        )
+        directInference = False
+    elif directInference:
+        global wake_scorer
+        try:
+            wake_scorer = wake_word_scorer.WakeWordScorer(
+                classifier, wakeWordLabels, max_batch=wakeWordBatchSize
+            )
+            metrics.register_source("wake_word.scoring", wake_scorer.stats)
+        except ValueError as error:
+            log_warning(f"Scoring wake words with the pipeline: {error}")
+        if not incrementalTranscription:
+            # Incremental transcription is what decodes on the model, from features
+            # computed into a preallocated buffer
+            log_to_output(
+                "Direct inference only covers Whisper with incremental transcription, "
+                "transcribing with the pipeline"
+            )
+    log_to_output(f"Direct inference is {directInference}")
+    global whisper_model
+    asr_idle_unload_minutes = params.initialization_options.get(
+        "asrIdleUnloadMinutes", 0
+    )
+    if asr_idle_unload_minutes > 0 and not inferenceWorker:
+        # The wake-word classifier stays loaded, Whisper is reloaded when a wake word is heard
+        whisper_model = model_residency.IdleModel(
+            load_whisper_model,
+            unload_whisper_model,
+            asr_idle_unload_minutes * 60,
+            run=inference_executor.submit,
+            on_event=lambda event: log_to_output(f"Whisper model {event}"),
+        )
+        whisper_model.touch()
+        metrics.register_source("models.whisper", whisper_model.stats)
+        log_to_output(
+            f"Whisper is unloaded after {asr_idle_unload_minutes} idle minutes"
+        )
+
+    global asrCascadeMinLogprob
+    asrCascadeMinLogprob = params.initialization_options.get(
+        "asrCascadeMinLogprob", -0.5
     )
+    global first_pass_transcriber
+    first_pass_transcriber = transcriber
+    asr_cascade_enabled = params.initialization_options.get("asrCascade", False)
+    if asr_cascade_enabled and inferenceWorker:
+        log_warning("The ASR cascade isn't available with the inference worker, turning it off")
+    elif asr_cascade_enabled:
+        # whisper-tiny streams the utterance and decodes it first; it shares Whisper
+        # base's tokenizer and features, so prompts and the command trie work for both
+        first_pass_transcriber = pipeline(
+            "automatic-speech-recognition",
+            model="openai/whisper-tiny",
+            device=device,
+            tokenizer=tokenizer,
+        )
+        global cascade
+        cascade = asr_cascade.ASRCascade(
+            [
+                ("tiny", asr_cascade.WhisperDecoder(first_pass_transcriber)),
+                (
+                    "base",
+                    asr_cascade.WhisperDecoder(
+                        transcriber,
+                        on_use=whisper_model.ensure_loaded if whisper_model else None,
+                    ),
+                ),
+            ],
+            accept_decoding,
+        )
+        metrics.register_source("asr.cascade", cascade.stats)
+        log_to_output(
+            f"ASR cascade is on (minimum average log-probability {asrCascadeMinLogprob})"
+        )
+
+    global continuousListening
+    continuousListening = params.initialization_options.get("continuousListening", False)
+    global continuousMinLogprob
+    continuousMinLogprob = params.initialization_options.get(
+        "continuousMinLogprob", -0.7
+    )
+    if continuousListening and inferenceWorker:
+        log_warning(
+            "Continuous listening needs Whisper's token probabilities, which the inference "
+            "worker doesn't report; listening for the wake word instead"
+        )
+        continuousListening = False
+    elif continuousListening:
+        global segment_decoder
+        segment_decoder = asr_cascade.WhisperDecoder(
+            transcriber, on_use=whisper_model.ensure_loaded if whisper_model else None
+        )
+        log_to_output(
+            f"Continuous listening is on (minimum average log-probability {continuousMinLogprob})"
+        )
+
+    global asrConfidenceRejection
+    asrConfidenceRejection = params.initialization_options.get(
+        "asrConfidenceRejection", False
+    )
+    global asrMinLogprob
+    asrMinLogprob = params.initialization_options.get("asrMinLogprob", -1.0)
+    global asrMaxNoSpeechProb
+    asrMaxNoSpeechProb = params.initialization_options.get("asrMaxNoSpeechProb", 0.6)
+    if asrConfidenceRejection and inferenceWorker:
+        log_warning(
+            "The inference worker doesn't report Whisper's confidence, "
+            "low-confidence transcriptions aren't rejected"
+        )
+        asrConfidenceRejection = False
+    elif asrConfidenceRejection:
+        log_to_output(
+            f"Rejecting transcriptions below an average log-probability of {asrMinLogprob} "
+            f"or above a no-speech probability of {asrMaxNoSpeechProb}"
+        )
+    global confidence_decoder
+    if cascade is not None:
+        # The first tier streams with its confidence, so its last update is its decoding
+        confidence_decoder = cascade.tiers[0].decoder
+    elif asrConfidenceRejection:
+        confidence_decoder = asr_cascade.WhisperDecoder(
+            first_pass_transcriber,
+            on_use=whisper_model.ensure_loaded if whisper_model else None,
+        )
+
+    global streaming_transcriber
+    streaming_transcriber = None
+    if not inferenceWorker:
+        streaming_transcriber = streaming_asr.StreamingTranscriber(
+            first_pass_transcriber, feature_front_end, decoder=confidence_decoder
+        )
+
+    # The extension's global storage; the install directory may be read-only and is
+    # replaced on every update
+    global storagePath
+    storagePath = params.initialization_options.get("storagePath") or os.path.dirname(
+        __file__
+    )
+
+    global timing
+    timing = dict(calibration.DEFAULTS)
+    if params.initialization_options.get("autoCalibrate", False):
+        timing.update(calibrate_timing(device))
+    log_to_output(f"Listening timing: {timing}")
 
 
 @LSP_SERVER.feature(lsp.INITIALIZED)
 def initialized(params: lsp.InitializedParams) -> None:
     """Handler for initialized"""
-    listen_for_wake_word()
-    log_error("We should never get here")
+    global listening_task
+    if continuousListening:
+        listener = listen_continuously()
+    else:
+        detector = wake_word_detector.WakeWordDetector(
+            wakeWordLabels,
+            wakeWordThreshold,
+            windows=wakeWordSmoothingWindows,
+            method=wakeWordSmoothing,
+            refractory_s=wakeWordRefractorySeconds,
+        )
+        metrics.register_source("wake_word", detector.stats)
+        listener = listen_for_wake_word(
+            detector,
+            chunk_length_s=timing["wake_chunk_length_s"],
+            stream_chunk_s=timing["wake_stream_chunk_s"],
+            idle_s=timing["wake_idle_s"],
+        )
+    listening_task = LSP_SERVER.loop.create_task(listener)
+    listening_task.add_done_callback(_listening_stopped)
 
 
 # **********************************************************
 # Sending/Receiving Messages from the Server
 # **********************************************************
+@LSP_SERVER.feature("voiceControl/metrics")
+async def get_metrics(_params: Optional[Any] = None) -> Dict[str, float]:
+    """Returns the server's runtime metrics."""
+    return await run_handler(metrics.snapshot)
+
+
+@LSP_SERVER.feature("voiceControl/pauseListening")
+def pause_listening(_params: Optional[Any] = None) -> Dict[str, bool]:
+    """Stops audio capture and inference until listening is resumed."""
+    listening.pause()
+    return listening.state()
+
+
+@LSP_SERVER.feature("voiceControl/resumeListening")
+def resume_listening(_params: Optional[Any] = None) -> Dict[str, bool]:
+    """Starts listening for the wake word again."""
+    listening.resume()
+    return listening.state()
+
+
+@LSP_SERVER.feature("voiceControl/setLocale")
+async def set_locale(params: Any) -> Dict[str, Any]:
+    """Switches the language commands are spoken in without reloading any model."""
+    new_locale = params["locale"] if isinstance(params, dict) else params.locale
+    # On the inference thread, so a command being transcribed finishes in the old language
+    seconds = await run_blocking(switch_locale, new_locale)
+    log_to_output(f"Switched to {new_locale} in {seconds * 1000:.1f} ms")
+    metrics.set_value("locale.last_switch_s", seconds)
+    return {"locale": locale, "matchingLocales": matchingLocales, "seconds": seconds}
+
+
+# Reads a request parameter whether pygls passed a dict or an object
+def _param(params, name, default=None):
+    if isinstance(params, dict):
+        return params.get(name, default)
+    return getattr(params, name, default)
+
+
+# The server is the only writer of renaming.json and its journal; the extension sends its
+# alias edits here instead of rewriting the files itself
+@LSP_SERVER.feature("voiceControl/renameAlias")
+async def rename_alias(params: Any) -> Dict[str, str]:
+    """Gives a command a new alias. Returns the alias it replaced."""
+    old_alias = await run_handler(
+        text2command.aliasStore.set_alias, _param(params, "command"), _param(params, "alias")
+    )
+    return {"oldAlias": old_alias}
+
+
+@LSP_SERVER.feature("voiceControl/removeAlias")
+async def remove_alias(params: Any) -> None:
+    """Drops a command's alias."""
+    await run_handler(text2command.aliasStore.remove, _param(params, "command"))
+
+
+@LSP_SERVER.feature("voiceControl/restoreAlias")
+async def restore_alias(params: Any) -> None:
+    """Undoes a rename: the command gets its old alias back, or none."""
+    await run_handler(
+        text2command.aliasStore.restore, _param(params, "alias"), _param(params, "oldAlias", "")
+    )
+
+
+@LSP_SERVER.feature("voiceControl/clearAliases")
+async def clear_aliases(_params: Optional[Any] = None) -> None:
+    """Drops every alias."""
+    await run_handler(text2command.aliasStore.clear)
+
+
+@LSP_SERVER.feature("voiceControl/cancelTranscription")
+def cancel_transcription(_params: Optional[Any] = None) -> Dict[str, bool]:
+    """Abandons the command being transcribed, without running it."""
+    listening.cancel()
+    return listening.state()
+
+
+@LSP_SERVER.feature("voiceControl/resources")
+async def get_resources(_params: Optional[Any] = None) -> Sequence[Dict[str, Any]]:
+    """Returns the capture processes, worker and threads the server is running."""
+    return await run_handler(resources.registry.snapshot)
+
+
+# Stops the listening loop, the inference worker and every capture process and thread
+def _release_resources():
+    global shutting_down
+    shutting_down = True
+    if listening_task is not None:
+        # Also called from the parent watch thread
+        listening_task.get_loop().call_soon_threadsafe(listening_task.cancel)
+    if inference_worker is not None:
+        inference_worker.close()
+    resources.registry.shutdown()
+
+
+# Called from the parent watch thread when the editor is gone without shutting us down
+def _editor_exited():
+    log_error("The editor exited, stopping the server")
+    _release_resources()
+    jsonrpc.shutdown_json_rpc()
+    os._exit(0)  # pylint: disable=protected-access
+
+
 @LSP_SERVER.feature(lsp.EXIT)
 def on_exit(_params: Optional[Any] = None) -> None:
     """Handle clean up on exit."""
+    _release_resources()
     jsonrpc.shutdown_json_rpc()
 
 
 @LSP_SERVER.feature(lsp.SHUTDOWN)
-def on_shutdown(_params: Optional[Any] = None) -> None:
+async def on_shutdown(_params: Optional[Any] = None) -> None:
     """Handle clean up on shutdown."""
+    global shutting_down
+    shutting_down = True
+    if listening_task is not None and not listening_task.done():
+        # Let the loop close its stream on the inference thread before that is stopped
+        listening_task.cancel()
+        await asyncio.wait({listening_task}, timeout=LISTENING_STOP_TIMEOUT_S)
+    _release_resources()
     jsonrpc.shutdown_json_rpc()
 
 
@@ -0,0 +1,43 @@
+"""Process-wide runtime metrics, reported through the `voiceControl/metrics` request.
+
+Components either bump named counters here or register a source: a callable
+returning their current numbers, which is only called when metrics are read.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_values: Dict[str, float] = {}
+_sources: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Adds `amount` to a counter."""
+    with _lock:
+        _values[name] = _values.get(name, 0) + amount
+
+
+def set_value(name: str, value: float) -> None:
+    """Sets a gauge to its current value."""
+    with _lock:
+        _values[name] = value
+
+
+def register_source(prefix: str, source: Callable[[], Dict[str, float]]) -> None:
+    """Reports `source()`'s values under `prefix.` whenever metrics are read."""
+    with _lock:
+        _sources[prefix] = source
+
+
+def snapshot() -> Dict[str, float]:
+    """All counters, gauges and source values, sorted by name."""
+    with _lock:
+        values = dict(_values)
+        sources = dict(_sources)
+    for prefix, source in sources.items():
+        for name, value in source().items():
+            values[f"{prefix}.{name}"] = value
+    return dict(sorted(values.items()))
@@ -0,0 +1,96 @@
+"""Releases a model after a period without use and loads it again on demand."""
+
+from __future__ import annotations
+
+import gc
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class ModelLoadError(RuntimeError):
+    """The model couldn't be loaded again. It stays released and the next use retries."""
+
+
+class IdleModel:
+    """Tracks use of a model and unloads it once it has been idle for `idle_timeout_s`.
+
+    `load` and `unload` put the model in place and take it away. The idle check
+    is handed to `run`, which should run it on the thread that uses the model
+    (e.g. by submitting to its executor), so a model is never released while a
+    caller is in the middle of using it.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], None],
+        unload: Callable[[], None],
+        idle_timeout_s: float,
+        run: Callable[[Callable[[], None]], Any] = lambda function: function(),
+        on_event: Optional[Callable[[str], None]] = None,
+    ):
+        self._load = load
+        self._unload = unload
+        self.idle_timeout_s = idle_timeout_s
+        self._run = run
+        self._on_event = on_event
+        self._timer: Optional[threading.Timer] = None
+        self.loaded = True
+        self.last_used = time.monotonic()
+        self.loads = 0
+        self.unloads = 0
+        self.last_load_s = 0.0
+
+    def ensure_loaded(self) -> None:
+        """Loads the model if it was released, then marks it as used.
+
+        Raises ModelLoadError if loading fails.
+        """
+        if not self.loaded:
+            start = time.perf_counter()
+            try:
+                self._load()
+            except Exception as error:
+                if self._on_event:
+                    self._on_event(f"failed to load: {error}")
+                raise ModelLoadError(str(error)) from error
+            self.loaded = True
+            self.loads += 1
+            self.last_load_s = time.perf_counter() - start
+            if self._on_event:
+                self._on_event(f"loaded in {self.last_load_s:.2f}s")
+        self.touch()
+
+    def touch(self) -> None:
+        """Marks the model as used now and restarts the idle countdown."""
+        self.last_used = time.monotonic()
+        if self.idle_timeout_s <= 0:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(
+            self.idle_timeout_s, self._run, args=(self.release_if_idle,)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def release_if_idle(self) -> None:
+        """Unloads the model if it hasn't been used for the idle timeout."""
+        if not self.loaded or self.idle_timeout_s <= 0:
+            return
+        if time.monotonic() - self.last_used < self.idle_timeout_s:
+            return
+        self._unload()
+        gc.collect()
+        self.loaded = False
+        self.unloads += 1
+        if self._on_event:
+            self._on_event(f"unloaded after {self.idle_timeout_s:.0f}s idle")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loaded": int(self.loaded),
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "last_load_s": self.last_load_s,
+        }
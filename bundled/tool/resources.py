@@ -0,0 +1,234 @@
+"""Registry of the subprocesses and threads the server starts.
+
+Microphone capture runs ffmpeg children and helper threads; if the server
+goes away without stopping them, ffmpeg keeps recording. Everything that
+starts one registers it here and removes it when it stops it. The registry
+allows one capture process at a time (starting another stops the previous
+one), stops whatever is still running on shutdown, at interpreter exit or when
+the editor process that started the server dies, and lists what is running for
+the `voiceControl/resources` request.
+"""
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import os
+import platform
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds a process gets to exit after being asked before it is killed.
+TERMINATE_TIMEOUT_S = 2.0
+# Seconds between checks that the editor is still running.
+PARENT_POLL_S = 2.0
+
+
+class _Resource:
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        stop: Callable[[], None],
+        alive: Callable[[], bool],
+        pid: Optional[int] = None,
+    ):
+        self.kind = kind
+        self.name = name
+        self.stop = stop
+        self.alive = alive
+        self.pid = pid
+        self.started = time.monotonic()
+
+
+def _terminate(process) -> None:
+    """Stops a subprocess.Popen or multiprocessing.Process, killing it if it won't exit."""
+    if hasattr(process, "poll"):
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=TERMINATE_TIMEOUT_S)
+            except Exception:  # pylint: disable=broad-except
+                process.kill()
+                process.wait()
+        return
+    if process.is_alive():
+        process.terminate()
+        process.join(TERMINATE_TIMEOUT_S)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+
+def _process_alive(process) -> bool:
+    if hasattr(process, "poll"):
+        return process.poll() is None
+    return process.is_alive()
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with this id is still running."""
+    if platform.system() == "Windows":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(
+            0x1000, False, pid
+        )  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ResourceRegistry:
+    """Tracks running subprocesses and threads and stops them when the server goes away."""
+
+    def __init__(self):
+        self._resources: Dict[int, _Resource] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._capture: Optional[int] = None
+        self.on_event: Optional[Callable[[str], None]] = None
+        self.replaced_captures = 0
+
+    def _event(self, message: str) -> None:
+        if self.on_event is not None:
+            self.on_event(message)
+
+    def add(
+        self,
+        kind: str,
+        name: str,
+        stop: Callable[[], None],
+        alive: Callable[[], bool],
+        pid: Optional[int] = None,
+    ) -> int:
+        """Tracks a resource until `remove` is called. Returns its id."""
+        with self._lock:
+            resource_id = next(self._ids)
+            self._resources[resource_id] = _Resource(kind, name, stop, alive, pid)
+        return resource_id
+
+    def add_process(
+        self, kind: str, name: str, process: Any, capture: bool = False
+    ) -> int:
+        """Tracks a subprocess.Popen or multiprocessing.Process.
+
+        A `capture` process becomes the one active capture; a previous capture
+        that is still running is stopped first.
+        """
+        if capture:
+            with self._lock:
+                previous = self._resources.get(self._capture)
+            if previous is not None and previous.alive():
+                self.replaced_captures += 1
+                self._event(
+                    f"Stopping capture {previous.name} ({previous.pid}), only one may run"
+                )
+                previous.stop()
+        resource_id = self.add(
+            kind,
+            name,
+            stop=lambda: _terminate(process),
+            alive=lambda: _process_alive(process),
+            pid=process.pid,
+        )
+        if capture:
+            with self._lock:
+                self._capture = resource_id
+        return resource_id
+
+    def add_thread(
+        self,
+        name: str,
+        thread: threading.Thread,
+        stop: Optional[Callable[[], None]] = None,
+    ) -> int:
+        """Tracks a thread. `stop` asks it to finish; threads are joined on shutdown."""
+
+        def stop_thread():
+            if stop is not None:
+                stop()
+            if thread is not threading.current_thread():
+                thread.join(TERMINATE_TIMEOUT_S)
+
+        return self.add("thread", name, stop_thread, thread.is_alive)
+
+    def remove(self, resource_id: Optional[int]) -> None:
+        with self._lock:
+            self._resources.pop(resource_id, None)
+            if self._capture == resource_id:
+                self._capture = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Every tracked resource that is still running."""
+        now = time.monotonic()
+        with self._lock:
+            resources = list(self._resources.items())
+        return [
+            {
+                "id": resource_id,
+                "kind": resource.kind,
+                "name": resource.name,
+                "pid": resource.pid,
+                "capture": resource_id == self._capture,
+                "age_s": round(now - resource.started, 1),
+            }
+            for resource_id, resource in resources
+            if resource.alive()
+        ]
+
+    def stats(self) -> Dict[str, float]:
+        """Running resources per kind, and captures stopped to start another."""
+        stats: Dict[str, float] = {"replaced_captures": self.replaced_captures}
+        for resource in self.snapshot():
+            stats[resource["kind"]] = stats.get(resource["kind"], 0) + 1
+        return stats
+
+    def shutdown(self) -> None:
+        """Stops every tracked resource, processes first so threads reading from them finish."""
+        with self._lock:
+            resources = list(self._resources.values())
+            self._resources.clear()
+            self._capture = None
+        ordered = [r for r in resources if r.pid is not None] + [
+            r for r in resources if r.pid is None
+        ]
+        for resource in ordered:
+            try:
+                if resource.alive():
+                    resource.stop()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    def watch_parent(self, pid: Optional[int], on_death: Callable[[], None]) -> None:
+        """Calls `on_death` once the editor (`pid`, or else this process's parent) has exited."""
+        parent = os.getppid()
+
+        def watch():
+            while True:
+                time.sleep(PARENT_POLL_S)
+                # On POSIX an orphaned process is re-parented, so its parent id changes
+                orphaned = platform.system() != "Windows" and os.getppid() != parent
+                if orphaned or (pid is not None and not pid_alive(pid)):
+                    on_death()
+                    return
+
+        threading.Thread(
+            target=watch, name="VoiceControlParentWatch", daemon=True
+        ).start()
+
+
+registry = ResourceRegistry()
+atexit.register(registry.shutdown)
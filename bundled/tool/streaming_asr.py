@@ -0,0 +1,138 @@
+"""Incremental streaming transcription for Whisper.
+
+The pipeline's streaming mode hands Whisper the whole accumulated window on every
+`stream_chunk_s` update, so the feature extractor recomputes the log-mel
+spectrogram of every sample it has already seen. Here the spectrogram lives in a
+fixed-size ring (see features.py) and only frames for newly arrived audio are
+computed. Updates that only add silence reuse the previous hypothesis without
+running the model. What counts as silence follows the utterance's level, so a
+quiet speaker's words aren't mistaken for it and the utterance isn't ended
+early on a repeated hypothesis.
+
+Whisper's encoder attends over its whole (padded) 30 s input in both directions,
+so its outputs for already-seen audio change whenever new audio arrives. Encoder
+outputs and decoder key/value states therefore can't be cached across updates
+without changing results; what is saved is the feature extraction and the model
+runs on updates that carry no speech.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, Optional
+
+import features
+import numpy as np
+import torch
+
+# RMS below which a new chunk can be treated as silence and the model is not run.
+DEFAULT_SILENCE_RMS = 0.01
+# A chunk is only silence if it is also this much quieter than the loudest chunk of
+# the utterance.
+DEFAULT_SILENCE_RATIO = 0.1
+
+
+def rechunk(chunks: Iterable[bytes], chunk_bytes: int) -> Iterator[bytes]:
+    """Regroups raw microphone chunks into chunks of (at least) `chunk_bytes` bytes.
+
+    Audio left over when the stream ends is yielded as a last, shorter chunk.
+    """
+    buffer = b""
+    for raw in chunks:
+        buffer += raw
+        if len(buffer) >= chunk_bytes:
+            yield buffer
+            buffer = b""
+    if buffer:
+        yield buffer
+
+
+class StreamingTranscriber:
+    """Transcribes a microphone stream with the ASR pipeline's model and tokenizer.
+
+    Yields items shaped like the pipeline's streaming output
+    (`{"text": str, "partial": [bool]}`) so callers can swap one for the other.
+    Given a `decoder` (an `asr_cascade.WhisperDecoder` over the same pipeline),
+    items also carry the update's `avg_logprob` and `no_speech_prob`.
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        front_end: Optional[features.FeatureFrontEnd] = None,
+        silence_rms: float = DEFAULT_SILENCE_RMS,
+        decoder=None,
+        silence_ratio: float = DEFAULT_SILENCE_RATIO,
+    ):
+        feature_extractor = transcriber.feature_extractor
+        self.transcriber = transcriber
+        self.tokenizer = transcriber.tokenizer
+        self.sampling_rate = feature_extractor.sampling_rate
+        self.silence_rms = silence_rms
+        self.silence_ratio = silence_ratio
+        self.decoder = decoder
+        self.front_end = front_end or features.FeatureFrontEnd()
+        self.mel = self.front_end.register(
+            "whisper",
+            features.whisper_mel_config(feature_extractor),
+            feature_extractor.nb_max_frames,
+            features.WHISPER_SILENCE,
+        )
+        # Every update normalizes the ring into this buffer, which the model's input
+        # tensor shares, instead of allocating new features each time
+        self._input_features = np.empty((1,) + self.mel.ring.shape, dtype=np.float32)
+
+    @property
+    def model(self):
+        # Read from the pipeline each time, the model may have been unloaded and reloaded
+        return self.transcriber.model
+
+    def transcribe_chunk(self, generate_kwargs: Dict) -> Dict:
+        """Runs Whisper on the current contents of the ring."""
+        features.whisper_input_features(self.mel, out=self._input_features[0])
+        input_features = torch.from_numpy(self._input_features)
+        if self.decoder is not None:
+            decoding = self.decoder.decode_features(input_features, generate_kwargs)
+            return {
+                "text": decoding.text,
+                "avg_logprob": decoding.avg_logprob,
+                "no_speech_prob": decoding.no_speech_prob,
+            }
+        input_features = input_features.to(self.model.device, self.model.dtype)
+        with torch.inference_mode():
+            tokens = self.model.generate(
+                input_features=input_features, **generate_kwargs
+            )
+        return {
+            "text": self.tokenizer.batch_decode(tokens, skip_special_tokens=True)[0]
+        }
+
+    def stream(
+        self,
+        chunks: Iterable[bytes],
+        chunk_length_s: float,
+        generate_kwargs: Optional[Dict] = None,
+    ) -> Iterator[Dict]:
+        """Consumes raw f32le microphone chunks until `chunk_length_s` seconds were heard."""
+        generate_kwargs = generate_kwargs or {}
+        max_samples = int(chunk_length_s * self.sampling_rate)
+        heard = 0
+        peak_rms = 0.0
+        result = None
+        self.front_end.activate("whisper")
+        try:
+            for raw in chunks:
+                samples = np.frombuffer(raw, dtype=np.float32)
+                heard += len(samples)
+                self.front_end.push(samples)
+                rms = float(np.sqrt(np.mean(samples**2))) if len(samples) else 0.0
+                peak_rms = max(peak_rms, rms)
+                silent = rms < min(self.silence_rms, self.silence_ratio * peak_rms)
+                # Nothing new was said, so the previous hypothesis still stands
+                if result is None or not silent:
+                    result = self.transcribe_chunk(generate_kwargs)
+                partial = heard < max_samples
+                yield {**result, "partial": [partial]}
+                if not partial:
+                    return
+        finally:
+            self.front_end.deactivate("whisper")
@@ -11,16 +11,42 @@ import nltk
 nltk.download("punkt_tab")
 from nltk.tokenize import word_tokenize
 
+import alias_store
 import commands
-import json
+import command_groups
+import command_index
 import os
 import string
 
 isMultiStep = False
 isRenamingCommand = False
 renamingInputs = []
+# Aliases from renaming.json, kept in memory and persisted through an append-only journal
+aliasStore = alias_store.AliasStore(os.path.join(os.path.dirname(__file__), "renaming.json"))
+# Command groups from command_groups.json, compiled against the catalog when they change
+commandGroupStore = command_groups.CommandGroupStore(
+    os.path.join(os.path.dirname(__file__), "command_groups.json")
+)
+
 renameCommandSet = {"Rename Command...","Rinomina Comando...","Komutu Yeniden Adlandır...","Cambiar Nombre Del Comando...","Renomear Comando...","Renommer La Commande...","Parancs Átnevezése...","Переименовать команду...","コマンドの名前を変更...","명령 이름 바꾸기...","Zmień Nazwę Polecenia...","Přejmenovat Příkaz...","Befehl Umbenennen...",'重命名命令...'}
 
+locale_to_commands = {
+    "en": commands.commands,
+    "it": commands.commands_italian,
+    "tr": commands.commands_turkish,
+    "es": commands.commands_spanish,
+    "pt-br": commands.commands_portuguese,
+    "fr": commands.commands_french,
+    "hu": commands.commands_hungarian,
+    "de": commands.commands_german,
+    "ru": commands.commands_russian,
+    "ja": commands.commands_japanese,
+    "ko": commands.commands_korean,
+    "pl": commands.commands_polish,
+    "cs": commands.commands_czech,
+    "zh-cn": commands.commands_simplified_chinese,
+}
+
 
 """This helper method takes the text (text produced from the speech to text model)
 and processes it to get rid of extra characters like punctuation."""
@@ -71,60 +97,159 @@ def __setMultiStep(text):
 
 
 def __searchForAlias(text):
-    extension_path = os.path.dirname(
-        __file__
-    )
-    path = os.path.join(extension_path, "renaming.json")
+    translator = str.maketrans("", "", string.punctuation)
+    cleaned_text = text.translate(translator).lower().strip().title()
+    command = aliasStore.get_command(cleaned_text)
+    if not command:
+        command = aliasStore.get_command(cleaned_text + "...")
+    return command
+
+
+def __searchForCommandGroup(text, locale):
+    # Groups are compiled (normalized name -> validated commands) when the file changes
+    return commandGroupStore.compiled(getCommandIndex(locale)).lookup(text)
+
+
+def __commandGroupLocales(text, locale):
+    # A group may mix commands from several matching locales, each runs in its own
+    return commandGroupStore.compiled(getCommandIndex(locale)).locales_of(text)
+
+
+def __asLocales(locale):
+    if isinstance(locale, str):
+        return (locale,)
+    return tuple(locale)
+
+
+"""Returns the cached matching index over the command catalogs of one or more locales."""
+
+__commandIndexes = {}
+
+
+def getCommandIndex(locale):
+    locales = __asLocales(locale)
+    if locales not in __commandIndexes:
+        __commandIndexes[locales] = command_index.CommandIndex(
+            [(loc, locale_to_commands[loc]) for loc in locales], __preprocessText
+        )
+    return __commandIndexes[locales]
 
-    if not os.path.exists(path):
-        default_data = createDefaultRenamingFile()
 
-        with open(path, "w") as renaming_file:
-            json.dump(default_data, renaming_file, indent=2)
+"""Returns the locale whose catalog a matched command belongs to, so the extension can
+map it to a command ID. Falls back to the first locale for aliases and groups."""
 
-    with open(path, "r") as renaming_file:
-        data = json.load(renaming_file)
-    aliases = data.get("aliases", {})
+
+def getCommandLocale(command, locale):
+    return getCommandIndex(locale).locale_of(command) or __asLocales(locale)[0]
+
+
+"""Returns the command for text only if it is an unambiguous exact match (alias, command group
+or a single catalog phrase), otherwise an empty string. Unlike findSimilarPhrases this has no
+side effects on the multi-step state, so it is safe to call on partial transcriptions."""
+
+
+def findExactMatch(text, locale):
+    command_from_alias = __searchForAlias(text)
+    if command_from_alias:
+        return command_from_alias
     translator = str.maketrans("", "", string.punctuation)
-    cleaned_text = text.translate(translator).lower().strip().title()
-    if cleaned_text in aliases:
-        command = aliases[cleaned_text]
-        return command
-    else:
-        cleaned_text += "..."
-        if cleaned_text in aliases:
-            command = aliases[cleaned_text]
-            return command
+    if __searchForCommandGroup(text, locale):
+        return text.translate(translator).strip()
+    processedText = __preprocessText(text)
+    if not processedText:
+        return ""
+    matches = getCommandIndex(locale).exact_matches(processedText)
+    if len(matches) == 1:
+        return matches[0]
+    return ""
+
+
+"""Minimum similarity for a command to be run rather than only suggested. Has to be superrr close
+when suggestions are shown instead."""
+
+
+def __matchThreshold(enableSuggestions):
+    return 0.80 if enableSuggestions else 0.66
+
+
+"""Returns True if findSimilarPhrases would run a command for text (an alias, a command group or a
+catalog phrase similar enough), False if it would report "Command not found" or only suggestions.
+Like findExactMatch this has no side effects on the multi-step state."""
+
+
+def isConfidentMatch(text, locale, enableSuggestions):
+    if __searchForAlias(text) or __searchForCommandGroup(text, locale):
+        return True
+    processedText = set(__preprocessText(text))
+    if not processedText:
+        return False
+    index = getCommandIndex(locale)
+    percentage = __matchThreshold(enableSuggestions)
+    for position in index.candidates(processedText):
+        processedPhrase = index.word_sets[position]
+        if len(processedText) == 1 and len(processedPhrase) == 1:
+            similarity = __jaccardSimilarity(
+                set(list(processedText)[0]), set(list(processedPhrase)[0])
+            )
         else:
-            return ""
-        
-        
-def __searchForCommandGroup(text):
-    extension_path = os.path.dirname(__file__)
-    path = os.path.join(extension_path, "command_groups.json")
-
-    # If the JSON file doesn't exist, create it with default data 
-    if not os.path.exists(path):
-        default_data = []
-
-        with open(path, "w") as renaming_file:
-            json.dump(default_data, renaming_file, indent=2)
-
-    # Load the JSON data
-    with open(path, "r") as renaming_file:
-        data = json.load(renaming_file)
-    translator = str.maketrans("", "", string.punctuation)
-    cleaned_text = text.translate(translator).lower().strip().title()
-    # Search for the command group by name
-    for group in data:
-        if group["name"].lower() == cleaned_text.lower():
-            return group["commands"]
+            similarity = __jaccardSimilarity(processedText, processedPhrase)
+        if similarity >= percentage:
+            return True
+    return False
+
+
+"""Returns the word sequences of every catalog phrase, alias and command group name, for telling
+when a transcription is a whole command. Rebuilt when the aliases or groups change."""
+
+__phraseCompletions = {}
+
+
+def getPhraseCompletions(locale):
+    key = getVocabularyVersion(locale)
+    cached = __phraseCompletions.get(__asLocales(locale))
+    if cached is None or cached[0] != key:
+        names = getAliasNames() + getCommandGroupNames(locale)
+        sequences = list(getCommandIndex(locale).word_sequences)
+        sequences += [__preprocessText(name) for name in names]
+        cached = (key, command_index.PhraseCompletions(sequences))
+        __phraseCompletions[__asLocales(locale)] = cached
+    return cached[1]
+
+
+"""Returns True if text is exactly a phrase of completions (see getPhraseCompletions) and no longer
+phrase starts with it, i.e. nothing the user could still be saying would change the command."""
+
+
+def isCompleteCommand(text, completions):
+    return completions.is_complete(__preprocessText(text))
+
+
+"""Returns a value that changes whenever the aliases or the command groups may have changed,
+without reading either of them."""
+
+
+def getVocabularyVersion(locale):
+    commandGroupStore.compiled(getCommandIndex(locale))
+    return (aliasStore.current_version(), commandGroupStore.version)
+
+
+"""Returns every alias defined in renaming.json."""
+
+
+def getAliasNames():
+    return list(aliasStore.snapshot()["aliases"].keys())
+
+
+"""Returns the name of every valid command group in command_groups.json."""
+
+
+def getCommandGroupNames(locale):
+    return list(commandGroupStore.compiled(getCommandIndex(locale)).names)
 
-    return ""  # Return an empty string if the name doesn't exist
 
 def renameCommand(
     finalCommands,
-    commands_to_use: string,
+    index: command_index.CommandIndex,
     enableSuggestions: bool,
     numberCommandSuggestions: int,
 ):
@@ -133,7 +258,7 @@ def renameCommand(
     alias = finalCommands[2].title()
     # Find the command if it exists.
     similar_commands = searchForCommands(
-        processedText, commands_to_use, enableSuggestions, numberCommandSuggestions
+        processedText, index, enableSuggestions, numberCommandSuggestions
     )
     # Command suggestions don't apply for renaming
     if len(similar_commands) and similar_commands[0] == "Display command suggestions":
@@ -143,42 +268,16 @@ def renameCommand(
         command = similar_commands[0]
         if "..." in command:
             alias += "..."
-        # Add alias to file
-        extension_path = os.path.dirname(
-            __file__
-        )  # This assumes the script is in the `src` directory
-        path = os.path.join(extension_path, "renaming.json")
-
-        if not os.path.exists(path):
-            default_data = createDefaultRenamingFile()
-
-            with open(path, "w") as renaming_file:
-                json.dump(default_data, renaming_file, indent=2)
-        with open(path, "r") as renaming_file:
-            data = json.load(renaming_file)
-
-        old_alias = ""
-        if command in data["commands"]:
-            old_alias = data["commands"][command]
-        data["commands"][command] = alias
-        if old_alias != alias:
-            data["aliases"][alias] = command
-            if old_alias in data["aliases"]:
-                del data["aliases"][old_alias]
-        with open(path, "w") as file:
-            json.dump(data, file, indent=4)
+        # Add alias to the journal (renaming.json is rewritten on compaction)
+        old_alias = aliasStore.set_alias(command, alias)
         return [command, alias, old_alias]
     else:
         return ["Command not found", finalCommands[1]]
 
 
-def createDefaultRenamingFile():
-    return {"commands": {}, "aliases": {}}
-
-
 def searchForCommands(
     processedText: set,
-    commands_to_use: list,
+    index: command_index.CommandIndex,
     enableSuggestions: bool,
     numberCommandSuggestions: int,
 ):
@@ -194,13 +293,12 @@ def searchForCommands(
     # Limit on number of suggested commands taken from configuration settings.
     commandLimit = numberCommandSuggestions
     commandCount = 0
-    if(enableSuggestions):
-        percentage = 0.80
-    else:
-        percentage = 0.66
-    # Normal command process
-    for phrase in commands_to_use:
-        processedPhrase = set(__preprocessText(phrase))
+    percentage = __matchThreshold(enableSuggestions)
+    # Normal command process. Only phrases that can have a non-zero similarity are scored.
+    phrase = ""
+    for position in index.candidates(processedText):
+        phrase = index.phrases[position]
+        processedPhrase = index.word_sets[position]
         if len(processedText) == 1 and len(processedPhrase) == 1:
             processedTextChars = set(list(processedText)[0])
             processedPhraseChars = set(list(processedPhrase)[0])
@@ -273,6 +371,7 @@ def searchForCommands(
 
 """Uses the file of available phrases (that are mapped to various VSCode commands) and 
 finds the phrases that are the most similar to the text. Uses pre-processing and jaccard methods.
+locale can also be a list of locales, in which case all of their catalogs are matched in one pass.
 Returns a list of similar phrases."""
 
 
@@ -284,23 +383,7 @@ def findSimilarPhrases(
     global isMultiStep
     global isRenamingCommand
 
-    locale_to_commands = {
-        "en": commands.commands,
-        "it": commands.commands_italian,
-        "tr": commands.commands_turkish,
-        "es": commands.commands_spanish,
-        "pt-br": commands.commands_portuguese,
-        "fr": commands.commands_french,
-        "hu": commands.commands_hungarian,
-        "de": commands.commands_german,
-        "ru": commands.commands_russian,
-        "ja": commands.commands_japanese,
-        "ko": commands.commands_korean,
-        "pl": commands.commands_polish,
-        "cs": commands.commands_czech,
-        "zh-cn": commands.commands_simplified_chinese,
-    }
-    commands_to_use = locale_to_commands[locale]
+    index = getCommandIndex(locale)
 
     if isMultiStep:
         # Check to see if this is input for renaming.
@@ -317,7 +400,7 @@ def findSimilarPhrases(
                 finalCommands.append(text)
                 commandAndAliases = renameCommand(
                     finalCommands,
-                    commands_to_use,
+                    index,
                     enableCommandSuggestions,
                     numberCommandSuggestions,
                 )
@@ -341,7 +424,6 @@ def findSimilarPhrases(
     processedText = set(__preprocessText(text))
     # Check for an alias match first.
     command_from_alias = __searchForAlias(text)
-    command_from_commandGroups = __searchForCommandGroup(text)
     if command_from_alias:
         finalCommands.append(command_from_alias)
         # Check if this is a renaming command
@@ -352,14 +434,15 @@ def findSimilarPhrases(
         # Check if this is a multi-step command
         __setMultiStep(finalCommands[0])
         return finalCommands
-    command_from_commandGroups = __searchForCommandGroup(text)
+    command_from_commandGroups = __searchForCommandGroup(text, locale)
     if command_from_commandGroups:
         finalCommands.append("Command Group")
-        finalCommands.append(command_from_commandGroups)       
+        finalCommands.append(command_from_commandGroups)
+        finalCommands.append(__commandGroupLocales(text, locale))
     else:
         finalCommands = searchForCommands(
             processedText,
-            commands_to_use,
+            index,
             enableCommandSuggestions,
             numberCommandSuggestions,
         )
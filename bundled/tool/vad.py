@@ -0,0 +1,103 @@
+"""Energy-based voice activity detection that cuts a microphone stream into utterances.
+
+Used by continuous mode, where there is no wake word to say when a command
+starts. Audio is scored in short frames against a noise floor that follows the
+room's background level; a run of loud enough frames opens an utterance and a
+long enough pause closes it. A little audio from before the first loud frame is
+kept so soft onsets aren't clipped.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+# Length of the frames speech is detected on.
+FRAME_S = 0.03
+
+
+class UtteranceSegmenter:
+    """Yields the audio of each utterance found in a stream of f32le chunks."""
+
+    def __init__(
+        self,
+        sampling_rate: int,
+        threshold_rms: float = 0.01,
+        noise_ratio: float = 3.0,
+        min_speech_s: float = 0.15,
+        end_silence_s: float = 0.6,
+        pre_roll_s: float = 0.2,
+        max_utterance_s: float = 10.0,
+    ):
+        self.sampling_rate = sampling_rate
+        self.frame_length = int(FRAME_S * sampling_rate)
+        self.threshold_rms = threshold_rms
+        self.noise_ratio = noise_ratio
+        self.min_speech_frames = max(1, round(min_speech_s / FRAME_S))
+        self.end_silence_frames = max(1, round(end_silence_s / FRAME_S))
+        self.pre_roll_frames = round(pre_roll_s / FRAME_S)
+        self.max_utterance_frames = round(max_utterance_s / FRAME_S)
+        self.noise_rms = threshold_rms / noise_ratio
+        self.utterances = 0
+        self.discarded = 0
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(frame**2)))
+        speech = rms > max(self.threshold_rms, self.noise_rms * self.noise_ratio)
+        if not speech:
+            # Follow the background level slowly, so speech doesn't raise it
+            self.noise_rms = 0.95 * self.noise_rms + 0.05 * rms
+        return speech
+
+    def _frames(self, chunks: Iterable) -> Iterator[np.ndarray]:
+        pending = np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            pending = np.concatenate([pending, np.frombuffer(chunk, dtype=np.float32)])
+            whole = len(pending) // self.frame_length * self.frame_length
+            for start in range(0, whole, self.frame_length):
+                yield pending[start : start + self.frame_length]
+            pending = pending[whole:]
+
+    def segments(self, chunks: Iterable) -> Iterator[np.ndarray]:
+        """Yields each utterance once the pause after it is long enough."""
+        pre_roll: Deque[np.ndarray] = deque(maxlen=max(self.pre_roll_frames, 1))
+        utterance: List[np.ndarray] = []
+        speech_frames = 0
+        silent_frames = 0
+        for frame in self._frames(chunks):
+            speech = self.is_speech(frame)
+            if not utterance:
+                if speech:
+                    utterance = list(pre_roll) if self.pre_roll_frames else []
+                    utterance.append(frame)
+                    speech_frames, silent_frames = 1, 0
+                else:
+                    pre_roll.append(frame)
+                continue
+            utterance.append(frame)
+            if speech:
+                speech_frames += 1
+                silent_frames = 0
+            else:
+                silent_frames += 1
+            if (
+                silent_frames >= self.end_silence_frames
+                or len(utterance) >= self.max_utterance_frames
+            ):
+                if speech_frames >= self.min_speech_frames:
+                    self.utterances += 1
+                    yield np.concatenate(utterance)
+                else:
+                    # A click or a bump, too short to be a command
+                    self.discarded += 1
+                utterance = []
+                pre_roll.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "utterances": self.utterances,
+            "discarded": self.discarded,
+            "noise_rms": self.noise_rms,
+        }
@@ -0,0 +1,92 @@
+"""Decides when the wake word was said from the classifier's per-window predictions.
+
+A single window scoring above the threshold used to start a transcription, and
+every false trigger costs a whole Whisper session. Here the wake-word posterior
+of each window (the best score among the configured labels) is smoothed over
+the last `windows` windows, by mean or max, before it is compared with the
+threshold. After a detection, further detections are ignored for
+`refractory_s` seconds, so one utterance can't trigger twice.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Sequence
+
+SMOOTHING_METHODS = ("mean", "max")
+
+
+class WakeWordDetector:
+    """Smooths wake-word posteriors over consecutive windows and applies a refractory period."""
+
+    def __init__(
+        self,
+        labels: Iterable[str],
+        threshold: float,
+        windows: int = 1,
+        method: str = "mean",
+        refractory_s: float = 0.0,
+    ):
+        if method not in SMOOTHING_METHODS:
+            raise ValueError(f"Unknown smoothing method {method!r}")
+        self.labels = frozenset(labels)
+        self.threshold = threshold
+        self.method = method
+        self.refractory_s = refractory_s
+        self._posteriors: Deque[float] = deque(maxlen=max(windows, 1))
+        self._quiet_until = 0.0
+        self.detections = 0
+        self.suppressed = 0
+        self.false_triggers = 0
+
+    def posterior(self, predictions: Sequence[Dict]) -> float:
+        """The best score among the wake-word labels in one window's predictions."""
+        return max(
+            (p["score"] for p in predictions if p["label"] in self.labels), default=0.0
+        )
+
+    def update(self, predictions: Sequence[Dict], now: Optional[float] = None) -> bool:
+        """Adds one window's predictions. Returns True when the wake word is detected.
+
+        `now` is the window's time in seconds, monotonic time unless given (e.g.
+        the position in a recording).
+        """
+        now = time.monotonic() if now is None else now
+        self._posteriors.append(self.posterior(predictions))
+        # A mean over a partly filled history would favour the first loud window
+        if self.method == "mean" and len(self._posteriors) < self._posteriors.maxlen:
+            return False
+        if self.method == "mean":
+            smoothed = sum(self._posteriors) / len(self._posteriors)
+        else:
+            smoothed = max(self._posteriors)
+        if smoothed <= self.threshold:
+            return False
+        if now < self._quiet_until:
+            self.suppressed += 1
+            return False
+        self.detections += 1
+        self.reset(now)
+        return True
+
+    def reset(self, now: Optional[float] = None) -> None:
+        """Forgets the history and starts the refractory period, e.g. after a transcription."""
+        self._posteriors.clear()
+        self._quiet_until = (
+            time.monotonic() if now is None else now
+        ) + self.refractory_s
+
+    def false_trigger(self) -> None:
+        """Records that a detection led to a transcription without a command."""
+        self.false_triggers += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "detections": self.detections,
+            "suppressed": self.suppressed,
+            "false_triggers": self.false_triggers,
+            "false_trigger_rate": (
+                self.false_triggers / self.detections if self.detections else 0.0
+            ),
+        }
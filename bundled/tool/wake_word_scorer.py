@@ -0,0 +1,138 @@
+"""Scores wake-word windows with the AST model directly instead of through the pipeline.
+
+For every window the audio-classification pipeline runs the feature extractor,
+wraps its output in new tensors and dicts, and ranks all 35 labels to return
+the top five, while the detector only reads the wake-word labels' scores.
+`WakeWordScorer` computes each window's filter banks with the shared
+front-end's mel configuration straight into a preallocated buffer, which is
+also the model's input tensor (on the CPU; elsewhere a preallocated device
+tensor it is copied into). The model runs under `torch.inference_mode()` and
+only the wake labels' probabilities are read back. The scorer reports CPU
+time per window and the garbage collections that ran while it was scoring.
+"""
+
+from __future__ import annotations
+
+import gc
+import time
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+import features
+import numpy as np
+import torch
+
+
+def _gc_collections() -> int:
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+def _samples(window) -> np.ndarray:
+    if isinstance(window, dict):
+        return window["raw"]
+    if isinstance(window, np.ndarray):
+        return window
+    return np.frombuffer(window, dtype=np.float32)
+
+
+class WakeWordScorer:
+    """Stands in for the audio-classification pipeline, returning only the wake labels' scores.
+
+    Called like the pipeline: `scorer(windows, batch_size=n)` yields one list
+    of `{"label", "score"}` dicts per window, in order.
+    """
+
+    def __init__(self, classifier, labels: Sequence[str], max_batch: int = 1):
+        self.classifier = classifier
+        self.feature_extractor = classifier.feature_extractor
+        self.config = features.ast_mel_config(self.feature_extractor)
+        label2id = classifier.model.config.label2id
+        self.labels = [label for label in labels if label in label2id]
+        if not self.labels:
+            raise ValueError(
+                f"None of the wake word labels {list(labels)} are the model's labels"
+            )
+        self.label_ids = torch.tensor(
+            [label2id[label] for label in self.labels], device=classifier.device
+        )
+        self._fbank = np.zeros(
+            (max(max_batch, 1), self.feature_extractor.max_length, self.config.n_mels),
+            dtype=np.float32,
+        )
+        model = classifier.model
+        if classifier.device.type == "cpu" and model.dtype == torch.float32:
+            self._input = torch.from_numpy(self._fbank)
+            self._copy_input = False
+        else:
+            self._input = torch.empty(
+                self._fbank.shape, dtype=model.dtype, device=classifier.device
+            )
+            self._copy_input = True
+        self.windows = 0
+        self.batches = 0
+        self.cpu_s = 0.0
+        self.gc_collections = 0
+
+    def _fill(self, slot: int, samples: np.ndarray) -> None:
+        """Writes a window's normalized filter banks into a batch slot, like ASTFeatureExtractor."""
+        config = self.config
+        fbank = self._fbank[slot]
+        count = 0
+        if len(samples) >= config.frame_length:
+            count = min(
+                1 + (len(samples) - config.frame_length) // config.hop_length,
+                len(fbank),
+            )
+            frames = np.lib.stride_tricks.sliding_window_view(
+                samples, config.frame_length
+            )[:: config.hop_length][:count]
+            fbank[:count] = config.log_mel(frames).T
+        fbank[count:] = 0.0
+        features.normalize_ast(fbank, self.feature_extractor)
+
+    def _score(self, size: int) -> List[List[Dict]]:
+        start = time.process_time()
+        collections = _gc_collections()
+        if self._copy_input:
+            self._input[:size].copy_(torch.from_numpy(self._fbank[:size]))
+        with torch.inference_mode():
+            logits = self.classifier.model(input_values=self._input[:size]).logits
+            scores = (
+                logits.float().softmax(-1).index_select(-1, self.label_ids).tolist()
+            )
+        self.cpu_s += time.process_time() - start
+        self.gc_collections += _gc_collections() - collections
+        self.windows += size
+        self.batches += 1
+        return [
+            [{"label": label, "score": score} for label, score in zip(self.labels, row)]
+            for row in scores
+        ]
+
+    def score_mel(self, mel: features.IncrementalMel, n_frames: int) -> List[Dict]:
+        """Scores the latest `n_frames` frames of a shared-front-end mel ring."""
+        features.ast_input_values(
+            mel, n_frames, self.feature_extractor, out=self._fbank[0]
+        )
+        return self._score(1)[0]
+
+    def __call__(self, windows: Iterable, batch_size: int = 1) -> Iterator[List[Dict]]:
+        batch_size = min(max(batch_size, 1), len(self._fbank))
+        size = 0
+        for window in windows:
+            # Filled right away, so windows that are views of a capture ring can be reused
+            self._fill(size, _samples(window))
+            size += 1
+            if size == batch_size:
+                yield from self._score(size)
+                size = 0
+        if size:
+            yield from self._score(size)
+
+    def stats(self) -> Dict[str, float]:
+        """Windows scored, CPU time per window and garbage collections during scoring."""
+        return {
+            "windows": self.windows,
+            "batches": self.batches,
+            "cpu_per_window_s": self.cpu_s / self.windows if self.windows else 0.0,
+            "gc_collections": self.gc_collections,
+        }
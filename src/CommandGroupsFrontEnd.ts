@@ -16,8 +16,8 @@ import { commandNameToIDCs } from './command-mapping-cs';
 import { commandNameToIDDe } from './command-mapping-de';
 import { commandNameToIDZhCn } from './command-mapping-zh-cn';
 import { Console } from 'console';
-
-let locale = vscode.env.language;
+import { readRenamingData } from './common/renaming';
+import { getLocale } from './extension';
 
 function getCorrectMap() {
     const localeCommandMap: { [key: string]: { [key: string]: string } } = {
@@ -37,7 +37,7 @@ function getCorrectMap() {
         default: commandNameToID,
     };
 
-    return localeCommandMap[locale] || localeCommandMap['default'];
+    return localeCommandMap[getLocale()] || localeCommandMap['default'];
 }
 export async function showCommandGroups(context: vscode.ExtensionContext) {
     const filePath = context.asAbsolutePath(path.join('bundled', 'tool', 'command_groups.json'));
@@ -54,8 +54,7 @@ export async function showCommandGroups(context: vscode.ExtensionContext) {
     const rawData = fs.readFileSync(filePath, 'utf8');
     let commandGroups = JSON.parse(rawData);
     const filePath2 = context.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-    const rawData2 = fs.readFileSync(filePath2, 'utf8');
-    let parsedData = JSON.parse(rawData2);
+    let parsedData = readRenamingData(filePath2);
     let commandMap = getCorrectMap();
     const availableCommands = await vscode.commands.getCommands();
     for (const key in commandMap) {
@@ -189,8 +188,7 @@ function getCommandGroupHTML(context: vscode.ExtensionContext, addingGroup: bool
 
     let commandsJson = JSON.stringify(Object.keys(commandMap));
     const filePath2 = context.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-    const rawData2 = fs.readFileSync(filePath2, 'utf8');
-    let parsedData = JSON.parse(rawData2);
+    let parsedData = readRenamingData(filePath2);
     let htmlContent = `
         <!DOCTYPE html>
         <html lang="en">
@@ -2,9 +2,10 @@ import * as vscode from 'vscode';
 import * as fs from 'fs';
 import * as path from 'path';
 
-import { getContext } from './extension';
+import { getContext, getLocale } from './extension';
 import { lsClient } from './extension';
 import { setMutedState } from './extension';
+import { readRenamingData } from './common/renaming';
 
 import { frontendTextLookup } from './frontend-text-mapping';
 import { frontendTextLookupEsp } from './frontend-text-mapping-esp';
@@ -15,8 +16,6 @@ let iconPathGrey = vscode.Uri.file('');
 let iconPathMicUnmuted = vscode.Uri.file('');
 let iconPathMicMuted = vscode.Uri.file('');
 
-let locale = vscode.env.language;
-
 let voiceControlStatusViewer: VoiceControlStatusViewer;
 export class FrontEndController {
     static statusText: string = '';
@@ -47,6 +46,10 @@ export class FrontEndController {
             FrontEndController.toggleMute();
         });
 
+        vscode.commands.registerCommand('VoiceControl.cancelTranscription', () => {
+            lsClient?.sendRequest('voiceControl/cancelTranscription');
+        });
+
         FrontEndController.statusBarItem.command = 'VoiceControl.toggleMute';
 
         vscode.commands.registerCommand('VoiceControlStatusViewer.refresh', () => voiceControlStatusViewer.refresh());
@@ -103,13 +106,17 @@ export class FrontEndController {
         }
 
         setMutedState(FrontEndController.muted);
+        // Muting pauses the server's microphone capture and inference entirely
+        lsClient?.sendRequest(
+            FrontEndController.muted ? 'voiceControl/pauseListening' : 'voiceControl/resumeListening',
+        );
 
         FrontEndController.statusText = VoiceControlStatusViewer.getIconStatusText();
         FrontEndController.refreshStatusViewer();
     }
 
     static getTranslatedText(key: string) {
-        switch (locale) {
+        switch (getLocale()) {
             case 'es':
                 return frontendTextLookupEsp[key];
                 break;
@@ -129,8 +136,7 @@ export class FrontEndController {
 
         const filePath = context.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
 
-        const rawData = fs.readFileSync(filePath, 'utf8');
-        let parsedData = JSON.parse(rawData);
+        let parsedData = readRenamingData(filePath);
 
         const parsedCommands = parsedData.commands;
 
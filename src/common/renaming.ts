@@ -0,0 +1,66 @@
+import * as fs from 'fs';
+
+// The server appends renames to renaming.journal and only periodically folds them into
+// renaming.json, so readers replay the journal on top of the snapshot. The server is the
+// only writer: edits are sent to it with the voiceControl/*Alias requests.
+function getJournalPath(filePath: string): string {
+    return filePath.replace(/\.json$/, '.journal');
+}
+
+function readSnapshot(filePath: string): any {
+    const parsedData = JSON.parse(fs.readFileSync(filePath, 'utf8'));
+    parsedData.commands = parsedData.commands ?? {};
+    parsedData.aliases = parsedData.aliases ?? {};
+    parsedData.generation = parsedData.generation ?? 0;
+    return parsedData;
+}
+
+function readJournal(filePath: string): any[] {
+    const journalPath = getJournalPath(filePath);
+    if (!fs.existsSync(journalPath)) {
+        return [];
+    }
+    const records = [];
+    for (const line of fs.readFileSync(journalPath, 'utf8').split('\n')) {
+        let record;
+        try {
+            record = JSON.parse(line);
+        } catch {
+            // Empty line or a partially written record
+            continue;
+        }
+        if (typeof record?.command === 'string' && typeof record?.alias === 'string') {
+            records.push(record);
+        }
+    }
+    return records;
+}
+
+// Compaction replaces renaming.json with a new generation and then empties the journal.
+// Records of another generation are already in the snapshot (or belong to a newer one),
+// and a snapshot that changed while the journal was read is read again.
+export function readRenamingData(filePath: string): any {
+    let parsedData = readSnapshot(filePath);
+    for (let attempt = 0; attempt < 5; attempt++) {
+        const records = readJournal(filePath);
+        const current = readSnapshot(filePath);
+        if (current.generation !== parsedData.generation) {
+            parsedData = current;
+            continue;
+        }
+        for (const record of records) {
+            if ((record.generation ?? 0) !== parsedData.generation) {
+                continue;
+            }
+            const oldAlias = parsedData.commands[record.command] ?? '';
+            parsedData.commands[record.command] = record.alias;
+            if (oldAlias !== record.alias) {
+                parsedData.aliases[record.alias] = record.command;
+                delete parsedData.aliases[oldAlias];
+            }
+        }
+        break;
+    }
+    delete parsedData.generation;
+    return parsedData;
+}
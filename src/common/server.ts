@@ -23,6 +23,38 @@ export type IInitOptions = {
     globalSettings: ISettings;
     enableCommandSuggestions: Boolean;
     numberCommandSuggestions: integer;
+    commandOnlyDecoding: Boolean;
+    speculativeMatchUpdates: integer;
+    matchingLocales: string[];
+    incrementalTranscription: Boolean;
+    wakeWordBatchSize: integer;
+    wakeWordMaxBatchLatency: number;
+    wakeWordThreshold: number;
+    wakeWordSpotterPath: string;
+    wakeWordSpotterThreshold: number;
+    sharedFeatureExtraction: Boolean;
+    ringBufferCapture: Boolean;
+    inferenceWorker: Boolean;
+    asrIdleUnloadMinutes: number;
+    wakeWordMaxChunkAge: number;
+    autoCalibrate: Boolean;
+    language: string;
+    asrCascade: Boolean;
+    asrCascadeMinLogprob: number;
+    commandEarlyStopping: Boolean;
+    continuousListening: Boolean;
+    continuousMinLogprob: number;
+    wakeWordLabels: string[];
+    wakeWordSmoothingWindows: number;
+    wakeWordSmoothing: string;
+    wakeWordRefractorySeconds: number;
+    asrConfidenceRejection: Boolean;
+    asrMinLogprob: number;
+    asrMaxNoSpeechProb: number;
+    captureThread: Boolean;
+    handlerThreads: number;
+    directInference: Boolean;
+    storagePath: string;
 };
 
 async function createServer(
@@ -89,6 +121,7 @@ export async function restartServer(
     serverName: string,
     outputChannel: LogOutputChannel,
     lsClient?: LanguageClient,
+    storagePath: string = '',
 ): Promise<LanguageClient | undefined> {
     if (lsClient) {
         traceInfo(`Server: Stop requested`);
@@ -103,11 +136,74 @@ export async function restartServer(
     const config = vscode.workspace.getConfiguration('voice-control');
     const enableCommandSuggestions: Boolean = config.get('enableCommandSuggestions') as boolean;
     const numberCommandSuggestions: number = config.get('numberOfCommandSuggestions') as number;
+    const commandOnlyDecoding: Boolean = config.get('commandOnlyDecoding') as boolean;
+    const speculativeMatchUpdates: number = config.get('speculativeMatchUpdates') as number;
+    const matchingLocales: string[] = config.get('matchingLocales') as string[];
+    const incrementalTranscription: Boolean = config.get('incrementalTranscription') as boolean;
+    const wakeWordBatchSize: number = config.get('wakeWordBatchSize') as number;
+    const wakeWordMaxBatchLatency: number = config.get('wakeWordMaxBatchLatency') as number;
+    const wakeWordThreshold: number = config.get('wakeWordThreshold') as number;
+    const wakeWordSpotterPath: string = config.get('wakeWordSpotterPath') as string;
+    const wakeWordSpotterThreshold: number = config.get('wakeWordSpotterThreshold') as number;
+    const sharedFeatureExtraction: Boolean = config.get('sharedFeatureExtraction') as boolean;
+    const ringBufferCapture: Boolean = config.get('ringBufferCapture') as boolean;
+    const inferenceWorker: Boolean = config.get('inferenceWorker') as boolean;
+    const asrIdleUnloadMinutes: number = config.get('asrIdleUnloadMinutes') as number;
+    const wakeWordMaxChunkAge: number = config.get('wakeWordMaxChunkAge') as number;
+    const autoCalibrate: Boolean = config.get('autoCalibrate') as boolean;
+    const language: string = config.get('language') as string;
+    const asrCascade: Boolean = config.get('asrCascade') as boolean;
+    const asrCascadeMinLogprob: number = config.get('asrCascadeMinLogprob') as number;
+    const commandEarlyStopping: Boolean = config.get('commandEarlyStopping') as boolean;
+    const continuousListening: Boolean = config.get('continuousListening') as boolean;
+    const continuousMinLogprob: number = config.get('continuousMinLogprob') as number;
+    const wakeWordLabels: string[] = config.get('wakeWordLabels') as string[];
+    const wakeWordSmoothingWindows: number = config.get('wakeWordSmoothingWindows') as number;
+    const wakeWordSmoothing: string = config.get('wakeWordSmoothing') as string;
+    const wakeWordRefractorySeconds: number = config.get('wakeWordRefractorySeconds') as number;
+    const asrConfidenceRejection: Boolean = config.get('asrConfidenceRejection') as boolean;
+    const asrMinLogprob: number = config.get('asrMinLogprob') as number;
+    const asrMaxNoSpeechProb: number = config.get('asrMaxNoSpeechProb') as number;
+    const captureThread: Boolean = config.get('captureThread') as boolean;
+    const handlerThreads: number = config.get('handlerThreads') as number;
+    const directInference: Boolean = config.get('directInference') as boolean;
     const initializationOptions: IInitOptions = {
         settings: await getExtensionSettings(serverId, true),
         globalSettings: await getGlobalSettings(serverId, false),
         enableCommandSuggestions: enableCommandSuggestions,
         numberCommandSuggestions: numberCommandSuggestions,
+        commandOnlyDecoding: commandOnlyDecoding,
+        speculativeMatchUpdates: speculativeMatchUpdates,
+        matchingLocales: matchingLocales,
+        incrementalTranscription: incrementalTranscription,
+        wakeWordBatchSize: wakeWordBatchSize,
+        wakeWordMaxBatchLatency: wakeWordMaxBatchLatency,
+        wakeWordThreshold: wakeWordThreshold,
+        wakeWordSpotterPath: wakeWordSpotterPath,
+        wakeWordSpotterThreshold: wakeWordSpotterThreshold,
+        sharedFeatureExtraction: sharedFeatureExtraction,
+        ringBufferCapture: ringBufferCapture,
+        inferenceWorker: inferenceWorker,
+        asrIdleUnloadMinutes: asrIdleUnloadMinutes,
+        wakeWordMaxChunkAge: wakeWordMaxChunkAge,
+        autoCalibrate: autoCalibrate,
+        language: language,
+        asrCascade: asrCascade,
+        asrCascadeMinLogprob: asrCascadeMinLogprob,
+        commandEarlyStopping: commandEarlyStopping,
+        continuousListening: continuousListening,
+        continuousMinLogprob: continuousMinLogprob,
+        wakeWordLabels: wakeWordLabels,
+        wakeWordSmoothingWindows: wakeWordSmoothingWindows,
+        wakeWordSmoothing: wakeWordSmoothing,
+        wakeWordRefractorySeconds: wakeWordRefractorySeconds,
+        asrConfidenceRejection: asrConfidenceRejection,
+        asrMinLogprob: asrMinLogprob,
+        asrMaxNoSpeechProb: asrMaxNoSpeechProb,
+        captureThread: captureThread,
+        handlerThreads: handlerThreads,
+        directInference: directInference,
+        storagePath: storagePath,
     };
 
     const newLSClient = await createServer(workspaceSetting, serverId, serverName, outputChannel, {
@@ -115,6 +211,38 @@ export async function restartServer(
         globalSettings: await getGlobalSettings(serverId, false),
         enableCommandSuggestions: enableCommandSuggestions,
         numberCommandSuggestions: numberCommandSuggestions,
+        commandOnlyDecoding: commandOnlyDecoding,
+        speculativeMatchUpdates: speculativeMatchUpdates,
+        matchingLocales: matchingLocales,
+        incrementalTranscription: incrementalTranscription,
+        wakeWordBatchSize: wakeWordBatchSize,
+        wakeWordMaxBatchLatency: wakeWordMaxBatchLatency,
+        wakeWordThreshold: wakeWordThreshold,
+        wakeWordSpotterPath: wakeWordSpotterPath,
+        wakeWordSpotterThreshold: wakeWordSpotterThreshold,
+        sharedFeatureExtraction: sharedFeatureExtraction,
+        ringBufferCapture: ringBufferCapture,
+        inferenceWorker: inferenceWorker,
+        asrIdleUnloadMinutes: asrIdleUnloadMinutes,
+        wakeWordMaxChunkAge: wakeWordMaxChunkAge,
+        autoCalibrate: autoCalibrate,
+        language: language,
+        asrCascade: asrCascade,
+        asrCascadeMinLogprob: asrCascadeMinLogprob,
+        commandEarlyStopping: commandEarlyStopping,
+        continuousListening: continuousListening,
+        continuousMinLogprob: continuousMinLogprob,
+        wakeWordLabels: wakeWordLabels,
+        wakeWordSmoothingWindows: wakeWordSmoothingWindows,
+        wakeWordSmoothing: wakeWordSmoothing,
+        wakeWordRefractorySeconds: wakeWordRefractorySeconds,
+        asrConfidenceRejection: asrConfidenceRejection,
+        asrMinLogprob: asrMinLogprob,
+        asrMaxNoSpeechProb: asrMaxNoSpeechProb,
+        captureThread: captureThread,
+        handlerThreads: handlerThreads,
+        directInference: directInference,
+        storagePath: storagePath,
     });
 
     traceInfo(`Server: Start requested.`);
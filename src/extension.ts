@@ -16,6 +16,7 @@ import { checkIfConfigurationChanged, getExtensionSettings, getInterpreterFromSe
 import { loadServerDefaults } from './common/setup';
 import { getLSClientTraceLevel } from './common/utilities';
 import { createOutputChannel, onDidChangeConfiguration, registerCommand } from './common/vscodeapi';
+import { readRenamingData } from './common/renaming';
 import { Console, debug } from 'console';
 import { commandNameToID } from './command-mapping';
 import { commandNameToIDIta } from './command-mapping-ita';
@@ -48,8 +49,9 @@ export { lsClient };
 
 let invalidThemeSelected = '';
 
-let locale = vscode.env.language;
 const config = vscode.workspace.getConfiguration('voice-control');
+// Language commands are spoken in, the VS Code display language unless overridden
+let locale = (config.get('language') as string) || vscode.env.language;
 const enableRenamingConfirmation: Boolean = config.get('enableRenamingConfirmation') as boolean;
 
 let awaitingCommandArgument: boolean = false;
@@ -145,7 +147,13 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
         if (interpreter && interpreter.length > 0) {
             if (checkVersion(await resolveInterpreter(interpreter))) {
                 traceVerbose(`Using interpreter from ${serverInfo.module}.interpreter: ${interpreter.join(' ')}`);
-                lsClient = await restartServer(serverId, serverName, outputChannel, lsClient);
+                lsClient = await restartServer(
+                    serverId,
+                    serverName,
+                    outputChannel,
+                    lsClient,
+                    extensionContext.globalStorageUri.fsPath,
+                );
             }
             return;
         }
@@ -153,7 +161,13 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
         const interpreterDetails = await getInterpreterDetails();
         if (interpreterDetails.path) {
             traceVerbose(`Using interpreter from Python extension: ${interpreterDetails.path.join(' ')}`);
-            lsClient = await restartServer(serverId, serverName, outputChannel, lsClient);
+            lsClient = await restartServer(
+                serverId,
+                serverName,
+                outputChannel,
+                lsClient,
+                extensionContext.globalStorageUri.fsPath,
+            );
             lsClient?.start();
             lsClient?.onNotification('custom/notification', (message) => {
                 traceLog('Received message from Python:', message);
@@ -179,6 +193,12 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
         onDidChangeConfiguration(async (e: vscode.ConfigurationChangeEvent) => {
             if (checkIfConfigurationChanged(e, serverId)) {
                 await runServer();
+            } else if (e.affectsConfiguration('voice-control.language')) {
+                // Switched in the running server, without restarting it or reloading models
+                const language = vscode.workspace.getConfiguration('voice-control').get('language') as string;
+                locale = language || vscode.env.language;
+                const result = await lsClient?.sendRequest('voiceControl/setLocale', { locale: locale });
+                traceLog('Switched command language:', result);
             }
         }),
         registerCommand(`${serverId}.restart`, async () => {
@@ -251,10 +271,11 @@ function handleServerMessage(message: any) {
             handleCommandSuggestions(message.parameters, locale);
             break;
         case 'Command Group':
-            handleCommandGroups(message.parameters, locale);
+            handleCommandGroups(message.parameters, message.locales, locale);
             break;
         default:
-            executeLocaleCommand(message.content, locale);
+            // Commands matched from another configured language carry their own locale
+            executeLocaleCommand(message.content, message.locale ?? locale);
             FrontEndController?.waitForActivation();
     }
 }
@@ -362,33 +383,17 @@ function handleRenamingCommandFinal(message: any /*locale: string,*/) {
     updateRemappingWindow();
 }
 
-function handleCommandGroups(message: any /*locale: string,*/, locale: string) {
-    for (const command of message[0]) {
-        executeLocaleCommand(command, locale);
-    }
+function handleCommandGroups(message: any, locales: string[] | undefined, locale: string) {
+    // Each group command carries the locale of the catalog it came from
+    message[0].forEach((command: string, i: number) => {
+        executeLocaleCommand(command, locales?.[i] ?? locale);
+    });
     FrontEndController?.waitForActivation();
 }
 
-function undoCommandAlias(alias: string, oldAlias: string) {
-    const filePath = extensionContext.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-    const rawData = fs.readFileSync(filePath, 'utf8');
-    let parsedData = JSON.parse(rawData);
-
-    // If the command doesn't have an old alias, it doesn't need to be reverted just delete from file.
-    if (oldAlias === '') {
-        const originalCommandName = parsedData.aliases[alias];
-        delete parsedData.aliases[alias];
-        delete parsedData.commands[originalCommandName];
-    }
-    // If there is an old alias, revert it back to its old remapping.
-    else {
-        const originalCommandName = parsedData.aliases[alias];
-        delete parsedData.aliases[alias];
-        parsedData.aliases[oldAlias] = originalCommandName;
-        parsedData.commands[originalCommandName] = oldAlias;
-    }
-
-    fs.writeFileSync(filePath, JSON.stringify(parsedData, null, 2), 'utf8');
+// The server owns renaming.json and its journal, so alias edits are sent to it.
+async function undoCommandAlias(alias: string, oldAlias: string) {
+    await lsClient?.sendRequest('voiceControl/restoreAlias', { alias: alias, oldAlias: oldAlias });
     updateRemappingWindow();
 }
 
@@ -519,26 +524,20 @@ function updateRemappingWindow() {
     }
 }
 
-function deleteRemapping(index: number) {
+async function deleteRemapping(index: number) {
     const filePath = extensionContext.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-    const rawData = fs.readFileSync(filePath, 'utf8');
-    let parsedData = JSON.parse(rawData);
+    const parsedData = readRenamingData(filePath);
 
     const originalCommandName = Object.keys(parsedData.commands)[index];
-    const currentAlias = parsedData.commands[originalCommandName];
-
-    delete parsedData.commands[originalCommandName];
-    delete parsedData.aliases[currentAlias];
 
-    fs.writeFileSync(filePath, JSON.stringify(parsedData, null, 2), 'utf8');
+    await lsClient?.sendRequest('voiceControl/removeAlias', { command: originalCommandName });
 
     updateRemappingWindow();
 }
 
-function renameAlias(newName: string, index: number) {
+async function renameAlias(newName: string, index: number) {
     const filePath = extensionContext.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-    const rawData = fs.readFileSync(filePath, 'utf8');
-    let parsedData = JSON.parse(rawData);
+    const parsedData = readRenamingData(filePath);
 
     const originalCommandName = Object.keys(parsedData.commands)[index];
 
@@ -547,14 +546,7 @@ function renameAlias(newName: string, index: number) {
         newName += '...';
     }
 
-    const currentAlias = parsedData.commands[originalCommandName];
-
-    delete parsedData.aliases[currentAlias];
-    parsedData.aliases[newName] = originalCommandName;
-
-    parsedData.commands[originalCommandName] = newName;
-
-    fs.writeFileSync(filePath, JSON.stringify(parsedData, null, 2), 'utf8');
+    await lsClient?.sendRequest('voiceControl/renameAlias', { command: originalCommandName, alias: newName });
 
     updateRemappingWindow();
 }
@@ -568,19 +560,9 @@ function clearAllRemappings() {
                 return input.toUpperCase() === 'YES' ? null : 'You must type "YES" to confirm.';
             },
         })
-        .then((input) => {
+        .then(async (input) => {
             if (input && input.toUpperCase() === 'YES') {
-                const filePath = extensionContext.asAbsolutePath(path.join('bundled', 'tool', 'renaming.json'));
-                const rawData = fs.readFileSync(filePath, 'utf8');
-                let parsedData = JSON.parse(rawData);
-
-                for (const section in parsedData) {
-                    for (const remapping in parsedData[section]) {
-                        delete parsedData[section][remapping];
-                    }
-                }
-
-                fs.writeFileSync(filePath, JSON.stringify(parsedData, null, 2), 'utf8');
+                await lsClient?.sendRequest('voiceControl/clearAliases');
 
                 updateRemappingWindow();
                 vscode.window.showInformationMessage('All items have been cleared!');
@@ -620,6 +602,11 @@ export function getContext() {
     return extensionContext;
 }
 
+// The language commands are spoken in, also used by the front end for its text and maps
+export function getLocale() {
+    return locale;
+}
+
 export function setMutedState(newState: boolean) {
     muted = newState;
 }
@@ -0,0 +1,14 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Makes the server's modules in bundled/tool importable by the unit tests.
+"""
+
+import os
+import sys
+
+from .lsp_test_client import constants
+
+TOOL_ROOT = constants.PROJECT_ROOT / "bundled" / "tool"
+if os.fspath(TOOL_ROOT) not in sys.path:
+    sys.path.insert(0, os.fspath(TOOL_ROOT))
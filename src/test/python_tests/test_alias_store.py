@@ -0,0 +1,102 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the journaled alias store.
+"""
+
+import json
+
+import alias_store
+from hamcrest import assert_that, equal_to, has_entries, is_, not_
+
+
+def _store(tmp_path, compact_every=32):
+    return alias_store.AliasStore(
+        str(tmp_path / "renaming.json"), compact_every=compact_every
+    )
+
+
+def _journal(tmp_path):
+    return (tmp_path / "renaming.journal").read_text(encoding="utf-8").splitlines()
+
+
+def test_renames_are_journaled_and_reloaded(tmp_path):
+    """Renames append to the journal and a new store folds them over the snapshot."""
+    store = _store(tmp_path)
+    assert_that(store.set_alias("open file", "open"), is_(""))
+    assert_that(store.set_alias("open file", "load"), is_("open"))
+
+    assert_that(len(_journal(tmp_path)), is_(2))
+    snapshot = _store(tmp_path).snapshot()
+    assert_that(snapshot["commands"], equal_to({"open file": "load"}))
+    assert_that(snapshot["aliases"], equal_to({"load": "open file"}))
+
+
+def test_compaction_folds_the_journal_into_a_new_generation(tmp_path):
+    """Compaction writes the snapshot with a new generation and empties the journal."""
+    store = _store(tmp_path, compact_every=2)
+    store.set_alias("save", "store")
+    store.set_alias("close", "shut")
+
+    data = json.loads((tmp_path / "renaming.json").read_text(encoding="utf-8"))
+    assert_that(data["generation"], is_(2))
+    assert_that(data["commands"], equal_to({"save": "store", "close": "shut"}))
+    assert_that(_journal(tmp_path), equal_to([]))
+
+    store.set_alias("save", "keep")
+    record = json.loads(_journal(tmp_path)[0])
+    assert_that(record, has_entries(command="save", alias="keep", generation=2))
+
+
+def test_records_of_an_older_generation_are_skipped(tmp_path):
+    """A record left over from before a compaction isn't applied twice."""
+    store = _store(tmp_path)
+    store.set_alias("save", "store")
+    stale = _journal(tmp_path)[0]
+    store.compact()
+    store.remove("save")
+    with open(tmp_path / "renaming.journal", "a", encoding="utf-8") as journal:
+        journal.write(stale + "\n")
+
+    assert_that(_store(tmp_path).snapshot()["commands"], equal_to({}))
+
+
+def test_malformed_journal_lines_are_skipped(tmp_path):
+    """Torn, non-object and incomplete records don't stop the load."""
+    store = _store(tmp_path)
+    store.set_alias("save", "store")
+    with open(tmp_path / "renaming.journal", "a", encoding="utf-8") as journal:
+        journal.write('{"command": "close"}\n[1, 2]\n{"command": "close", "ali\n')
+
+    snapshot = _store(tmp_path).snapshot()
+    assert_that(snapshot["commands"], equal_to({"save": "store"}))
+
+
+def test_remove_restore_and_clear(tmp_path):
+    """The edits the extension sends to the server rewrite the snapshot."""
+    store = _store(tmp_path)
+    store.set_alias("save", "store")
+    old_alias = store.set_alias("save", "keep")
+    store.set_alias("close", "shut")
+
+    store.restore("keep", old_alias)
+    assert_that(store.get_command("store"), is_("save"))
+    assert_that(store.get_command("keep"), is_(""))
+
+    store.restore("shut", "")
+    store.remove("save")
+    assert_that(_store(tmp_path).snapshot(), equal_to({"commands": {}, "aliases": {}}))
+
+    store.set_alias("open file", "open")
+    store.clear()
+    assert_that(_store(tmp_path).snapshot()["aliases"], equal_to({}))
+
+
+def test_version_changes_when_another_store_writes(tmp_path):
+    """`current_version` picks up edits made through the files."""
+    store = _store(tmp_path)
+    version = store.current_version()
+    _store(tmp_path).set_alias("save", "store")
+
+    assert_that(store.current_version(), is_(not_(version)))
+    assert_that(store.get_command("store"), is_("save"))
@@ -0,0 +1,105 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the mirrored audio ring buffer and its per-consumer cursors.
+"""
+
+import audio_ring
+import numpy as np
+from hamcrest import assert_that, equal_to, has_entries, none, same_instance
+
+
+def samples(start, stop):
+    return np.arange(start, stop, dtype=np.float32)
+
+
+def test_reads_across_the_wrap_around_are_one_contiguous_view():
+    """The mirror lets a read that wraps around the end come back as one slice."""
+    ring = audio_ring.AudioRing(8)
+    ring.add_consumer("wake")
+    ring.write(samples(0, 6))
+    assert_that(ring.read("wake", 6).tolist(), equal_to(samples(0, 6).tolist()))
+
+    ring.write(samples(6, 12))
+    view = ring.read("wake", 6)
+
+    assert_that(view.tolist(), equal_to(samples(6, 12).tolist()))
+    assert_that(view.base, same_instance(ring.data))
+
+
+def test_a_read_past_the_written_audio_returns_nothing_and_keeps_the_cursor():
+    """Asking for more than was written leaves the samples for a later read."""
+    ring = audio_ring.AudioRing(8)
+    ring.add_consumer("wake")
+    ring.write(samples(0, 3))
+
+    assert_that(ring.read("wake", 4), none())
+    ring.write(samples(3, 4))
+    assert_that(ring.read("wake", 4).tolist(), equal_to(samples(0, 4).tolist()))
+
+
+def test_a_consumer_that_falls_behind_skips_to_the_oldest_sample_held():
+    """An overrun drops the audio that was overwritten and is counted."""
+    ring = audio_ring.AudioRing(8)
+    ring.add_consumer("wake")
+    for start in range(0, 20, 4):
+        ring.write(samples(start, start + 4))
+
+    assert_that(ring.read("wake", 4).tolist(), equal_to(samples(12, 16).tolist()))
+    assert_that(
+        ring.stats(),
+        has_entries(
+            {"overruns": 1, "dropped": 12, "wake.overruns": 1, "wake.backlog": 4}
+        ),
+    )
+
+
+def test_history_overlaps_the_previous_read():
+    """A read can include samples the consumer already read before it."""
+    ring = audio_ring.AudioRing(8)
+    ring.add_consumer("wake")
+    ring.write(samples(0, 4))
+    ring.read("wake", 4)
+    ring.write(samples(4, 8))
+
+    window = ring.read("wake", 4, history=2)
+
+    assert_that(window.tolist(), equal_to(samples(2, 8).tolist()))
+    assert_that(ring.available("wake"), equal_to(0))
+
+
+def test_history_does_not_reach_before_the_consumer_started():
+    """A consumer added later never sees audio from before it was added."""
+    ring = audio_ring.AudioRing(8)
+    ring.write(samples(0, 4))
+    ring.add_consumer("whisper")
+    ring.write(samples(4, 8))
+
+    window = ring.read("whisper", 4, history=4)
+
+    assert_that(window.tolist(), equal_to(samples(4, 8).tolist()))
+
+
+def test_consumers_read_independently():
+    """Each consumer has its own cursor, backlog and underrun count."""
+    ring = audio_ring.AudioRing(8)
+    ring.add_consumer("wake")
+    ring.add_consumer("whisper")
+    ring.write(samples(0, 6))
+    ring.read("wake", 6)
+    ring.underrun("wake")
+
+    assert_that(ring.available("wake"), equal_to(0))
+    assert_that(ring.read("whisper", 2).tolist(), equal_to(samples(0, 2).tolist()))
+    assert_that(
+        ring.stats(),
+        has_entries(
+            {
+                "underruns": 1,
+                "wake.underruns": 1,
+                "whisper.underruns": 0,
+                "wake.backlog": 0,
+                "whisper.backlog": 4,
+            }
+        ),
+    )
@@ -0,0 +1,50 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for picking listening timing from measured inference speed.
+"""
+
+import calibration
+from hamcrest import assert_that, equal_to, is_
+
+
+def test_shortest_stride_leaves_headroom():
+    """The shortest stride at least HEADROOM times the inference time is picked."""
+    strides = calibration.WAKE_STRIDES_S
+    assert_that(calibration._shortest(strides, 0.01), is_(0.1))
+    assert_that(calibration._shortest(strides, 0.05), is_(0.1))
+    assert_that(calibration._shortest(strides, 0.06), is_(0.125))
+    assert_that(calibration._shortest(strides, 0.2), is_(0.5))
+
+
+def test_shortest_falls_back_to_the_longest_stride():
+    """A machine too slow for every stride gets the longest one."""
+    assert_that(calibration._shortest(calibration.ASR_STRIDES_S, 10.0), is_(3.0))
+
+
+def test_calibrate_derives_timing_from_the_measurements():
+    """Strides, idle time and real-time factors follow from the timed models."""
+
+    def classify(audio):
+        pass
+
+    def transcribe(audio):
+        pass
+
+    timing = calibration.calibrate(classify, transcribe, 16000, repeats=1)
+
+    assert_that(timing["wake_stream_chunk_s"], is_(0.1))
+    assert_that(timing["wake_chunk_length_s"], is_(calibration.WAKE_WINDOW_S))
+    assert_that(timing["asr_stream_chunk_s"], is_(0.5))
+    assert_that(timing["wake_idle_s"], is_(0.1))
+
+
+def test_store_keeps_one_calibration_per_fingerprint(tmp_path):
+    """Calibrations are saved under their fingerprint and survive a new store."""
+    path = str(tmp_path / "calibration.json")
+    calibration.CalibrationStore(path).save("machine a", {"asr_rtf": 0.5})
+    calibration.CalibrationStore(path).save("machine b", {"asr_rtf": 0.1})
+
+    store = calibration.CalibrationStore(path)
+    assert_that(store.load("machine a"), equal_to({"asr_rtf": 0.5}))
+    assert_that(store.load("machine c"), is_(None))
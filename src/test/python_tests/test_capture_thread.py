@@ -0,0 +1,77 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the single-producer/single-consumer queue the capture thread fills.
+"""
+
+import threading
+
+import capture_thread
+import numpy as np
+from hamcrest import assert_that, equal_to, is_, none
+
+
+def test_slots_come_back_in_order_with_their_timestamps():
+    """The consumer sees published slots oldest first."""
+    queue = capture_thread.SPSCQueue(slots=3, slot_size=4)
+    for value in (1.0, 2.0):
+        queue.acquire()[:] = value
+        queue.publish(timestamp=value * 10)
+
+    assert_that(len(queue), equal_to(2))
+    for value in (1.0, 2.0):
+        buffer, timestamp = queue.peek()
+        assert_that(buffer.tolist(), equal_to([value] * 4))
+        assert_that(timestamp, equal_to(value * 10))
+        queue.release()
+    assert_that(len(queue), equal_to(0))
+
+
+def test_acquire_fails_while_the_consumer_is_a_whole_queue_behind():
+    """A full queue has no slot for the producer until one is released."""
+    queue = capture_thread.SPSCQueue(slots=2, slot_size=1)
+    for timestamp in (0.0, 1.0):
+        queue.acquire()
+        queue.publish(timestamp)
+
+    assert_that(queue.acquire(), is_(none()))
+    queue.peek()
+    queue.release()
+    assert_that(queue.acquire(), is_(np.ndarray))
+
+
+def test_close_drains_the_queue_before_returning_none():
+    """Slots published before closing are still delivered."""
+    queue = capture_thread.SPSCQueue(slots=2, slot_size=1)
+    queue.acquire()[:] = 7.0
+    queue.publish(0.0)
+    queue.close()
+
+    buffer, _ = queue.peek()
+    assert_that(buffer.tolist(), equal_to([7.0]))
+    queue.release()
+    assert_that(queue.peek(), is_(none()))
+
+
+def test_peek_waits_for_the_producer():
+    """A consumer blocked on an empty queue wakes up when a slot is published."""
+    queue = capture_thread.SPSCQueue(slots=4, slot_size=1)
+    seen = []
+
+    def consume():
+        while (item := queue.peek()) is not None:
+            seen.append(float(item[0][0]))
+            queue.release()
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for value in range(10):
+        while (slot := queue.acquire()) is None:
+            pass
+        slot[:] = value
+        queue.publish(float(value))
+    queue.close()
+    consumer.join(timeout=5)
+
+    assert_that(consumer.is_alive(), is_(False))
+    assert_that(seen, equal_to([float(value) for value in range(10)]))
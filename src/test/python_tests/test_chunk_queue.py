@@ -0,0 +1,94 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the latency-bounded chunk queue between capture and classification.
+"""
+
+import threading
+import time
+
+import chunk_queue
+import numpy as np
+from hamcrest import assert_that, equal_to, has_entries, is_
+
+
+def test_full_queue_evicts_the_oldest_chunk():
+    """A full queue drops its oldest chunk to make room."""
+    queue = chunk_queue.ChunkQueue(max_size=2, max_age_s=60.0)
+    for chunk in ("a", "b", "c"):
+        queue.put(chunk)
+
+    assert_that([queue.get(), queue.get()], equal_to(["b", "c"]))
+    assert_that(queue.stats(), has_entries(delivered=2, dropped_full=1, depth=0))
+
+
+def test_stale_chunks_are_dropped_on_the_way_out():
+    """Chunks older than the maximum age are skipped and counted."""
+    queue = chunk_queue.ChunkQueue(max_size=10, max_age_s=0.05)
+    queue.put("old")
+    time.sleep(0.1)
+    queue.put("new")
+
+    assert_that(queue.get(), is_("new"))
+    assert_that(queue.stats(), has_entries(dropped_stale=1, delivered=1))
+
+
+def test_close_wakes_up_a_waiting_consumer():
+    """A consumer blocked on an empty queue gets None once it is closed."""
+    queue = chunk_queue.ChunkQueue(max_size=2, max_age_s=1.0)
+    results = []
+    consumer = threading.Thread(target=lambda: results.append(queue.get()))
+    consumer.start()
+    time.sleep(0.05)
+    queue.close()
+    consumer.join(timeout=1.0)
+
+    assert_that(results, equal_to([None]))
+    queue.put("late")
+    assert_that(queue.get(), is_(None))
+
+
+def test_queued_capture_copies_views():
+    """Windows that are views of a reused buffer are queued as copies."""
+    ring = np.zeros(4, dtype=np.float32)
+    both_queued = threading.Event()
+
+    def windows():
+        for value in (1.0, 2.0):
+            ring[:] = value
+            yield ring[:]
+        # Closing the queue discards what is left in it, so wait for the consumer
+        both_queued.wait(timeout=1.0)
+
+    capture = chunk_queue.QueuedCapture(windows(), max_size=4, max_age_s=60.0)
+    while capture.queue.stats()["depth"] < 2:
+        time.sleep(0.01)
+    received = [capture.queue.get(), capture.queue.get()]
+    both_queued.set()
+    capture.close()
+
+    assert_that(
+        [window.tolist() for window in received], equal_to([[1.0] * 4, [2.0] * 4])
+    )
+
+
+def test_queued_capture_raises_capture_errors_to_the_consumer():
+    """An error on the capture thread ends the consumer's iteration with that error."""
+    received_first = threading.Event()
+
+    def windows():
+        yield "window"
+        received_first.wait(timeout=1.0)
+        raise OSError("microphone gone")
+
+    capture = chunk_queue.QueuedCapture(windows(), max_size=4, max_age_s=60.0)
+    received = []
+    try:
+        for window in capture:
+            received.append(window)
+            received_first.set()
+    except OSError as error:
+        received.append(str(error))
+    capture.close()
+
+    assert_that(received, equal_to(["window", "microphone gone"]))
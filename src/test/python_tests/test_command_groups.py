@@ -0,0 +1,92 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for compiling command_groups.json against the command catalog.
+"""
+
+import command_groups
+import command_index
+from hamcrest import assert_that, contains_string, equal_to, has_item
+
+CATALOGS = [
+    ("en", ["Save All", "Close Editor", "Go to File...", "Toggle Terminal"]),
+    ("fr", ["Fermer Tout", "Save All"]),
+]
+
+
+def compile_groups(data):
+    index = command_index.CommandIndex(CATALOGS, lambda phrase: phrase.lower().split())
+    return command_groups.compile_command_groups(data, index)
+
+
+def test_groups_are_found_by_normalized_name_with_each_command_locale():
+    """Lookups ignore case and punctuation; each command keeps its catalog's locale."""
+    compiled = compile_groups(
+        [{"name": "Clean Up!", "commands": ["Save All", "Fermer Tout"]}]
+    )
+
+    assert_that(compiled.lookup("clean up"), equal_to(["Save All", "Fermer Tout"]))
+    assert_that(compiled.locales_of("Clean up."), equal_to(["en", "fr"]))
+    assert_that(compiled.names, equal_to(["Clean Up!"]))
+    assert_that(len(compiled.problems), equal_to(0))
+
+
+def test_a_group_without_a_usable_name_is_rejected():
+    """A name that is empty once punctuation is removed can't be said."""
+    compiled = compile_groups(
+        [{"name": "?!", "commands": ["Save All"]}, {"commands": ["Save All"]}]
+    )
+
+    assert_that(compiled.groups, equal_to({}))
+    assert_that(len(compiled.problems), equal_to(2))
+    assert_that(compiled.problems, has_item(contains_string("no usable name")))
+
+
+def test_a_duplicate_group_is_ignored():
+    """The first group with a name wins."""
+    compiled = compile_groups(
+        [
+            {"name": "Tidy", "commands": ["Save All"]},
+            {"name": "tidy.", "commands": ["Close Editor"]},
+        ]
+    )
+
+    assert_that(compiled.lookup("tidy"), equal_to(["Save All"]))
+    assert_that(compiled.problems, has_item(contains_string("Duplicate")))
+
+
+def test_unknown_commands_are_skipped():
+    """Commands missing from every catalog are dropped, the rest of the group stays."""
+    compiled = compile_groups(
+        [{"name": "Tidy", "commands": ["Save Everything", "Close Editor"]}]
+    )
+
+    assert_that(compiled.lookup("tidy"), equal_to(["Close Editor"]))
+    assert_that(
+        compiled.problems,
+        has_item(contains_string("unknown command 'Save Everything'")),
+    )
+
+
+def test_a_multi_step_command_must_come_last():
+    """A command waiting for more input would swallow the commands after it."""
+    compiled = compile_groups(
+        [
+            {"name": "Jump", "commands": ["Go to File...", "Toggle Terminal"]},
+            {"name": "Find", "commands": ["Save All", "Go to File..."]},
+        ]
+    )
+
+    assert_that(compiled.lookup("jump"), equal_to(["Toggle Terminal"]))
+    assert_that(compiled.lookup("find"), equal_to(["Save All", "Go to File..."]))
+    assert_that(len(compiled.problems), equal_to(1))
+    assert_that(compiled.problems[0], contains_string("must be last"))
+
+
+def test_a_group_without_valid_commands_is_rejected():
+    """A group left empty once invalid commands are skipped isn't added."""
+    compiled = compile_groups([{"name": "Nothing", "commands": ["Do Nothing"]}])
+
+    assert_that(compiled.lookup("nothing"), equal_to([]))
+    assert_that(compiled.names, equal_to([]))
+    assert_that(compiled.problems, has_item(contains_string("has no valid commands")))
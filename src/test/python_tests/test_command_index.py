@@ -0,0 +1,95 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the command matching index.
+"""
+
+import itertools
+
+import command_index
+from hamcrest import assert_that, equal_to, is_
+
+CATALOGS = [
+    (
+        "en",
+        [
+            "Open File\nfile.open",
+            "Save File",
+            "Save All",
+            "Close Editor",
+            "Toggle Terminal",
+            "Zoom",
+            "Find",
+        ],
+    ),
+    ("fr", ["Ouvrir Fichier", "Save File", "Fermer", "Zoom Avant"]),
+]
+
+
+def _preprocess(phrase):
+    return phrase.lower().split()
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def _similarity(words, phrase_words):
+    """The similarity searchForCommands scores a phrase with."""
+    if len(words) == 1 and len(phrase_words) == 1:
+        return _jaccard(set(next(iter(words))), set(next(iter(phrase_words))))
+    return _jaccard(words, phrase_words)
+
+
+def _scan(words):
+    """The full scan the index replaced: every phrase of every catalog, deduplicated."""
+    seen = []
+    for _locale, phrases in CATALOGS:
+        for phrase in phrases:
+            phrase = phrase.split("\n")[0]
+            if phrase not in seen:
+                seen.append(phrase)
+    return [
+        phrase
+        for phrase in seen
+        if _similarity(frozenset(words), frozenset(_preprocess(phrase))) > 0
+    ]
+
+
+def test_candidates_match_the_full_scan():
+    """Every phrase with a non-zero similarity is a candidate, in catalog order."""
+    index = command_index.CommandIndex(CATALOGS, _preprocess)
+    vocabulary = sorted(
+        {
+            word
+            for _, phrases in CATALOGS
+            for p in phrases
+            for word in _preprocess(p.split("\n")[0])
+        }
+        | {"fil", "zo", "x"}
+    )
+    queries = [(word,) for word in vocabulary] + list(
+        itertools.combinations(vocabulary, 2)
+    )
+    for words in queries:
+        candidates = [index.phrases[p] for p in index.candidates(words)]
+        assert_that(candidates, equal_to(_scan(words)), str(words))
+
+
+def test_phrases_are_stored_once_under_the_first_locale():
+    """A phrase shared by two catalogs is indexed once; descriptions after a newline are dropped."""
+    index = command_index.CommandIndex(CATALOGS, _preprocess)
+
+    assert_that(index.phrases.count("Save File"), is_(1))
+    assert_that(index.locale_of("Save File"), is_("en"))
+    assert_that(index.locale_of("Fermer"), is_("fr"))
+    assert_that(index.locale_of("Open File"), is_("en"))
+    assert_that(index.locale_of("Unknown"), is_(None))
+
+
+def test_exact_matches_compare_word_sets():
+    """Exact matches ignore word order and repeated words."""
+    index = command_index.CommandIndex(CATALOGS, _preprocess)
+
+    assert_that(index.exact_matches(["file", "save"]), equal_to(["Save File"]))
+    assert_that(index.exact_matches(["save"]), equal_to([]))
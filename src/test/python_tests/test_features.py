@@ -0,0 +1,111 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the incremental log-mel front-end against the Hugging Face feature extractors.
+"""
+
+import features
+import numpy as np
+import pytest
+from hamcrest import assert_that, close_to, equal_to, is_, less_than
+from transformers import WhisperFeatureExtractor
+
+SAMPLING_RATE = 16000
+
+
+def _audio(seconds):
+    rng = np.random.default_rng(0)
+    return rng.normal(0.0, 0.1, int(seconds * SAMPLING_RATE)).astype(np.float32)
+
+
+def _push(mel, audio, chunk):
+    for start in range(0, len(audio), chunk):
+        mel.push(audio[start : start + chunk])
+
+
+def _whisper_mel(feature_extractor):
+    return features.IncrementalMel(
+        features.whisper_mel_config(feature_extractor),
+        feature_extractor.nb_max_frames,
+        features.WHISPER_SILENCE,
+    )
+
+
+def test_whisper_features_match_the_feature_extractor():
+    """Frames computed as audio arrives equal WhisperFeatureExtractor's for the same audio."""
+    feature_extractor = WhisperFeatureExtractor()
+    audio = _audio(3)
+    expected = feature_extractor(
+        audio, sampling_rate=SAMPLING_RATE, return_tensors="np"
+    ).input_features[0]
+
+    mel = _whisper_mel(feature_extractor)
+    _push(mel, audio, 4000)
+    actual = features.whisper_input_features(mel)
+
+    # The last frames are still waiting for samples that the extractor pads with zeros
+    complete = mel.written - 2
+    error = np.abs(actual[:, :complete] - expected[:, :complete]).max()
+    assert_that(float(error), less_than(1e-5))
+
+
+def test_frames_do_not_depend_on_chunk_sizes():
+    """Pushing the same audio in different chunks computes the same frames."""
+    feature_extractor = WhisperFeatureExtractor()
+    audio = _audio(2)
+    whole = _whisper_mel(feature_extractor)
+    whole.push(audio)
+    chunked = _whisper_mel(feature_extractor)
+    _push(chunked, audio, 123)
+
+    assert_that(chunked.written, is_(whole.written))
+    assert_that(float(np.abs(chunked.ring - whole.ring).max()), less_than(1e-5))
+
+
+def test_latest_returns_frames_in_time_order_after_the_ring_wraps():
+    """Once the ring wrapped, `latest` still returns the newest frames oldest first."""
+    config = features.whisper_mel_config(WhisperFeatureExtractor())
+    audio = _audio(1)
+    reference = features.IncrementalMel(config, 200, features.WHISPER_SILENCE)
+    reference.push(audio)
+    ring = features.IncrementalMel(config, 16, features.WHISPER_SILENCE)
+    _push(ring, audio, 800)
+
+    expected = reference.latest(10)
+    assert_that(ring.written, is_(reference.written))
+    assert_that(float(np.abs(ring.latest(10) - expected).max()), less_than(1e-5))
+
+
+def test_front_end_shares_identical_configurations():
+    """Consumers with the same configuration share one ring; inactive ones aren't computed."""
+    config = features.whisper_mel_config(WhisperFeatureExtractor())
+    front_end = features.FeatureFrontEnd()
+    first = front_end.register("a", config, 100, features.WHISPER_SILENCE)
+    second = front_end.register("b", config, 100, features.WHISPER_SILENCE)
+    assert_that(first, is_(second))
+
+    front_end.push(_audio(0.1))
+    assert_that(first.written, is_(0))
+    front_end.activate("a")
+    front_end.push(_audio(0.1))
+    # Centered frames: the first 200 samples are reflected in front of the audio
+    assert_that(first.written, equal_to(1 + (200 + 1600 - 400) // 160))
+
+
+def test_ast_features_match_the_feature_extractor():
+    """AST filter banks of the latest window equal ASTFeatureExtractor's for that window."""
+    pytest.importorskip("torch")
+    from transformers import ASTFeatureExtractor
+
+    feature_extractor = ASTFeatureExtractor()
+    audio = _audio(0.5)
+    expected = feature_extractor(
+        audio, sampling_rate=SAMPLING_RATE, return_tensors="np"
+    ).input_values[0]
+
+    mel = features.IncrementalMel(features.ast_mel_config(feature_extractor), 200, 0.0)
+    _push(mel, audio, 1000)
+    window_frames = 1 + (len(audio) - 400) // 160
+    actual = features.ast_input_values(mel, window_frames, feature_extractor)
+
+    assert_that(float(np.abs(actual - expected).max()), close_to(0.0, 1e-3))
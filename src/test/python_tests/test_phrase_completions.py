@@ -0,0 +1,39 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for telling whole commands from prefixes of longer ones.
+"""
+
+import command_index
+from hamcrest import assert_that, is_
+
+COMPLETIONS = command_index.PhraseCompletions(
+    [
+        ("close", "editor"),
+        ("close", "editor", "group"),
+        ("save",),
+        ("save", "all"),
+        ("toggle", "terminal"),
+        (),
+    ]
+)
+
+
+def test_a_phrase_no_longer_phrase_starts_with_is_complete():
+    """A whole phrase that isn't the start of another one is complete."""
+    assert_that(COMPLETIONS.is_complete(["toggle", "terminal"]), is_(True))
+    assert_that(COMPLETIONS.is_complete(("close", "editor", "group")), is_(True))
+    assert_that(COMPLETIONS.is_complete(["save", "all"]), is_(True))
+
+
+def test_a_phrase_that_starts_a_longer_one_is_not_complete():
+    """ "Close Editor" may still become "Close Editor Group"."""
+    assert_that(COMPLETIONS.is_complete(["close", "editor"]), is_(False))
+    assert_that(COMPLETIONS.is_complete(["save"]), is_(False))
+
+
+def test_prefixes_and_unknown_words_are_not_complete():
+    """Partial phrases, unknown phrases and nothing at all aren't complete."""
+    assert_that(COMPLETIONS.is_complete(["toggle"]), is_(False))
+    assert_that(COMPLETIONS.is_complete(["open", "file"]), is_(False))
+    assert_that(COMPLETIONS.is_complete([]), is_(False))
@@ -0,0 +1,77 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the energy-based utterance segmenter used by continuous mode.
+"""
+
+import numpy as np
+import vad
+from hamcrest import assert_that, close_to, equal_to, has_entries, has_length
+
+SAMPLING_RATE = 1000
+FRAME = int(vad.FRAME_S * SAMPLING_RATE)
+
+
+def level(rms, seconds):
+    """A constant signal whose RMS is `rms`."""
+    return np.full(int(seconds * SAMPLING_RATE), rms, dtype=np.float32)
+
+
+def chunks(*parts, size=100):
+    """Splits the audio into f32le chunks that don't line up with the frames."""
+    audio = np.concatenate(parts)
+    return [audio[i : i + size].tobytes() for i in range(0, len(audio), size)]
+
+
+def test_speech_between_pauses_is_one_utterance_with_its_pre_roll():
+    """An utterance starts with the pre-roll and ends after the closing pause."""
+    segmenter = vad.UtteranceSegmenter(SAMPLING_RATE)
+    utterances = list(
+        segmenter.segments(chunks(level(0.0, 1.2), level(0.1, 0.3), level(0.0, 0.9)))
+    )
+
+    assert_that(utterances, has_length(1))
+    pre_roll, speech, pause = (
+        segmenter.pre_roll_frames,
+        10,
+        segmenter.end_silence_frames,
+    )
+    assert_that(len(utterances[0]), equal_to((pre_roll + speech + pause) * FRAME))
+    assert_that(float(utterances[0][pre_roll * FRAME]), close_to(0.1, 1e-6))
+    assert_that(segmenter.stats(), has_entries(utterances=1, discarded=0))
+
+
+def test_a_burst_shorter_than_min_speech_is_discarded():
+    """A click opens an utterance, but it is dropped once the pause closes it."""
+    segmenter = vad.UtteranceSegmenter(SAMPLING_RATE)
+    utterances = list(
+        segmenter.segments(chunks(level(0.0, 0.3), level(0.1, 0.06), level(0.0, 0.9)))
+    )
+
+    assert_that(utterances, has_length(0))
+    assert_that(segmenter.stats(), has_entries(utterances=0, discarded=1))
+
+
+def test_an_utterance_is_cut_at_the_maximum_length():
+    """Speech that doesn't pause is yielded once it reaches the maximum length."""
+    segmenter = vad.UtteranceSegmenter(
+        SAMPLING_RATE, pre_roll_s=0.0, max_utterance_s=0.6
+    )
+    utterances = list(segmenter.segments(chunks(level(0.1, 1.5))))
+
+    assert_that(utterances, has_length(2))
+    for utterance in utterances:
+        assert_that(len(utterance), equal_to(segmenter.max_utterance_frames * FRAME))
+
+
+def test_the_noise_floor_follows_the_background_level():
+    """Steady background noise raises the bar speech has to clear."""
+    segmenter = vad.UtteranceSegmenter(SAMPLING_RATE, threshold_rms=0.01)
+    utterances = list(
+        segmenter.segments(
+            chunks(level(0.008, 3.0), level(0.02, 0.3), level(0.008, 0.9))
+        )
+    )
+
+    assert_that(segmenter.noise_rms, close_to(0.008, 2e-3))
+    assert_that(utterances, has_length(0))
@@ -0,0 +1,69 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the smoothing and refractory period of wake-word detection.
+"""
+
+import pytest
+import wake_word_detector
+from hamcrest import assert_that, close_to, equal_to, has_entries
+
+
+def window(score, label="marvin"):
+    return [{"label": label, "score": score}, {"label": "_unknown_", "score": 0.01}]
+
+
+def test_posterior_is_the_best_wake_word_score():
+    """Only the configured labels count towards the posterior."""
+    detector = wake_word_detector.WakeWordDetector(["marvin", "sheila"], 0.5)
+    predictions = window(0.3) + window(0.6, "sheila") + window(0.9, "bed")
+
+    assert_that(detector.posterior(predictions), close_to(0.6, 1e-9))
+    assert_that(detector.posterior(window(0.9, "bed")), equal_to(0.0))
+
+
+def test_mean_smoothing_waits_for_a_full_history():
+    """One loud window isn't enough while the mean is over fewer windows than set."""
+    detector = wake_word_detector.WakeWordDetector(["marvin"], 0.5, windows=3)
+
+    results = [detector.update(window(score), now=0.0) for score in (0.9, 0.9, 0.0)]
+    assert_that(results, equal_to([False, False, True]))
+
+
+def test_max_smoothing_detects_on_the_first_loud_window():
+    """The max of a partly filled history can already cross the threshold."""
+    detector = wake_word_detector.WakeWordDetector(
+        ["marvin"], 0.5, windows=3, method="max"
+    )
+
+    assert_that(detector.update(window(0.9), now=0.0), equal_to(True))
+
+
+def test_detections_within_the_refractory_period_are_suppressed():
+    """A second detection right after the first is counted, not reported."""
+    detector = wake_word_detector.WakeWordDetector(["marvin"], 0.5, refractory_s=1.0)
+
+    results = [
+        detector.update(window(0.9), now=now) for now in (10.0, 10.5, 10.9, 11.1)
+    ]
+    assert_that(results, equal_to([True, False, False, True]))
+    assert_that(detector.stats(), has_entries(detections=2, suppressed=2))
+
+
+def test_false_trigger_rate_is_per_detection():
+    """The rate divides false triggers by detections."""
+    detector = wake_word_detector.WakeWordDetector(["marvin"], 0.5)
+    for now in range(4):
+        detector.update(window(0.9), now=float(now))
+    detector.false_trigger()
+
+    assert_that(
+        detector.stats(),
+        has_entries(detections=4, false_triggers=1, false_trigger_rate=0.25),
+    )
+
+
+def test_unknown_smoothing_method_is_rejected():
+    """Only mean and max smoothing are supported."""
+    with pytest.raises(ValueError):
+        wake_word_detector.WakeWordDetector(["marvin"], 0.5, method="median")